@@ -1,11 +1,28 @@
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+# Google, CalDAV, requests and numpy are imported where first used, so commands
+# that never touch a backend start quickly; requirements.txt lists them
 from datetime import datetime, timedelta
-import caldav
+import argparse
 import json
-import pytz
-from requests import post
+import time
+import os
+import sys
+import threading
+import uuid
+import heapq
+from contextlib import contextmanager
+
+from categories import CategoryRollup, CategoryRules, KeywordMatcher, load_rule_tables
+from events import (CATEGORY_PROPERTY, LEGACY_CATEGORY_TAG, Event, category_filter,
+                    epoch_seconds, event_bounds, mirror_event_body, naive_utc,
+                    set_event_category, tagged_categories)
+from google_calendar import CalendarRegistry, CalendarSync, WriteBuffer
+from ollama_cache import ResponseCache, SingleFlight
+from scheduling import (SCHEDULING_ENGINES, AvailabilityCache, EventIntervalIndex, SchedulePlan,
+                        SchedulePlanner, record_key, scheduled_category, work_location)
+from store import EventStore
+from telemetry import (ApiTelemetry, InstrumentedDAV, InstrumentedGoogleService, JsonLinesSink,
+                       RateLimiter, RetryPolicy)
+
 
 class AuDRACalendarAgent:
     def __init__(self):
@@ -15,9 +32,38 @@ class AuDRACalendarAgent:
             'Workout', 'Laundry and Cleaning', 'Sleep', 'Writing', 'Bri', 'Health', 'SSS',
             'Travel'  # Added Travel category
         ]
+        self.telemetry = ApiTelemetry(owner=AuDRACalendarAgent)  # Every outbound API call
+        # Calendar API default quota is 600 queries per minute per user; the burst
+        # lets one full write batch go out at once
+        self.google_limiter = RateLimiter(rate=10, burst=50)
+        self.google_retry = RetryPolicy(self.google_limiter)
         self.google_service = None
+        self.google_credentials = None
         self.apple_client = None
+        self.apple_calendars = None  # Cached CalDAV calendar listing
+        self.thread_local = threading.local()
+        self.SOURCE_CALENDARS = ['Personal', 'Family']
+        self.TARGET_CALENDAR = 'testcal'  # Calendar the agent categorizes into and fills
+        # testcal may still hold [Category:X] description tags; migrate_category_tags() clears it
+        self.LEGACY_CATEGORY_TAGS = True
+        self.READ_WORKERS = 4  # Concurrent calendar fetches in read_all_calendars
+        self.STREAM_PAGE_SIZE = 250  # Google events per page when streaming
+        self.STREAM_WINDOW_DAYS = 31  # Days per CalDAV search when streaming
+        self.STREAM_QUEUE_SIZE = 200  # Events waiting for the writer before reads block
+        self.BACKFILL_CHUNK_DAYS = 31
+        self.BACKFILL_WORKERS = 4  # Chunks backfilled concurrently
         self.testcal = None
+        self.calendar_registry = None
+        self.CALENDAR_CACHE_TTL = 300  # Seconds before calendar names are re-resolved
+        self.write_buffer = None  # Set while buffered writes are active
+        self.WRITE_BATCH_SIZE = 50
+        self.calendar_sync = None
+        self.event_store = None  # EventStore the sync layer writes through to
+        self.offline = False  # Serve reads from event_store without Google or CalDAV
+        self.testcal_index = None  # Interval index of known testcal events
+        self.availability = None  # AvailabilityCache, seeded on first availability check
+        self.SCHEDULER = 'greedy'  # Engine in SCHEDULING_ENGINES used by plan_minimum_hours
+        self.SCHEDULER_TIME_BUDGET = 2.0  # Seconds before falling back to greedy
         self.CATEGORY_MINIMUMS = [
             {
                 'category': 'Work',
@@ -202,40 +248,377 @@ class AuDRACalendarAgent:
                 'weekday_only': False,            # Applies all days
             }
         }
+        # Keyword rules for categorize_event, in priority order
+        self.VIRTUAL_LOCATION_KEYWORDS = ['virtual', 'zoom', 'teams', 'meet.google.com']
+        self.VIRTUAL_MEETING_KEYWORDS = ['meeting', 'conference', 'presentation', 'call']
+        self.CATEGORY_KEYWORDS = [
+            ('Bri', ['bri', 'date', 'anniversary', 'couple']),
+            ('Work', ['work', 'meeting', 'project', 'conference', 'presentation', 
+                      'deadline', 'interview', 'client', 'report', 'office']),
+            ('Writing', ['writing', 'blog', 'article', 'draft', 'edit', 'compose', 
+                         'document', 'manuscript']),
+            ('Workout', ['workout', 'gym', 'exercise', 'training', 'run', 'fitness', 
+                         'yoga', 'swimming', 'sports']),
+            ('Breakfast', ['breakfast', 'morning meal', 'second breakfast']),
+            ('Brunch', ['elevenses', 'brunch', 'mid-morning meal']),
+            ('Lunch', ['lunch', 'luncheon', 'noon meal']),
+            ('Afternoon Tea', ['afternoon snack', 'tea', 'light meal']),
+            ('Dinner', ['dinner', 'supper', 'evening meal']),
+            ('Laundry and Cleaning', ['laundry', 'cleaning', 'chores', 'housework', 'vacuum', 
+                                      'dishes', 'tidying', 'organize']),
+            ('Sleep', ['sleep', 'nap', 'rest', 'bedtime']),
+            ('Health', ['doctor', 'medical', 'appointment', 'checkup', 'dentist',
+                        'therapy', 'medication', 'hospital', 'clinic', 'physician',
+                        'health', 'wellness', 'prescription', 'mental health',
+                        'counseling', 'consultation', 'optometrist', 'specialist',
+                        'physical therapy', 'vaccination', 'blood work']),
+            ('Travel', ['travel', 'flight', 'train', 'bus', 'drive', 'trip', 'journey',
+                        'airport', 'station', 'departure', 'arrival', 'transit',
+                        'commute', 'layover', 'connecting', 'vacation', 'hotel',
+                        'booking', 'rental car', 'uber', 'lyft', 'taxi']),
+            # Free time (including gaming and streaming activities)
+            ('Free', ['free', 'break', 'relax', 'leisure', 'personal time',
+                      'video games', 'gaming', 'ps5', 'playstation', 'xbox', 
+                      'nintendo', 'switch', 'civ', 'civilization', 'twitch',
+                      'stream', 'streaming', 'd&d', 'dnd', 'dungeons and dragons',
+                      'game night', 'rpg', 'mmo', 'multiplayer', 'discord',
+                      'minecraft', 'fortnite', 'warzone', 'apex']),
+        ]
+        self.keyword_matchers = None  # Compiled from the keyword rules on first use
+        self.category_rules = None  # CategoryRules compiled from the tables above on first use
+        self.category_memo = {}  # (summary, description, location) -> category
+        self.CATEGORY_MEMO_SIZE = 10000  # Entries; bounds memory on long streamed runs
         self.ollama_url = "http://localhost:7869/api/generate"
         self.ai_model = "llama3.2"  # Default model
-
-    def authenticate_google(self, credentials_path):
-        """Authenticate with Google Calendar API"""
-        flow = InstalledAppFlow.from_client_secrets_file(
-            credentials_path, self.SCOPES)
-        creds = flow.run_local_server(port=0)
+        self.OLLAMA_TIMEOUT = (5, 300)  # (connect, read) seconds
+        self.OLLAMA_POOL_SIZE = 4
+        self.OLLAMA_CACHE_DIR = os.path.join(
+            os.path.expanduser('~'), '.cache', 'audra', 'ollama')  # None disables caching
+        self.OLLAMA_CACHE_TTL = 7 * 24 * 3600  # Seconds
+        self.OLLAMA_CACHE_MAX_BYTES = 50 * 1024 * 1024
+        self.ollama_session = None
+        self.ollama_cache = None
+        self.ollama_flight = SingleFlight()
+
+    @property
+    def google_service(self):
+        return self._google_service
+
+    @google_service.setter
+    def google_service(self, service):
+        # Wrapped so every execute() is reported to self.telemetry, paced by
+        # self.google_limiter and retried under self.google_retry
+        if service is not None and not isinstance(service, InstrumentedGoogleService):
+            service = InstrumentedGoogleService(service, self.telemetry, self.google_retry)
+        self._google_service = service
+
+    @property
+    def apple_client(self):
+        return self._apple_client
+
+    @apple_client.setter
+    def apple_client(self, client):
+        if client is not None and not isinstance(client, InstrumentedDAV):
+            client = InstrumentedDAV(client, self.telemetry)
+        self._apple_client = client
+
+    def authenticate_google(self, credentials_path, token_path=None):
+        """
+        Authenticate with Google Calendar API
+        Args:
+            token_path (str): Saved authorized-user token; reused (and refreshed) when
+                present so unattended runs never open a browser, and written after a
+                browser sign-in
+        """
+        from google.auth.transport.requests import Request
+        from google.oauth2.credentials import Credentials
+        from google_auth_oauthlib.flow import InstalledAppFlow
+        from googleapiclient.discovery import build
+
+        creds = None
+        if token_path and os.path.exists(token_path):
+            creds = Credentials.from_authorized_user_file(token_path, self.SCOPES)
+            if not creds.valid and creds.expired and creds.refresh_token:
+                creds.refresh(Request())
+            if not creds.valid:
+                creds = None
+        if creds is None:
+            flow = InstalledAppFlow.from_client_secrets_file(
+                credentials_path, self.SCOPES)
+            creds = flow.run_local_server(port=0)
+            if token_path:
+                with open(token_path, 'w') as f:
+                    f.write(creds.to_json())
+        self.google_credentials = creds
         self.google_service = build('calendar', 'v3', credentials=creds)
 
     def authenticate_apple(self, caldav_url, username, password):
         """Authenticate with Apple Calendar via CalDAV"""
+        import caldav
+
         self.apple_client = caldav.DAVClient(
             url=caldav_url,
             username=username,
             password=password
         )
+        self.apple_calendars = None
 
-def query_ollama(self, prompt):
-    """
-    Query Ollama AI model for decision making
-    """
-    try:
-        response = post(self.ollama_url, json={
+    def get_thread_google_service(self):
+        """
+        Return a Google service that is safe to use from the current thread
+        googleapiclient services share one httplib2 connection, so worker threads
+        build their own from the stored credentials. Injected services are shared.
+        """
+        if self.google_credentials is None:
+            return self.google_service
+        if threading.current_thread() is threading.main_thread():
+            return self.google_service
+        service = getattr(self.thread_local, 'google_service', None)
+        if service is None:
+            from googleapiclient.discovery import build
+            service = InstrumentedGoogleService(
+                build('calendar', 'v3', credentials=self.google_credentials,
+                      cache_discovery=False), self.telemetry, self.google_retry)
+            self.thread_local.google_service = service
+        return service
+
+    def get_apple_calendars(self):
+        """Return the CalDAV calendar listing, fetching the principal only once"""
+        if self.apple_calendars is None:
+            principal = self.apple_client.principal()
+            self.apple_calendars = principal.calendars()
+        return self.apple_calendars
+
+    def get_calendar_registry(self):
+        """Return the calendar registry for the current Google service"""
+        if (self.calendar_registry is None or
+                self.calendar_registry.service is not self.google_service):
+            self.calendar_registry = CalendarRegistry(
+                self.google_service, ttl=self.CALENDAR_CACHE_TTL)
+        return self.calendar_registry
+
+    def get_calendar_id(self, calendar_name, create=False):
+        """Resolve a Google calendar name to its ID via the cached registry"""
+        if self.offline:
+            if create:
+                raise Exception(f"Can't create calendar {calendar_name!r} offline")
+            return self.event_store.calendar_id(calendar_name)
+        registry = self.get_calendar_registry()
+        if create:
+            calendar_id = registry.get_or_create(calendar_name)
+        else:
+            calendar_id = registry.get_id(calendar_name)
+        if calendar_id and self.event_store is not None:
+            self.event_store.set_calendar(calendar_id, 'google', calendar_name)
+        return calendar_id
+
+    def invalidate_calendars(self, calendar_name=None):
+        """Drop cached calendar IDs so the next lookup re-reads calendarList()"""
+        if self.calendar_registry is not None:
+            self.calendar_registry.invalidate(calendar_name)
+
+    def get_calendar_sync(self):
+        """Return the event sync engine for the current Google service"""
+        if (self.calendar_sync is None or
+                self.calendar_sync.service is not self.google_service or
+                self.calendar_sync.store is not self.event_store):
+            self.calendar_sync = CalendarSync(self.google_service, store=self.event_store)
+        return self.calendar_sync
+
+    def get_records(self, calendar_id, start_date=None, end_date=None, service=None):
+        """
+        Event records of a Google calendar overlapping a window, sorted by start
+        Synced from the server, or read from the event store when offline.
+        """
+        if self.offline:
+            return self.event_store.records(calendar_id, start_date, end_date)
+        return self.get_calendar_sync().get_records(calendar_id, start_date, end_date, service)
+
+    def open_event_store(self, path, offline=False):
+        """
+        Keep every synced or searched event in a SQLite file as well
+        Args:
+            offline (bool): Answer reads from the store alone, never calling Google or
+                CalDAV; writes still need an authenticated service
+        """
+        if self.event_store is not None:
+            self.event_store.close()
+        self.event_store = EventStore(path)
+        self.offline = offline
+        self.invalidate_testcal_index()
+        self.invalidate_availability()
+        return self.event_store
+
+    def _check_google_reads(self):
+        """Raise unless testcal reads can be answered, live or from the event store"""
+        if not self.google_service and not self.offline:
+            raise Exception("Google Calendar not authenticated")
+
+    def load_sync_state(self, path):
+        """Load sync tokens and mirrored events saved by a previous run"""
+        self.get_calendar_sync().load(path)
+
+    def save_sync_state(self, path):
+        """Save sync tokens and mirrored events so the next run only fetches changes"""
+        self.get_calendar_sync().save(path)
+
+    def get_testcal_index(self):
+        """Return the interval index of testcal events, loading it on first use"""
+        if self.testcal_index is None:
+            self.testcal_index = EventIntervalIndex()
+            testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
+            if testcal_id:
+                self._flush_before_read()
+                for record in self.get_records(testcal_id):
+                    self.testcal_index.add_record(record)
+        return self.testcal_index
+
+    def invalidate_testcal_index(self):
+        """Rebuild the testcal interval index from the server on next use"""
+        self.testcal_index = None
+
+    def begin_buffered_writes(self):
+        """Start collecting event writes so they go out as batch requests"""
+        if self.write_buffer is None:
+            self.write_buffer = WriteBuffer(self.google_service,
+                                            batch_size=self.WRITE_BATCH_SIZE)
+        return self.write_buffer
+
+    def flush_writes(self):
+        """
+        Send any buffered event writes
+        Returns:
+            list: PendingWrite handles that failed
+        """
+        if self.write_buffer is None:
+            return []
+        return self.write_buffer.flush()
+
+    def end_buffered_writes(self):
+        """Flush buffered writes and go back to sending each write immediately"""
+        failed = self.flush_writes()
+        self.write_buffer = None
+        return failed
+
+    @contextmanager
+    def buffered_writes(self):
+        """Context manager that batches every event write made inside it"""
+        already_buffering = self.write_buffer is not None
+        buffer = self.begin_buffered_writes()
+        try:
+            yield buffer
+        finally:
+            if not already_buffering:
+                self.end_buffered_writes()
+
+    def _insert_event(self, calendar_id, body):
+        """Insert an event now, or queue it when buffering (returns a PendingWrite)"""
+        # Every attempt sends this ID, so a retry after a lost response gets 409, not a copy
+        body.setdefault('id', uuid.uuid4().hex)
+        if self.write_buffer is not None:
+            return self.write_buffer.insert(calendar_id, body)
+        return self.google_service.events().insert(
+            calendarId=calendar_id,
+            body=body
+        ).execute()
+
+    def _update_event(self, calendar_id, event_id, body):
+        """Update an event now, or queue it when buffering"""
+        if self.write_buffer is not None:
+            return self.write_buffer.update(calendar_id, event_id, body)
+        return self.google_service.events().update(
+            calendarId=calendar_id,
+            eventId=event_id,
+            body=body
+        ).execute()
+
+    def _delete_event(self, calendar_id, event_id):
+        """Delete an event now, or queue it when buffering"""
+        if self.write_buffer is not None:
+            return self.write_buffer.delete(calendar_id, event_id)
+        return self.google_service.events().delete(
+            calendarId=calendar_id,
+            eventId=event_id
+        ).execute()
+
+    def _flush_before_read(self):
+        """Send pending writes so testcal reads see everything queued so far"""
+        if self.write_buffer is not None and len(self.write_buffer):
+            self.write_buffer.flush()
+
+    def get_ollama_session(self):
+        """Return a pooled keep-alive HTTP session for Ollama requests"""
+        if self.ollama_session is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.OLLAMA_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            self.ollama_session = session
+        return self.ollama_session
+
+    def get_ollama_cache(self):
+        """Return the on-disk Ollama response cache, or None when disabled"""
+        if self.OLLAMA_CACHE_DIR is None:
+            return None
+        if self.ollama_cache is None or self.ollama_cache.directory != self.OLLAMA_CACHE_DIR:
+            try:
+                self.ollama_cache = ResponseCache(self.OLLAMA_CACHE_DIR)
+            except OSError as e:
+                # Caching is only an optimization; carry on without it
+                print(f"Ollama response cache disabled: {e}")
+                self.OLLAMA_CACHE_DIR = self.ollama_cache = None
+                return None
+        self.ollama_cache.ttl = self.OLLAMA_CACHE_TTL
+        self.ollama_cache.max_bytes = self.OLLAMA_CACHE_MAX_BYTES
+        return self.ollama_cache
+
+    def query_ollama(self, prompt, response_format=None):
+        """
+        Query Ollama AI model for decision making
+        Responses are cached on disk, and concurrent identical prompts share one generation.
+        Pass response_format='json' to have Ollama constrain the reply to JSON.
+        """
+        cache = self.get_ollama_cache()
+        key = ResponseCache.key(self.ai_model, prompt, response_format)
+        if cache is not None:
+            cached = cache.get(key)
+            if cached is not None:
+                return cached
+        return self.ollama_flight.do(
+            key, lambda: self._generate(prompt, response_format, key, cache))
+
+    def _generate(self, prompt, response_format, key, cache):
+        """Send one generate request to Ollama and cache a successful response"""
+        payload = {
             "model": self.ai_model,
             "prompt": prompt,
             "stream": False
-        })
-        if response.status_code == 200:
-            return response.json()['response']
-        return None
-    except Exception as e:
-        print(f"Error querying Ollama: {e}")
-        return None
+        }
+        if response_format:
+            payload["format"] = response_format
+        try:
+            with self.telemetry.span('ollama', 'generate', payload) as call:
+                response = self.get_ollama_session().post(
+                    self.ollama_url, json=payload, timeout=self.OLLAMA_TIMEOUT)
+                call.response_bytes = len(response.content)
+                if response.status_code != 200:
+                    call.error = f"HTTP {response.status_code}"
+            if response.status_code != 200:
+                return None
+            result = response.json()['response']
+        except Exception as e:
+            print(f"Error querying Ollama: {e}")
+            return None
+
+        if cache is not None:
+            try:
+                cache.put(key, result)
+            except OSError as e:
+                print(f"Could not cache Ollama response: {e}")
+        return result
 
     def get_next_month_range(self):
         """Get the date range for next month"""
@@ -247,149 +630,486 @@ def query_ollama(self, prompt):
                              timedelta(days=4)).replace(day=1) - timedelta(days=1)
         return first_of_next_month, last_of_next_month
 
-    def read_google_calendars(self):
-        """Read events from Google calendars (Personal and Family)"""
-        if not self.google_service:
-            raise Exception("Google Calendar not authenticated")
+    def read_google_calendar(self, calendar_name, start_date, end_date):
+        """Read events from one Google calendar, sorted by start time"""
+        return [record.raw for record in
+                self.read_google_records(calendar_name, start_date, end_date)]
 
-        start_date, end_date = self.get_next_month_range()
-        events = []
+    def read_google_records(self, calendar_name, start_date, end_date):
+        """Read one Google calendar as Event records, sorted by start time"""
+        calendar_id = self.get_calendar_id(calendar_name)
+        if not calendar_id:
+            return []
+        return self.get_records(
+            calendar_id, start_date, end_date, service=self.get_thread_google_service())
 
-        for calendar_name in ['Personal', 'Family']:
-            calendar_list = self.google_service.calendarList().list().execute()
-            calendar_id = None
-            
-            for calendar in calendar_list['items']:
-                if calendar['summary'] == calendar_name:
-                    calendar_id = calendar['id']
-                    break
+    def read_compact_google_records(self, calendar_name, start_date, end_date):
+        """
+        Read one Google calendar as compact Event records, sorted by start time
+        Records are built straight from the pages and nothing is mirrored, so
+        only each event's JSON text is held.
+        """
+        calendar_id = self.get_calendar_id(calendar_name)
+        if not calendar_id:
+            return []
+        pages = self.get_calendar_sync().iter_pages(
+            calendar_id, self.get_thread_google_service(), singleEvents=True,
+            timeMin=start_date.isoformat() + 'Z', timeMax=end_date.isoformat() + 'Z')
+        records = [Event.from_google(event, calendar_id, compact=True)
+                   for page in pages for event in page.get('items', [])
+                   if event.get('status') != 'cancelled']
+        records.sort(key=lambda record: record.start)
+        return records
+
+    def read_google_calendars(self, start_date=None, end_date=None):
+        """Read events from Google calendars (Personal and Family), next month by default"""
+        self._check_google_reads()
 
-            if calendar_id:
-                events_result = self.google_service.events().list(
-                    calendarId=calendar_id,
-                    timeMin=start_date.isoformat() + 'Z',
-                    timeMax=end_date.isoformat() + 'Z',
-                    singleEvents=True,
-                    orderBy='startTime'
-                ).execute()
-                events.extend(events_result.get('items', []))
+        if start_date is None or end_date is None:
+            start_date, end_date = self.get_next_month_range()
+        events = []
+
+        for calendar_name in self.SOURCE_CALENDARS:
+            events.extend(self.read_google_calendar(calendar_name, start_date, end_date))
 
         return events
 
-    def read_apple_calendars(self):
-        """Read events from Apple calendars (Personal and Family)"""
+    def read_apple_calendar(self, calendar_name, start_date, end_date):
+        """Read events from one Apple calendar, sorted by start time"""
+        return [record.raw for record in
+                self.read_apple_records(calendar_name, start_date, end_date)]
+
+    def read_apple_records(self, calendar_name, start_date, end_date):
+        """Read one Apple calendar as Event records, sorted by start time"""
+        if self.offline:
+            calendar_id = self.event_store.calendar_id(calendar_name, 'caldav')
+            if not calendar_id:
+                return []
+            return self.event_store.records(calendar_id, start_date, end_date)
+
+        records = []
+        for calendar in self.get_apple_calendars():
+            if calendar.name == calendar_name:
+                calendar_id = str(calendar.url)
+                found = [Event.from_caldav(event, calendar_id)
+                         for event in calendar.date_search(
+                             start=start_date,
+                             end=end_date
+                         )]
+                if self.event_store is not None:
+                    self.event_store.set_calendar(calendar_id, 'caldav', calendar_name)
+                    self.event_store.replace(calendar_id, 'caldav', found,
+                                             start_date=start_date, end_date=end_date)
+                records.extend(found)
+        records.sort(key=lambda record: record.start)
+        return records
+
+    def read_apple_calendars(self, start_date=None, end_date=None):
+        """Read events from Apple calendars (Personal and Family), next month by default"""
         if not self.apple_client:
             raise Exception("Apple Calendar not authenticated")
 
-        start_date, end_date = self.get_next_month_range()
+        if start_date is None or end_date is None:
+            start_date, end_date = self.get_next_month_range()
         events = []
 
-        for calendar_name in ['Personal', 'Family']:
-            principal = self.apple_client.principal()
-            calendars = principal.calendars()
-            
-            for calendar in calendars:
-                if calendar.name == calendar_name:
-                    cal_events = calendar.date_search(
-                        start=start_date,
-                        end=end_date
-                    )
-                    events.extend(cal_events)
+        for calendar_name in self.SOURCE_CALENDARS:
+            events.extend(self.read_apple_calendar(calendar_name, start_date, end_date))
 
         return events
 
-    def categorize_event(self, event):
+    def read_all_calendars(self, start_date=None, end_date=None):
+        """
+        Read every Google and Apple source calendar concurrently
+        Returns:
+            list: Google event dicts and CalDAV events merged into one start-time order
+        """
+        return [record.raw for record in self.read_all_records(start_date, end_date)]
+
+    def read_all_records(self, start_date=None, end_date=None, compact=False):
+        """
+        Read every Google and Apple source calendar concurrently as Event records
+        Args:
+            compact (bool): Hold payloads as serialized text, for long-range history
+                loads; Google calendars are then read without syncing their mirrors
+        Returns:
+            list: Events from every source merged into one start-time order
+        """
+        if not self.google_service and not self.apple_client and not self.offline:
+            raise Exception("No calendar source authenticated")
+
+        if start_date is None or end_date is None:
+            start_date, end_date = self.get_next_month_range()
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        # Resolve shared lookups up front so workers only fetch events
+        fetches = []
+        if self.google_service or self.offline:
+            read_google = self.read_google_records
+            if not self.offline:
+                self.get_calendar_registry().get_id(self.SOURCE_CALENDARS[0])
+                self.get_calendar_sync()  # One engine, or workers would race to create it
+                if compact:
+                    read_google = self.read_compact_google_records
+            fetches += [(read_google, name) for name in self.SOURCE_CALENDARS]
+        if self.apple_client or self.offline:
+            if not self.offline:
+                self.get_apple_calendars()
+            fetches += [(self.read_apple_records, name) for name in self.SOURCE_CALENDARS]
+
+        with ThreadPoolExecutor(max_workers=self.READ_WORKERS) as pool:
+            futures = [pool.submit(read, name, start_date, end_date) for read, name in fetches]
+            # (start, stream, position) keys keep the merge from comparing events
+            streams = [[(record.start, index, position,
+                         record.compacted() if compact else record)
+                        for position, record in enumerate(future.result())]
+                       for index, future in enumerate(futures)]
+
+        return [item[-1] for item in heapq.merge(*streams)]
+
+    def iter_google_records(self, calendar_name, start_date, end_date, calendar_id=None):
+        """
+        Stream one Google calendar's events in a window as Event records
+        Pages are fetched as the caller consumes them and nothing is mirrored, so
+        only the current page is held.
+        Args:
+            calendar_id (str): The calendar's ID if already resolved, which spares
+                worker threads the shared calendar registry
+        """
+        calendar_id = calendar_id or self.get_calendar_id(calendar_name)
+        if not calendar_id:
+            return
+        pages = self.get_calendar_sync().iter_pages(
+            calendar_id, self.get_thread_google_service(), self.STREAM_PAGE_SIZE,
+            singleEvents=True, timeMin=start_date.isoformat() + 'Z',
+            timeMax=end_date.isoformat() + 'Z')
+        for page in pages:
+            for event in page.get('items', []):
+                if event.get('status') != 'cancelled':
+                    yield Event.from_google(event, calendar_id)
+
+    def iter_apple_records(self, calendar_name, start_date, end_date):
+        """
+        Stream one Apple calendar's events in a window as Event records
+        CalDAV searches return whole result sets, so the window is searched
+        STREAM_WINDOW_DAYS at a time.
+        """
+        step = timedelta(days=self.STREAM_WINDOW_DAYS)
+        for calendar in self.get_apple_calendars():
+            if calendar.name != calendar_name:
+                continue
+            calendar_id = str(calendar.url)
+            slice_start = start_date
+            while slice_start < end_date:
+                slice_end = min(slice_start + step, end_date)
+                for event in calendar.date_search(start=slice_start, end=slice_end):
+                    record = Event.from_caldav(event, calendar_id)
+                    # An event crossing into this slice was yielded by the one before
+                    if slice_start == start_date or record.start_time >= slice_start:
+                        yield record
+                slice_start = slice_end
+
+    def iter_source_records(self, start_date=None, end_date=None, google_ids=None):
+        """
+        Stream every Google and Apple source calendar's events, one calendar at a time
+        Unlike read_all_records, events are not collected or put in start-time order.
+        Args:
+            google_ids (dict): Source calendar name -> Google ID, resolved beforehand
+        """
+        if not self.google_service and not self.apple_client:
+            raise Exception("No calendar source authenticated")
+
+        if start_date is None or end_date is None:
+            start_date, end_date = self.get_next_month_range()
+
+        for calendar_name in self.SOURCE_CALENDARS:
+            if self.google_service:
+                calendar_id = (google_ids or {}).get(calendar_name)
+                if google_ids is None or calendar_id:
+                    yield from self.iter_google_records(calendar_name, start_date, end_date,
+                                                        calendar_id)
+            if self.apple_client:
+                yield from self.iter_apple_records(calendar_name, start_date, end_date)
+
+    def mirror_to_testcal(self, start_date=None, end_date=None, calendar_name=None,
+                          skip_earlier=False):
+        """
+        Copy every source event in a window into testcal with its category
+        Events stream from the sources, are categorized as they arrive and go to a
+        writer thread through a queue of STREAM_QUEUE_SIZE bodies, sent in batches.
+        When writes fall behind, reading waits, so memory stays the same however
+        long the window. Copies get stable IDs, so a re-run skips events already copied.
+        Args:
+            calendar_name (str): Calendar to copy into; TARGET_CALENDAR by default
+            skip_earlier (bool): Leave out events starting before start_date, which
+                the window before this one already covered
+        Returns:
+            dict: Counts of events read, written, already present and failed
+        """
+        if not self.google_service:
+            raise Exception("Google Calendar not authenticated")
+
+        if start_date is None or end_date is None:
+            start_date, end_date = self.get_next_month_range()
+
+        target_id = self.get_calendar_id(calendar_name or self.TARGET_CALENDAR, create=True)
+        counts = self._mirror_window(start_date, end_date, target_id,
+                                     self.resolve_source_ids(), skip_earlier)
+        if counts['written']:
+            self.invalidate_testcal_index()
+            self.invalidate_availability()
+        return counts
+
+    def resolve_source_ids(self):
+        """Return source calendar name -> Google ID for the source calendars that exist"""
+        return {name: self.get_calendar_id(name) for name in self.SOURCE_CALENDARS}
+
+    def _mirror_window(self, start_date, end_date, target_id, source_ids, skip_earlier):
+        """
+        Stream one window of source events into the calendar target_id
+        Safe to run on several threads at once: calendar IDs come in resolved, and
+        Google services and keyword matchers are the calling thread's own.
+        Returns:
+            dict: Counts of events read, written, already present and failed
+        """
+        import queue
+
+        counts = {'read': 0, 'written': 0, 'existing': 0, 'failed': 0}
+        writes = queue.Queue(maxsize=self.STREAM_QUEUE_SIZE)
+        errors = []
+
+        def send(buffer, handles):
+            failed = {id(handle) for handle in buffer.flush()}
+            for handle in handles:
+                if handle.error is None:
+                    counts['written'] += 1
+                elif id(handle) in failed:
+                    counts['failed'] += 1
+                else:
+                    counts['existing'] += 1
+
+        def write():
+            buffer = WriteBuffer(self.get_thread_google_service(),
+                                 batch_size=self.WRITE_BATCH_SIZE, ignore_conflicts=True)
+            handles = []
+            body = {}
+            while body is not None:
+                body = writes.get()
+                if errors:
+                    continue  # Keep draining so the reader never waits on a dead writer
+                try:
+                    if body is not None:
+                        handles.append(buffer.insert(target_id, body))
+                    if handles and (body is None or len(handles) >= buffer.batch_size):
+                        send(buffer, handles)
+                        handles = []
+                except Exception as e:
+                    errors.append(e)
+
+        writer = threading.Thread(target=write, name='testcal-writer', daemon=True)
+        writer.start()
+        matchers, memo = self.get_thread_keyword_matchers()
+        window_start = epoch_seconds(start_date)
+        try:
+            for record in self.iter_source_records(start_date, end_date, source_ids):
+                if skip_earlier and record.start < window_start:
+                    continue
+                category = self.categorize_event(record, matchers, memo)
+                writes.put(mirror_event_body(record, category))  # Blocks while the queue is full
+                counts['read'] += 1
+                if errors:
+                    break
+        finally:
+            writes.put(None)
+            writer.join()
+
+        if errors:
+            raise errors[0]
+        return counts
+
+    def backfill(self, start_date, end_date, checkpoint_path=None, chunk_days=None,
+                 workers=None):
+        """
+        Mirror any range of source history into testcal, several chunks at a time
+        The range is split into chunk_days windows, each copied as mirror_to_testcal
+        would on one of up to workers threads. Finished chunks are recorded in the
+        checkpoint file, so running the same backfill again after an interruption
+        skips them; a chunk cut off midway is redone, finding its copies present.
+        Args:
+            checkpoint_path (str): JSON file of finished chunks; None keeps no record
+            chunk_days (int): Days per chunk; BACKFILL_CHUNK_DAYS by default
+            workers (int): Chunks copied at once; BACKFILL_WORKERS by default
+        Returns:
+            dict: Event counts summed over the chunks run, and chunks done, skipped
+                (finished by an earlier run) and unfinished
+        """
+        if not self.google_service:
+            raise Exception("Google Calendar not authenticated")
+        if end_date <= start_date:
+            raise Exception("Backfill end date must be after its start date")
+
+        chunk_days = chunk_days or self.BACKFILL_CHUNK_DAYS
+        step = timedelta(days=chunk_days)
+        chunks = []
+        chunk_start = start_date
+        while chunk_start < end_date:
+            chunks.append((chunk_start, min(chunk_start + step, end_date)))
+            chunk_start += step
+
+        plan = {'start': start_date.isoformat(), 'end': end_date.isoformat(),
+                'chunk_days': chunk_days}
+        finished = set()
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                checkpoint = json.load(f)
+            if any(checkpoint.get(key) != value for key, value in plan.items()):
+                raise Exception(f"Checkpoint {checkpoint_path} is for a different "
+                                f"backfill range or chunk size")
+            finished = set(checkpoint.get('done', []))
+
+        pending = [chunk for chunk in chunks if chunk[0].isoformat() not in finished]
+        totals = {'read': 0, 'written': 0, 'existing': 0, 'failed': 0,
+                  'done': 0, 'skipped': len(chunks) - len(pending), 'unfinished': 0}
+        lock = threading.Lock()
+
+        def save_checkpoint():
+            # Replace the file whole, so an interruption never leaves half a checkpoint
+            temporary = checkpoint_path + '.tmp'
+            with open(temporary, 'w') as f:
+                json.dump({**plan, 'done': sorted(finished)}, f)
+            os.replace(temporary, checkpoint_path)
+
+        # Resolve shared lookups on this thread, so workers only fetch and write events
+        source_ids = self.resolve_source_ids()
+        target_id = self.get_calendar_id(self.TARGET_CALENDAR, create=True)
+        if self.apple_client:
+            self.get_apple_calendars()
+        self.get_keyword_matchers()
+
+        def run(chunk):
+            counts = self._mirror_window(*chunk, target_id, source_ids,
+                                         skip_earlier=chunk[0] != start_date)
+            with lock:
+                for key, count in counts.items():
+                    totals[key] += count
+                if counts['failed']:
+                    return
+                finished.add(chunk[0].isoformat())
+                totals['done'] += 1
+                if checkpoint_path:
+                    save_checkpoint()
+
+        from concurrent.futures import ThreadPoolExecutor
+
+        pool = ThreadPoolExecutor(max_workers=workers or self.BACKFILL_WORKERS)
+        try:
+            futures = [(chunk, pool.submit(run, chunk)) for chunk in pending]
+            for (chunk_start, chunk_end), future in futures:
+                try:
+                    future.result()
+                except Exception as e:
+                    print(f"Error backfilling {chunk_start:%Y-%m-%d} to {chunk_end:%Y-%m-%d}: {e}")
+        finally:
+            # On interruption, drop chunks that haven't started; the checkpoint has the rest
+            pool.shutdown(cancel_futures=True)
+
+        totals['unfinished'] = len(pending) - totals['done']
+        if totals['written']:
+            self.invalidate_testcal_index()
+            self.invalidate_availability()
+        return totals
+
+    def get_keyword_matchers(self):
+        """Compile the keyword rules once and return (location, meeting, category) matchers"""
+        rules = (self.VIRTUAL_LOCATION_KEYWORDS, self.VIRTUAL_MEETING_KEYWORDS,
+                 self.CATEGORY_KEYWORDS)
+        if (self.keyword_matchers is None or
+                any(old is not new for old, new in zip(self.keyword_matchers[0], rules))):
+            self.keyword_matchers = (rules, (
+                KeywordMatcher([('virtual', self.VIRTUAL_LOCATION_KEYWORDS)]),
+                KeywordMatcher([('meeting', self.VIRTUAL_MEETING_KEYWORDS)]),
+                KeywordMatcher(self.CATEGORY_KEYWORDS),
+            ))
+            self.category_memo = {}
+        return self.keyword_matchers[1]
+
+    def get_thread_keyword_matchers(self):
+        """
+        Return (matchers, category memo) that are safe to use from the current thread
+        Matchers memoise tokens as they match, so worker threads compile their own
+        and keep their own memo, like get_thread_google_service.
+        """
+        matchers = self.get_keyword_matchers()
+        if threading.current_thread() is threading.main_thread():
+            return matchers, self.category_memo
+        local = getattr(self.thread_local, 'keyword_matchers', None)
+        if local is None or local[0] is not matchers:
+            local = (matchers, tuple(KeywordMatcher(matcher.rules, matcher.max_cached_tokens)
+                                     for matcher in matchers), {})
+            self.thread_local.keyword_matchers = local
+        return local[1], local[2]
+
+    def get_category_rules(self):
+        """Validate and compile CATEGORY_MINIMUMS and CATEGORY_CONSTRAINTS once"""
+        tables = (self.CATEGORY_MINIMUMS, self.CATEGORY_CONSTRAINTS)
+        if (self.category_rules is None or
+                any(old is not new for old, new in zip(self.category_rules[0], tables))):
+            self.category_rules = (tables, CategoryRules(*tables))
+        return self.category_rules[1]
+
+    def load_category_rules(self, path):
+        """
+        Replace the minimums and/or constraints with those in a JSON or YAML file
+        A table the file leaves out is kept. The result is validated straight away.
+        Returns:
+            CategoryRules
+        """
+        tables = load_rule_tables(path)
+        self.CATEGORY_MINIMUMS = tables.get('minimums', self.CATEGORY_MINIMUMS)
+        self.CATEGORY_CONSTRAINTS = tables.get('constraints', self.CATEGORY_CONSTRAINTS)
+        return self.get_category_rules()
+
+    def categorize_event(self, event, matchers=None, memo=None):
         """Determine category for an event based on title and description"""
-        title = event.get('summary', '').lower()
-        description = event.get('description', '').lower()
-        location = event.get('location', '').lower()
+        location_matcher, meeting_matcher, category_matcher = (
+            matchers or self.get_keyword_matchers())
+        if memo is None:
+            memo = self.category_memo
+        summary = event.get('summary', '')
+        description = event.get('description', '')
+        location = event.get('location', '')
+
+        # Recurring instances repeat the same text, so remember recent answers
+        key = (summary, description, location)
+        category = memo.get(key)
+        if category is not None:
+            return category
+
+        # Keywords never contain a newline, so one joined text stands in for both fields
+        text = f"{summary}\n{description}".lower()
         
         # Check for virtual work meetings
-        if ('virtual' in location or 'zoom' in location or 'teams' in location or 
-            'meet.google.com' in location):
-            if any(word in title or word in description for word in 
-                  ['meeting', 'conference', 'presentation', 'call']):
-                return 'Work'
-        
-        # Bri (highest priority)
-        if any(word in title or word in description for word in 
-               ['bri', 'date', 'anniversary', 'couple']):
-            return 'Bri'
-        
-        # Work (second priority)
-        if any(word in title or word in description for word in 
-               ['work', 'meeting', 'project', 'conference', 'presentation', 
-                'deadline', 'interview', 'client', 'report', 'office']):
-            return 'Work'
-        
-        # Writing (third priority)
-        if any(word in title or word in description for word in 
-               ['writing', 'blog', 'article', 'draft', 'edit', 'compose', 
-                'document', 'manuscript']):
-            return 'Writing'
-        
-        # Workout (fourth priority)
-        if any(word in title or word in description for word in 
-               ['workout', 'gym', 'exercise', 'training', 'run', 'fitness', 
-                'yoga', 'swimming', 'sports']):
-            return 'Workout'
-        
-        # Meal categories
-        if any(word in title or word in description for word in 
-               ['breakfast', 'morning meal', 'second breakfast']):
-            return 'Breakfast'
-        if any(word in title or word in description for word in
-               ['elevenses', 'brunch', 'mid-morning meal']):
-            return 'Brunch'
-        if any(word in title or word in description for word in 
-                ['lunch', 'luncheon', 'noon meal']):
-            return 'Lunch'
-        if any(word in title or word in description for word in 
-                ['afternoon snack', 'tea', 'light meal']):
-            return 'Afternoon Tea'
-        if any(word in title or word in description for word in 
-                ['dinner', 'supper', 'evening meal']):
-            return 'Dinner'
-        
-        # Laundry and Cleaning
-        if any(word in title or word in description for word in 
-               ['laundry', 'cleaning', 'chores', 'housework', 'vacuum', 
-                'dishes', 'tidying', 'organize']):
-            return 'Laundry and Cleaning'
-        
-        # Sleep
-        if any(word in title or word in description for word in 
-               ['sleep', 'nap', 'rest', 'bedtime']):
-            return 'Sleep'
-        
-        # Health category
-        if any(word in title or word in description for word in 
-               ['doctor', 'medical', 'appointment', 'checkup', 'dentist',
-                'therapy', 'medication', 'hospital', 'clinic', 'physician',
-                'health', 'wellness', 'prescription', 'mental health',
-                'counseling', 'consultation', 'optometrist', 'specialist',
-                'physical therapy', 'vaccination', 'blood work']):
-            return 'Health'
-        
-        # Travel category (add before Free time check)
-        if any(word in title or word in description for word in 
-               ['travel', 'flight', 'train', 'bus', 'drive', 'trip', 'journey',
-                'airport', 'station', 'departure', 'arrival', 'transit',
-                'commute', 'layover', 'connecting', 'vacation', 'hotel',
-                'booking', 'rental car', 'uber', 'lyft', 'taxi']):
-            return 'Travel'
-        
-        # Free time (including gaming and streaming activities)
-        if any(word in title or word in description for word in 
-               ['free', 'break', 'relax', 'leisure', 'personal time',
-                'video games', 'gaming', 'ps5', 'playstation', 'xbox', 
-                'nintendo', 'switch', 'civ', 'civilization', 'twitch',
-                'stream', 'streaming', 'd&d', 'dnd', 'dungeons and dragons',
-                'game night', 'rpg', 'mmo', 'multiplayer', 'discord',
-                'minecraft', 'fortnite', 'warzone', 'apex']):
-            return 'Free'
-        
-        return 'Free'  # Default category if no matches found
+        if (location and location_matcher.match(location.lower()) and
+                meeting_matcher.match(text)):
+            category = 'Work'
+        else:
+            category = category_matcher.match(text) or 'Free'  # Default category if no matches found
+
+        if len(memo) >= self.CATEGORY_MEMO_SIZE:
+            memo.clear()
+        memo[key] = category
+        return category
+
+    def categorize_events(self, events):
+        """
+        Categorize many events with one set of compiled matchers
+        Yields:
+            str: Category for each event, in input order
+        """
+        matchers = self.get_keyword_matchers()
+        for event in events:
+            yield self.categorize_event(event, matchers)
 
     def add_to_testcal(self, event, category):
         """Add event to testcal with category"""
@@ -397,157 +1117,302 @@ def query_ollama(self, prompt):
             raise Exception("Google Calendar not authenticated")
 
         # Find or create testcal
-        calendar_list = self.google_service.calendarList().list().execute()
-        testcal_id = None
-        
-        for calendar in calendar_list['items']:
-            if calendar['summary'] == 'testcal':
-                testcal_id = calendar['id']
-                break
-
-        if not testcal_id:
-            # Create testcal if it doesn't exist
-            calendar = {
-                'summary': 'testcal',
-                'timeZone': 'UTC'
-            }
-            created_calendar = self.google_service.calendars().insert(
-                body=calendar).execute()
-            testcal_id = created_calendar['id']
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR, create=True)
 
         # Prepare event with category
-        event['description'] = f"{event.get('description', '')}\n[Category:{category}]"
+        set_event_category(event, category)
         
         # Add event to testcal
-        self.google_service.events().insert(
-            calendarId=testcal_id,
-            body=event
-        ).execute()
+        result = self._insert_event(testcal_id, event)
+        self._book_availability(testcal_id, *event_bounds(event))
+        if self.testcal_index is not None:
+            self.testcal_index.add_event(result if isinstance(result, dict) else event)
+        return result
+
+    def get_category_events(self, category, start_date=None, end_date=None,
+                            single_events=True, include_legacy=None):
+        """
+        Fetch only the testcal events stored under a category, filtered by the server
+        Events still tagged the legacy way, with [Category:X] in the description,
+        come from the synced testcal mirror, which only fetches changes after the
+        first call. Once migrate_category_tags() has moved them that scan is skipped.
+        Args:
+            single_events (bool): Expand recurring events into instances; when False,
+                series are returned once, as their master event
+            include_legacy (bool): Also scan for legacy description tags;
+                LEGACY_CATEGORY_TAGS by default
+        Returns:
+            list: Google event dicts, or None if testcal doesn't exist
+        """
+        if not self.google_service:
+            raise Exception("Google Calendar not authenticated")
+
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
+        if not testcal_id:
+            return None
+
+        params = {'privateExtendedProperty': category_filter(category)}
+        if single_events:
+            params['singleEvents'] = True
+        if start_date is not None:
+            params['timeMin'] = start_date.isoformat() + 'Z'
+        if end_date is not None:
+            params['timeMax'] = end_date.isoformat() + 'Z'
+        self._flush_before_read()
+        events, _ = self.get_calendar_sync().list_pages(testcal_id, **params)
+        if include_legacy is None:
+            include_legacy = self.LEGACY_CATEGORY_TAGS
+        if not include_legacy:
+            return events
+        return events + self._legacy_category_events(
+            testcal_id, category, start_date, end_date, single_events,
+            {event['id'] for event in events})
+
+    def _legacy_category_events(self, testcal_id, category, start_date, end_date,
+                                single_events, found):
+        """
+        testcal events tagged with a category only in the description, from the mirror
+        Args:
+            single_events (bool): When False, an expanded series is returned once,
+                as its master event
+            found (set): IDs the server-side category query already returned
+        """
+        legacy = []
+        series_ids = []
+        found = set(found)
+        for event in self.get_calendar_sync().sync(testcal_id).values():
+            if category not in tagged_categories(event.get('description')):
+                continue
+            event_start, event_end = event_bounds(event)
+            if ((start_date is not None and event_end <= start_date) or
+                    (end_date is not None and event_start >= end_date)):
+                continue
+            series_id = event.get('recurringEventId')
+            if not single_events and series_id:
+                if series_id not in series_ids:
+                    series_ids.append(series_id)
+            elif event['id'] not in found:
+                found.add(event['id'])
+                legacy.append(event)
+        for series_id in series_ids:
+            if series_id not in found:
+                legacy.append(self.google_service.events().get(
+                    calendarId=testcal_id, eventId=series_id).execute())
+        return legacy
 
     def remove_category_events(self, category):
-        """Remove all events with specified category from testcal"""
+        """
+        Remove all events with specified category from testcal
+        Only that category's events are fetched, and they are deleted in batches;
+        recurring series go with one delete of their master event.
+        Returns:
+            int: Number of events (or series) deleted; failed deletes aren't counted
+        """
+        events = self.get_category_events(category, single_events=False)
+        if not events:
+            return 0
+
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
+        with self.buffered_writes() as buffer:
+            handles = [self._delete_event(testcal_id, event['id']) for event in events]
+            buffer.flush()  # Also when an enclosing buffered_writes() is still open
+        failed = {id(handle) for handle in buffer.failed}
+        deleted = [event for event, handle in zip(events, handles) if id(handle) not in failed]
+
+        if any(event.get('recurrence') for event in deleted):
+            # Instances are indexed under their own IDs; rebuild both on next use
+            self.invalidate_testcal_index()
+            self.invalidate_availability()
+        else:
+            for event in deleted:
+                if self.testcal_index is not None:
+                    self.testcal_index.remove(event['id'])
+                self._release_availability(testcal_id, event['id'], *event_bounds(event))
+        return len(deleted)
+
+    def migrate_category_tags(self, dry_run=False):
+        """
+        One-time move of legacy [Category:X] description tags into extended properties
+        Each tagged event gets its first tag as the private category property and
+        loses that tag from its description, so server-side category queries find
+        it. Events that already have the property are left alone. When nothing is
+        left to move, LEGACY_CATEGORY_TAGS is cleared and category queries stop
+        scanning descriptions.
+        Args:
+            dry_run (bool): Only count the events that would change
+        Returns:
+            int: Number of events migrated (or that would be)
+        """
         if not self.google_service:
             raise Exception("Google Calendar not authenticated")
 
-        # Find testcal
-        calendar_list = self.google_service.calendarList().list().execute()
-        testcal_id = None
-        
-        for calendar in calendar_list['items']:
-            if calendar['summary'] == 'testcal':
-                testcal_id = calendar['id']
-                break
-
-        if testcal_id:
-            events_result = self.google_service.events().list(
-                calendarId=testcal_id,
-                singleEvents=True
-            ).execute()
-
-            for event in events_result.get('items', []):
-                if f"[Category:{category}]" in event.get('description', ''):
-                    self.google_service.events().delete(
-                        calendarId=testcal_id,
-                        eventId=event['id']
-                    ).execute()
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
+        if not testcal_id:
+            return 0
+
+        self._flush_before_read()
+        # Without singleEvents a recurring series is migrated once, through its master
+        events, _ = self.get_calendar_sync().list_pages(testcal_id)
+        migrated = 0
+        handles = []
+        with self.buffered_writes() as buffer:
+            for event in events:
+                if event.get('status') == 'cancelled':
+                    continue
+                private = (event.get('extendedProperties') or {}).get('private') or {}
+                tags = tagged_categories(event.get('description'))
+                if CATEGORY_PROPERTY in private or not tags:
+                    continue
+                migrated += 1
+                if dry_run:
+                    continue
+                body = json.loads(json.dumps(event))  # Don't mutate the listed event
+                body['description'] = LEGACY_CATEGORY_TAG.sub(
+                    '', body['description'], count=1)
+                handles.append(self._update_event(testcal_id, event['id'],
+                                                  set_event_category(body, tags[0])))
+            buffer.flush()  # Also when an enclosing buffered_writes() is still open
+        failed = {id(handle) for handle in buffer.failed}
+        if migrated == 0 or not (dry_run or any(id(handle) in failed for handle in handles)):
+            self.LEGACY_CATEGORY_TAGS = False
+        if migrated and not dry_run:
+            self.invalidate_testcal_index()
+        return migrated
 
     def adjust_event_time(self, event_id, new_start_time, new_end_time):
         """Adjust start and end time for an event in testcal"""
         if not self.google_service:
             raise Exception("Google Calendar not authenticated")
+        new_start_time, new_end_time = naive_utc(new_start_time), naive_utc(new_end_time)
 
-        calendar_list = self.google_service.calendarList().list().execute()
-        testcal_id = None
-        
-        for calendar in calendar_list['items']:
-            if calendar['summary'] == 'testcal':
-                testcal_id = calendar['id']
-                break
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
 
         if testcal_id:
-            event = self.google_service.events().get(
-                calendarId=testcal_id,
-                eventId=event_id
-            ).execute()
+            known_event = self.get_testcal_index().get(event_id)
+            if known_event is not None:
+                event = json.loads(json.dumps(known_event))  # Don't mutate the mirror
+            else:
+                self._flush_before_read()
+                event = self.google_service.events().get(
+                    calendarId=testcal_id,
+                    eventId=event_id
+                ).execute()
 
+            old_start, old_end = event_bounds(event)
             event['start']['dateTime'] = new_start_time.isoformat()
             event['end']['dateTime'] = new_end_time.isoformat()
 
-            self.google_service.events().update(
-                calendarId=testcal_id,
-                eventId=event_id,
-                body=event
-            ).execute()
+            result = self._update_event(testcal_id, event_id, event)
+            self.testcal_index.add(event_id, new_start_time, new_end_time, event)
+            if self.availability is not None:
+                self._release_availability(testcal_id, event_id, old_start, old_end)
+                self.availability.book(testcal_id, new_start_time, new_end_time)
+            return result
 
     def get_availability(self, start_date, end_date):
-        """Retrieve availability from testcal"""
-        if not self.google_service:
-            raise Exception("Google Calendar not authenticated")
+        """
+        Retrieve availability from testcal
+        Answered from the availability cache, so repeated checks cost no requests.
+        Returns:
+            list: Busy periods as freebusy-style {'start', 'end'} dicts (UTC)
+        """
+        self._check_google_reads()
 
-        calendar_list = self.google_service.calendarList().list().execute()
-        testcal_id = None
-        
-        for calendar in calendar_list['items']:
-            if calendar['summary'] == 'testcal':
-                testcal_id = calendar['id']
-                break
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
 
         if testcal_id:
-            free_busy_query = {
-                'timeMin': start_date.isoformat(),
-                'timeMax': end_date.isoformat(),
-                'items': [{'id': testcal_id}]
-            }
-
-            free_busy = self.google_service.freebusy().query(
-                body=free_busy_query
-            ).execute()
-
-            return free_busy.get('calendars', {}).get(testcal_id, {}).get('busy', [])
+            cache = self.get_availability_cache(start_date, end_date)
+            return [{'start': max(busy_start, start_date).isoformat() + 'Z',
+                     'end': min(busy_end, end_date).isoformat() + 'Z'}
+                    for busy_start, busy_end in
+                    cache.busy_periods(start_date, end_date, [testcal_id])]
+
+    def get_availability_calendar_ids(self):
+        """IDs of testcal and the Google source calendars that exist"""
+        names = [self.TARGET_CALENDAR] + list(self.SOURCE_CALENDARS)
+        return [calendar_id for calendar_id in dict.fromkeys(
+                self.get_calendar_id(name) for name in names) if calendar_id]
+
+    def get_availability_cache(self, start_date, end_date, refresh=False):
+        """
+        Return busy time for testcal and the Google source calendars over a window
+        The cache is seeded from one freebusy query over every calendar and then
+        kept current locally as the agent books, moves and deletes events. A
+        window it doesn't cover (or refresh=True) queries the server again.
+        """
+        calendar_ids = self.get_availability_calendar_ids()
+        cache = self.availability
+        if (not refresh and cache is not None and
+                cache.covers(start_date, end_date, calendar_ids)):
+            return cache
+        if cache is not None:
+            # Keep answering for the window already cached
+            start_date = min(start_date, cache.start_date)
+            end_date = max(end_date, cache.end_date)
+
+        if self.offline:
+            self.availability = AvailabilityCache(
+                start_date, end_date,
+                self.event_store.busy_periods(calendar_ids, start_date, end_date))
+            return self.availability
+
+        self._flush_before_read()
+        free_busy = self.google_service.freebusy().query(body={
+            'timeMin': start_date.isoformat() + 'Z',
+            'timeMax': end_date.isoformat() + 'Z',
+            'items': [{'id': calendar_id} for calendar_id in calendar_ids],
+        }).execute()
+        self.availability = AvailabilityCache.from_freebusy(free_busy, start_date, end_date)
+        return self.availability
+
+    def refresh_availability(self):
+        """Reconcile the availability cache with the server, if one is in use"""
+        if self.availability is not None:
+            self.get_availability_cache(self.availability.start_date,
+                                        self.availability.end_date, refresh=True)
+
+    def invalidate_availability(self):
+        """Drop the availability cache; the next check queries the server"""
+        self.availability = None
+
+    def _book_availability(self, calendar_id, start, end):
+        if self.availability is not None:
+            self.availability.book(calendar_id, start, end)
+
+    def _release_availability(self, calendar_id, event_id, start, end):
+        """Free an event's time, keeping any other indexed testcal event there busy"""
+        if self.availability is None:
+            return
+        still_busy = []
+        if self.testcal_index is not None:
+            still_busy = [event_bounds(event) for event in
+                          self.testcal_index.overlapping(start, end)
+                          if event.get('id') != event_id]
+        self.availability.release(calendar_id, start, end, still_busy)
 
     def create_new_event(self, title, start_time, end_time, description="", category=None):
         """Create and add a new event to testcal"""
         if not self.google_service:
             raise Exception("Google Calendar not authenticated")
+        start_time, end_time = naive_utc(start_time), naive_utc(end_time)
 
         # Get testcal ID
-        calendar_list = self.google_service.calendarList().list().execute()
-        testcal_id = next((cal['id'] for cal in calendar_list['items'] 
-                          if cal['summary'] == 'testcal'), None)
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
 
         if testcal_id:
             # Check if this is a work event and determine location
             location = None
             if category == 'Work':
-                # Check if it's Tuesday (1), Wednesday (2), or Thursday (3)
-                if start_time.weekday() in [1, 2, 3]:
-                    # Check for non-virtual, non-work events before 3 PM
-                    day_start = start_time.replace(hour=0, minute=0, second=0)
-                    cutoff_time = start_time.replace(hour=15, minute=0, second=0)
-                    
-                    events_result = self.google_service.events().list(
-                        calendarId=testcal_id,
-                        timeMin=day_start.isoformat() + 'Z',
-                        timeMax=cutoff_time.isoformat() + 'Z',
-                        singleEvents=True
-                    ).execute()
-
-                    has_in_person_event = False
-                    for event in events_result.get('items', []):
-                        event_category = next((cat for cat in self.CATEGORIES 
-                                            if f"[Category:{cat}]" in event.get('description', '')), None)
-                        if (event_category != 'Work' and 
-                            event.get('location') and 
-                            'virtual' not in event.get('location', '').lower()):
-                            has_in_person_event = True
-                            break
-
-                    if not has_in_person_event:
-                        location = "141 W Jackson Blvd, Chicago, IL"
+                day_start = start_time.replace(hour=0, minute=0, second=0)
+                cutoff_time = start_time.replace(hour=15, minute=0, second=0)
+                location = work_location(
+                    start_time, self.get_testcal_index().overlapping(day_start, cutoff_time),
+                    self.CATEGORIES)
 
             event = {
+                'id': uuid.uuid4().hex,  # Client-side ID so buffered inserts can be indexed
                 'summary': title,
-                'description': f"{description}\n[Category:{category}]" if category else description,
+                'description': description,
                 'start': {
                     'dateTime': start_time.isoformat(),
                     'timeZone': 'UTC',
@@ -561,11 +1426,14 @@ def query_ollama(self, prompt):
             # Add location if set
             if location:
                 event['location'] = location
+            if category:
+                set_event_category(event, category)
 
-            return self.google_service.events().insert(
-                calendarId=testcal_id,
-                body=event
-            ).execute()
+            # Returns a PendingWrite handle instead of the event while buffering
+            result = self._insert_event(testcal_id, event)
+            self.get_testcal_index().add(event['id'], start_time, end_time, event)
+            self._book_availability(testcal_id, start_time, end_time)
+            return result
 
     def calculate_category_hours(self, start_date=None, end_date=None):
         """
@@ -576,57 +1444,133 @@ def query_ollama(self, prompt):
         Returns:
             tuple: (success boolean, dictionary of category hours)
         """
-        if not self.google_service:
-            raise Exception("Google Calendar not authenticated")
+        self._check_google_reads()
 
         # If no dates provided, use next month range
         if start_date is None or end_date is None:
             start_date, end_date = self.get_next_month_range()
         
         # Ensure end_date includes the full day
-        end_date = end_date.replace(hour=23, minute=59, minute=59)
+        end_date = end_date.replace(hour=23, minute=59, second=59)
 
-        calendar_list = self.google_service.calendarList().list().execute()
-        testcal_id = None
+        rollup = self.get_category_rollup(start_date, end_date)
+        if rollup is None:
+            return False, {}
+        return True, rollup.totals()
+
+    def get_category_rollup(self, start_date, end_date):
+        """
+        Build per-day, per-week and per-month category hours for testcal
+        Returns:
+            CategoryRollup, or None if testcal doesn't exist
+        """
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
+        if not testcal_id:
+            return None
+
+        self._flush_before_read()
+        testcal_records = self.get_records(
+            testcal_id, start_date, end_date)
+        return CategoryRollup.from_records(
+            self.CATEGORIES, testcal_records, start_date, end_date)
+
+    def get_category_strategy(self, category, needed_hours, slot_count):
+        """Ask the AI for the scheduling strategy (1-4) for a single category"""
+        constraints = self.get_category_rules().describe(category)
+        prompt = f"""
+        Help schedule {needed_hours} hours of {category} with these constraints:
+        - Preferred start time: {constraints['preferred_start_time']}
+        - Preferred end time: {constraints['preferred_end_time']}
+        - Must be consecutive hours: {constraints['consecutive_hours']}
+        - Weekday only: {constraints['weekday_only']}
+        - Current available slots: {slot_count} slots
+        
+        Should we: 
+        1. Schedule in larger blocks
+        2. Split into smaller sessions
+        3. Stick strictly to preferred times
+        4. Be flexible with timing
+        
+        Respond with ONLY the number of your recommendation (1-4).
+        """
+        
+        strategy = self.query_ollama(prompt)
+        try:
+            strategy = int(strategy.strip())
+        except:
+            strategy = 1  # Default to larger blocks if AI fails
+        return strategy
+
+    def get_category_strategies(self, needed_hours, slot_count):
+        """
+        Ask the AI for every category's scheduling strategy in one request
+        Args:
+            needed_hours (dict): Category name -> hours still needed
+            slot_count (int): Number of free slots available
+        Returns:
+            dict: Category name -> strategy (1-4)
+        """
+        if not needed_hours:
+            return {}
+
+        rules = self.get_category_rules()
+        lines = []
+        for category, hours in needed_hours.items():
+            constraints = rules.describe(category)
+            lines.append(
+                f"- {category}: {hours} hours, "
+                f"preferred {constraints['preferred_start_time']}"
+                f"-{constraints['preferred_end_time']}, "
+                f"consecutive: {constraints['consecutive_hours']}, "
+                f"weekday only: {constraints['weekday_only']}")
+        category_lines = '\n'.join(lines)
+        prompt = f"""
+        Help schedule these categories into {slot_count} available slots:
+{category_lines}
         
-        for calendar in calendar_list['items']:
-            if calendar['summary'] == 'testcal':
-                testcal_id = calendar['id']
-                break
+        For each category, should we: 
+        1. Schedule in larger blocks
+        2. Split into smaller sessions
+        3. Stick strictly to preferred times
+        4. Be flexible with timing
+        
+        Respond with ONLY a JSON object mapping each category name to the
+        number of your recommendation (1-4), for example {{"Sleep": 1}}.
+        """
 
-        if testcal_id:
-            events_result = self.google_service.events().list(
-                calendarId=testcal_id,
-                timeMin=start_date.isoformat() + 'Z',
-                timeMax=end_date.isoformat() + 'Z',
-                singleEvents=True
-            ).execute()
-
-            category_hours = {category: 0 for category in self.CATEGORIES}
-
-            for event in events_result.get('items', []):
-                description = event.get('description', '')
-                for category in self.CATEGORIES:
-                    if f"[Category:{category}]" in description:
-                        # Parse event start and end times
-                        start = datetime.fromisoformat(
-                            event['start'].get('dateTime', event['start'].get('date')))
-                        end = datetime.fromisoformat(
-                            event['end'].get('dateTime', event['end'].get('date')))
-                        
-                        # Adjust start time if before requested start_date
-                        if start < start_date:
-                            start = start_date
-                        # Adjust end time if after requested end_date
-                        if end > end_date:
-                            end = end_date
-                        
-                        duration = (end - start).total_seconds() / 3600
-                        category_hours[category] += duration
-
-            return True, category_hours
-
-        return False, {}
+        strategies = self.parse_strategies(
+            self.query_ollama(prompt, response_format='json'), needed_hours)
+
+        # Fall back to one request per category the batched answer missed
+        for category, hours in needed_hours.items():
+            if category not in strategies:
+                strategies[category] = self.get_category_strategy(category, hours, slot_count)
+        return strategies
+
+    def parse_strategies(self, response, categories):
+        """Pull valid 1-4 strategies for known categories out of a JSON AI response"""
+        if not response:
+            return {}
+        # Tolerate prose or code fences around the object
+        start, end = response.find('{'), response.rfind('}')
+        try:
+            answer = json.loads(response[start:end + 1]) if start >= 0 else None
+        except ValueError:
+            answer = None
+        if not isinstance(answer, dict):
+            return {}
+
+        strategies = {}
+        for category, value in answer.items():
+            if category not in categories or isinstance(value, bool):
+                continue
+            try:
+                strategy = int(str(value).strip())
+            except ValueError:
+                continue
+            if 1 <= strategy <= 4:
+                strategies[category] = strategy
+        return strategies
 
     def fill_minimum_hours(self, start_date, end_date):
         """
@@ -635,326 +1579,565 @@ def query_ollama(self, prompt):
         if not self.google_service:
             raise Exception("Google Calendar not authenticated")
 
-        # Get current availability
-        busy_slots = self.get_availability(start_date, end_date)
-        success, current_hours = self.calculate_category_hours(start_date, end_date)
-        if not success:
+        plan = self.plan_minimum_hours(start_date, end_date)
+        if plan is None:
             return False
+        return self.commit_plan(plan)
 
-        total_days = (end_date - start_date).days + 1
-        total_weeks = total_days // 7
-
-        # Create available time slots
-        available_slots = []
-        current_time = start_date
-        
-        # Convert busy slots to datetime objects
-        busy_periods = [(datetime.fromisoformat(slot['start'].replace('Z', '')),
-                        datetime.fromisoformat(slot['end'].replace('Z', '')))
-                       for slot in busy_slots]
-
-        # Find available slots
-        while current_time < end_date:
-            slot_start = current_time
-            
-            # Find next busy period or end of day
-            next_busy = None
-            for busy_start, busy_end in busy_periods:
-                if busy_start > current_time:
-                    if next_busy is None or busy_start < next_busy:
-                        next_busy = busy_start
-            
-            slot_end = (next_busy if next_busy 
-                       else current_time.replace(hour=23, minute=59, second=59))
-            
-            # Only add slots longer than 30 minutes
-            if (slot_end - slot_start).total_seconds() > 1800:  # 30 minutes
-                available_slots.append((slot_start, slot_end))
-            
-            current_time = (next_busy if next_busy 
-                          else (current_time + timedelta(days=1)).replace(
-                              hour=0, minute=0, second=0))
-
-        # Process Sleep first to establish base schedule
-        sleep_category = next((cat for cat in self.CATEGORY_MINIMUMS 
-                             if cat['category'] == 'Sleep'), None)
-        workout_category = next((cat for cat in self.CATEGORY_MINIMUMS 
-                               if cat['category'] == 'Workout'), None)
-        sss_category = next((cat for cat in self.CATEGORY_MINIMUMS 
-                           if cat['category'] == 'SSS'), None)
-        
-        # Remove these categories from regular processing
-        remaining_categories = [cat for cat in self.CATEGORY_MINIMUMS 
-                              if cat['category'] not in ['Sleep', 'Workout', 'SSS']]
-
-        # Process Sleep slots first
-        if sleep_category:
-            # Calculate needed hours for Sleep
-            daily_sleep_need = sleep_category['daily'] * total_days
-            weekly_sleep_need = sleep_category['weekly'] * total_weeks
-            monthly_sleep_need = sleep_category['monthly']
-            sleep_needed_hours = max(daily_sleep_need, weekly_sleep_need, monthly_sleep_need) - current_hours.get('Sleep', 0)
-
-            # Apply sleep maximum of 8 hours per day
-            max_sleep_hours = 8 * total_days
-            if sleep_needed_hours > max_sleep_hours - current_hours.get('Sleep', 0):
-                sleep_needed_hours = max(0, max_sleep_hours - current_hours.get('Sleep', 0))
-
-            if sleep_needed_hours > 0:
-                # Ask AI for optimal sleep schedule
-                sleep_prompt = f"""
-                Help schedule {sleep_needed_hours} hours of Sleep with these constraints:
-                - Preferred start time: {sleep_category.get('preferred_start_time', 'any')}
-                - Preferred end time: {sleep_category.get('preferred_end_time', 'any')}
-                - Must be consecutive hours: {sleep_category.get('consecutive_hours', False)}
-                - Weekday only: {sleep_category.get('weekday_only', False)}
-                - Current available slots: {len(available_slots)} slots
-                
-                Should we: 
-                1. Schedule in larger blocks
-                2. Split into smaller sessions
-                3. Stick strictly to preferred times
-                4. Be flexible with timing
-                
-                Respond with ONLY the number of your recommendation (1-4).
-                """
-                
-                sleep_strategy = self.query_ollama(sleep_prompt)
-                try:
-                    sleep_strategy = int(sleep_strategy.strip())
-                except:
-                    sleep_strategy = 1  # Default to larger blocks if AI fails
-                    
-                hours_to_fill = sleep_needed_hours
-                available_slots = sorted(available_slots, key=lambda x: x[0])
-                
-                for start, end in available_slots:
-                    if hours_to_fill <= 0:
-                        break
-                        
-                    # Check constraints
-                    if sleep_category.get('weekday_only') and start.weekday() >= 5:
-                        continue
-                        
-                    slot_start_time = start.strftime('%H:%M')
-                    if (sleep_category.get('preferred_start_time') and 
-                        slot_start_time < sleep_category['preferred_start_time']):
-                        continue
-                        
-                    if (sleep_category.get('preferred_end_time') and 
-                        end.strftime('%H:%M') > sleep_category['preferred_end_time']):
-                        continue
-                    
-                    slot_duration = (end - start).total_seconds() / 3600
-                    
-                    # Apply AI strategy
-                    if sleep_strategy == 1:  # Larger blocks
-                        min_duration = 2.0  # Minimum 2 hours
-                    elif sleep_strategy == 2:  # Smaller sessions
-                        min_duration = 0.5  # 30 minutes
-                    else:  # Strategy 3 or 4
-                        min_duration = 1.0  # 1 hour
-                    
-                    if slot_duration >= min_duration:
-                        hours_to_use = min(
-                            slot_duration,
-                            hours_to_fill if sleep_strategy != 2 else min(2.0, hours_to_fill)
-                        )
-                        
-                        event_end = start + timedelta(hours=hours_to_use)
-                        
-                        # Create the event
-                        self.create_new_event(
-                            title="Scheduled Sleep",
-                            start_time=start,
-                            end_time=event_end,
-                            description=(f"Automatically scheduled to meet minimum hours\n"
-                                       f"AI Strategy: {sleep_strategy}"),
-                            category="Sleep"
-                        )
-                        
-                        hours_to_fill -= hours_to_use
-                        
-                        # Update available slot
-                        if hours_to_use < slot_duration:
-                            available_slots.append((event_end, end))
-                
-                available_slots.sort(key=lambda x: x[0])
-
-            # After each Sleep slot, schedule SSS and potentially Workout
-            for start, end in available_slots[:]:
-                if '[Category:Sleep]' in self.get_events_at_time(start):
-                    sleep_end = end
-                    
-                    # Schedule SSS immediately after Sleep
-                    sss_duration = 1  # 1 hour for SSS
-                    sss_end = sleep_end + timedelta(hours=sss_duration)
-                    
-                    # Check if it's morning hours (before 9 AM)
-                    is_morning = sleep_end.hour < 9
-                    
-                    if is_morning and workout_category:
-                        # Schedule Workout between Sleep and SSS
-                        workout_duration = 1.5  # 1.5 hours for morning workout
-                        self.create_new_event(
-                            title="Scheduled Workout",
-                            start_time=sleep_end,
-                            end_time=sleep_end + timedelta(hours=workout_duration),
-                            description="Morning workout following sleep",
-                            category="Workout"
-                        )
-                        
-                        # Adjust SSS start time to follow workout
-                        sss_start = sleep_end + timedelta(hours=workout_duration)
-                        self.create_new_event(
-                            title="Scheduled SSS",
-                            start_time=sss_start,
-                            end_time=sss_start + timedelta(hours=sss_duration),
-                            description="Morning SSS following workout",
-                            category="SSS"
-                        )
-                    else:
-                        # Just schedule SSS after Sleep
-                        self.create_new_event(
-                            title="Scheduled SSS",
-                            start_time=sleep_end,
-                            end_time=sss_end,
-                            description="SSS following sleep",
-                            category="SSS"
-                        )
-                    
-                    # Update available slots
-                    self.update_available_slots(available_slots)
-
-        # Process remaining categories
-        for category_min in remaining_categories:
-            category = category_min['category']
-            constraints = self.CATEGORY_CONSTRAINTS.get(category, {})
-            current = current_hours.get(category, 0)
-            
-            # Calculate needed hours
-            daily_need = category_min['daily'] * total_days
-            weekly_need = category_min['weekly'] * total_weeks
-            monthly_need = category_min['monthly']
-            needed_hours = max(daily_need, weekly_need, monthly_need) - current
-
-            # Apply sleep maximum of 8 hours per day
-            if category == 'Sleep':
-                max_sleep_hours = 8 * total_days
-                if current + needed_hours > max_sleep_hours:
-                    needed_hours = max(0, max_sleep_hours - current)
-
-            if needed_hours <= 0:
-                continue
+    def plan_minimum_hours(self, start_date, end_date):
+        """
+        Work out the changes testcal needs to meet minimum hours, without writing anything
+        Use plan.describe() for a dry run and commit_plan() to apply it.
+        Returns:
+            SchedulePlan, or None if testcal doesn't exist
+        """
+        self._check_google_reads()
 
-            # Ask AI for optimal scheduling strategy
-            prompt = f"""
-            Help schedule {needed_hours} hours of {category} with these constraints:
-            - Preferred start time: {constraints.get('preferred_start_time', 'any')}
-            - Preferred end time: {constraints.get('preferred_end_time', 'any')}
-            - Must be consecutive hours: {constraints.get('consecutive_hours', False)}
-            - Weekday only: {constraints.get('weekday_only', False)}
-            - Current available slots: {len(available_slots)} slots
-            
-            Should we: 
-            1. Schedule in larger blocks
-            2. Split into smaller sessions
-            3. Stick strictly to preferred times
-            4. Be flexible with timing
-            
-            Respond with ONLY the number of your recommendation (1-4).
-            """
-            
-            strategy = self.query_ollama(prompt)
-            try:
-                strategy = int(strategy.strip())
-            except:
-                strategy = 1  # Default to larger blocks if AI fails
-                
-            # Apply the strategy
-            hours_to_fill = needed_hours
-            available_slots = sorted(available_slots, key=lambda x: x[0])
-            
-            for start, end in available_slots:
-                if hours_to_fill <= 0:
-                    break
-                    
-                # Check constraints
-                if constraints.get('weekday_only') and start.weekday() >= 5:
-                    continue
-                    
-                slot_start_time = start.strftime('%H:%M')
-                if (constraints.get('preferred_start_time') and 
-                    slot_start_time < constraints['preferred_start_time']):
-                    continue
-                    
-                if (constraints.get('preferred_end_time') and 
-                    end.strftime('%H:%M') > constraints['preferred_end_time']):
-                    continue
-                
-                slot_duration = (end - start).total_seconds() / 3600
-                
-                # Apply AI strategy
-                if strategy == 1:  # Larger blocks
-                    min_duration = 2.0  # Minimum 2 hours
-                elif strategy == 2:  # Smaller sessions
-                    min_duration = 0.5  # 30 minutes
-                else:  # Strategy 3 or 4
-                    min_duration = 1.0  # 1 hour
-                
-                if slot_duration >= min_duration:
-                    hours_to_use = min(
-                        slot_duration,
-                        hours_to_fill if strategy != 2 else min(2.0, hours_to_fill)
-                    )
-                    
-                    event_end = start + timedelta(hours=hours_to_use)
-                    
-                    # Create the event
-                    self.create_new_event(
-                        title=f"Scheduled {category}",
-                        start_time=start,
-                        end_time=event_end,
-                        description=(f"Automatically scheduled to meet minimum hours\n"
-                                   f"AI Strategy: {strategy}"),
-                        category=category
-                    )
-                    
-                    hours_to_fill -= hours_to_use
-                    
-                    # Update available slot
-                    if hours_to_use < slot_duration:
-                        available_slots.append((event_end, end))
-            
-            available_slots.sort(key=lambda x: x[0])
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
+        if not testcal_id:
+            return None
+
+        # Snapshot testcal, then plan without touching the network again
+        self._flush_before_read()
+        records = self.get_records(
+            testcal_id, start_date, end_date.replace(hour=23, minute=59, second=59))
+        planner = SchedulePlanner(start_date, end_date, records, self.get_category_rules(),
+                                  self.CATEGORIES)
+
+        # Ask the AI for every short category's strategy at once
+        needed = planner.needed_hours()
+        strategies = self.get_category_strategies(
+            {category: hours for category, hours in needed.items() if hours > 0},
+            planner.slot_count())
+        return planner.plan(strategies, engine=self.SCHEDULER,
+                            time_budget=self.SCHEDULER_TIME_BUDGET)
+
+    def reconcile_plan(self, plan):
+        """
+        Drop changes testcal already reflects, e.g. when a plan is applied twice
+        Returns:
+            SchedulePlan: Only the writes still needed
+        """
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
+        if not testcal_id:
+            return SchedulePlan(adds=plan.adds)
+
+        self._flush_before_read()
+        current = {record.id: record
+                   for record in self.get_records(testcal_id)}
+        present = {record_key(record) for record in current.values()
+                   if scheduled_category(record)}
+
+        reconciled = SchedulePlan(kept=plan.kept)
+        for planned in plan.adds:
+            if planned.key() in present:
+                reconciled.kept += 1
+            else:
+                reconciled.adds.append(planned)
+        for event_id, planned in plan.moves:
+            if planned.key() in present:
+                reconciled.kept += 1
+                if event_id in current and record_key(current[event_id]) != planned.key():
+                    reconciled.deletes.append(event_id)  # Someone else already placed it
+            elif event_id in current:
+                reconciled.moves.append((event_id, planned))
+            else:
+                reconciled.adds.append(planned)
+        reconciled.deletes += [event_id for event_id in plan.deletes if event_id in current]
+        return reconciled
+
+    def commit_plan(self, plan):
+        """
+        Apply a SchedulePlan to testcal as batched writes, skipping changes already made
+        Returns:
+            bool: True if every write succeeded
+        """
+        if not self.google_service:
+            raise Exception("Google Calendar not authenticated")
 
-        return True
+        plan = self.reconcile_plan(plan)
+        if not len(plan):
+            return True
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR, create=True)
+
+        with self.buffered_writes() as buffer:
+            index = self.get_testcal_index()
+            for event_id in plan.deletes:
+                current = index.get(event_id)
+                self._delete_event(testcal_id, event_id)
+                index.remove(event_id)
+                if current is not None:
+                    self._release_availability(testcal_id, event_id, *event_bounds(current))
+
+            for event_id, planned in plan.moves:
+                current = (index.get(event_id) or
+                           self.get_calendar_sync().events[testcal_id][event_id])
+                event = json.loads(json.dumps(current))  # Don't mutate the mirror
+                body = planned.body(event_id)
+                event.update({key: body[key] for key in ('description', 'start', 'end')})
+                if planned.location:
+                    event['location'] = planned.location
+                else:
+                    event.pop('location', None)
+                self._update_event(testcal_id, event_id, event)
+                index.add(event_id, planned.start, planned.end, event)
+                self._release_availability(testcal_id, event_id, *event_bounds(current))
+                self._book_availability(testcal_id, planned.start, planned.end)
+
+            for planned in plan.adds:
+                event = planned.body()
+                self._insert_event(testcal_id, event)
+                index.add(event['id'], planned.start, planned.end, event)
+                self._book_availability(testcal_id, planned.start, planned.end)
+            buffer.flush()
+        # Local bookkeeping stood in for the server until now; check it against the result
+        self.refresh_availability()
+        return not buffer.failed
 
     def get_events_at_time(self, time):
         """Helper method to get events at a specific time"""
-        if not self.google_service:
-            raise Exception("Google Calendar not authenticated")
+        self._check_google_reads()
+        time = naive_utc(time)
             
-        calendar_list = self.google_service.calendarList().list().execute()
-        testcal_id = next((cal['id'] for cal in calendar_list['items'] 
-                          if cal['summary'] == 'testcal'), None)
+        testcal_id = self.get_calendar_id(self.TARGET_CALENDAR)
         
         if testcal_id:
-            events_result = self.google_service.events().list(
-                calendarId=testcal_id,
-                timeMin=(time - timedelta(minutes=1)).isoformat() + 'Z',
-                timeMax=(time + timedelta(minutes=1)).isoformat() + 'Z',
-                singleEvents=True
-            ).execute()
+            if self.offline:
+                # One indexed range scan of the store
+                nearby_events = self.event_store.records(
+                    testcal_id, time - timedelta(minutes=1), time + timedelta(minutes=1))
+            else:
+                # Answered from the local index; no request per slot
+                nearby_events = self.get_testcal_index().overlapping(
+                    time - timedelta(minutes=1), time + timedelta(minutes=1))
             
-            return [event.get('description', '') for event in events_result.get('items', [])]
+            return [event.get('description', '') for event in nearby_events]
         return []
 
     def update_available_slots(self, slots):
-        """Helper method to update available slots after scheduling"""
-        busy_slots = self.get_availability(slots[0][0], slots[-1][1])
-        
-        # Remove slots that are now occupied
-        slots[:] = [(start, end) for start, end in slots 
-                   if not any(busy_start <= start < busy_end 
-                            for busy_start, busy_end in busy_slots)]
+        """
+        Helper method to update available slots after scheduling
+        Cuts the busy parts out of each (start, end) slot in place, keeping what
+        is still free, using the availability cache instead of a server query.
+        """
+        if not slots:
+            return
+        cache = self.get_availability_cache(min(start for start, end in slots),
+                                            max(end for start, end in slots))
+        remaining = []
+        for start, end in slots:
+            cursor = start
+            for busy_start, busy_end in cache.busy_periods(start, end):
+                if busy_start > cursor:
+                    remaining.append((cursor, busy_start))
+                cursor = max(cursor, busy_end)
+            if cursor < end:
+                remaining.append((cursor, end))
+        slots[:] = remaining
+
+def run_tenant(config):
+    """
+    Run one tenant's minimum-hours fill in a fresh agent
+    Never raises, so one tenant's failure can't take the batch down.
+    Args:
+        config (dict): Tenant settings:
+            name, credentials, token: Google client secrets and saved token paths
+            apple (dict, optional): url, username and password for CalDAV
+            source_calendars, target_calendar (optional): Calendar names
+            minimums, constraints (optional): CATEGORY_MINIMUMS / CATEGORY_CONSTRAINTS
+            rules (optional): JSON or YAML file of minimums and/or constraints,
+                applied over the two above
+            start_date, end_date (optional): ISO dates; next month by default
+            sync_state (optional): Path for saved sync tokens and mirrored events
+            scheduler (optional): Engine name in SCHEDULING_ENGINES
+            legacy_category_tags (optional): False once testcal's description tags
+                have been migrated, so category queries skip scanning for them
+            dry_run (optional): Plan only, without writing
+            api_log (optional): Path to append one JSON line per API call to
+            google_rate (optional): Google queries per second for this tenant's
+                rate limiter
+            event_store (optional): SQLite file the tenant's synced events are kept in
+    Returns:
+        dict: name, ok, error, changes, seconds spent per stage in timings, and
+            the API telemetry summary line in api
+    """
+    result = {'name': config.get('name'), 'ok': False, 'error': None,
+              'changes': None, 'timings': {}, 'api': None}
+    agent = api_log = None
+    began = time.perf_counter()
+
+    @contextmanager
+    def stage(name):
+        stage_began = time.perf_counter()
+        try:
+            yield
+        finally:
+            result['timings'][name] = time.perf_counter() - stage_began
+
+    try:
+        agent = AuDRACalendarAgent()
+        agent.SOURCE_CALENDARS = config.get('source_calendars', agent.SOURCE_CALENDARS)
+        agent.TARGET_CALENDAR = config.get('target_calendar', agent.TARGET_CALENDAR)
+        agent.CATEGORY_MINIMUMS = config.get('minimums', agent.CATEGORY_MINIMUMS)
+        agent.CATEGORY_CONSTRAINTS = config.get('constraints', agent.CATEGORY_CONSTRAINTS)
+        if config.get('rules'):
+            agent.load_category_rules(config['rules'])
+        else:
+            agent.get_category_rules()  # Fail bad tables before authenticating
+        agent.SCHEDULER = config.get('scheduler', agent.SCHEDULER)
+        agent.LEGACY_CATEGORY_TAGS = config.get('legacy_category_tags',
+                                                agent.LEGACY_CATEGORY_TAGS)
+        agent.google_limiter.rate = config.get('google_rate', agent.google_limiter.rate)
+        if config.get('api_log'):
+            api_log = agent.telemetry.add_sink(JsonLinesSink(config['api_log']))
+
+        if config.get('event_store'):
+            agent.open_event_store(config['event_store'])
+
+        with stage('authenticate'):
+            agent.authenticate_google(config['credentials'], config.get('token'))
+            if config.get('apple'):
+                apple = config['apple']
+                agent.authenticate_apple(apple['url'], apple['username'], apple['password'])
+
+        sync_state = config.get('sync_state')
+        if sync_state and os.path.exists(sync_state):
+            with stage('load_sync_state'):
+                agent.load_sync_state(sync_state)
+
+        if config.get('start_date') and config.get('end_date'):
+            start_date = datetime.fromisoformat(config['start_date'])
+            end_date = datetime.fromisoformat(config['end_date'])
+        else:
+            start_date, end_date = agent.get_next_month_range()
+
+        with stage('plan'):
+            plan = agent.plan_minimum_hours(start_date, end_date)
+        if plan is None:
+            raise Exception(f"Calendar {agent.TARGET_CALENDAR!r} not found")
+        result['changes'] = len(plan)
+
+        if config.get('dry_run'):
+            result['ok'] = True
+        else:
+            with stage('commit'):
+                result['ok'] = agent.commit_plan(plan)
+            if not result['ok']:
+                result['error'] = "Some event writes failed"
+
+        if sync_state:
+            with stage('save_sync_state'):
+                agent.save_sync_state(sync_state)
+    except Exception as e:
+        result['error'] = f"{type(e).__name__}: {e}"
+    finally:
+        if api_log is not None:
+            api_log.close()
+        if agent is not None and agent.event_store is not None:
+            agent.event_store.close()
+    result['timings']['total'] = time.perf_counter() - began
+    if agent is not None:
+        result['api'] = agent.telemetry.summary_line()
+    return result
+
+
+def format_tenant_result(result):
+    """One-line summary of a run_tenant() result"""
+    timings = result['timings']
+    stages = ', '.join(f"{name} {seconds:.1f}s" for name, seconds in timings.items()
+                       if name != 'total')
+    status = 'ok' if result['ok'] else f"FAILED ({result['error']})"
+    changes = '' if result['changes'] is None else f", {result['changes']} changes"
+    api = f"\n  {result['api']}" if result.get('api') else ''
+    return (f"{result['name']}: {status} in {timings.get('total', 0):.1f}s"
+            f"{changes} [{stages}]{api}")
+
+
+def run_tenants(configs, max_workers=None):
+    """
+    Run every tenant's fill in a pool of worker processes
+    Each tenant gets its own agent in a separate process; at most max_workers
+    tenants run at once (default: one per core). A tenant that fails is
+    reported and the rest carry on. A worker process that dies breaks the
+    whole pool, so the tenants caught in it are rerun one process each.
+    Yields:
+        dict: run_tenant() results, in completion order
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    from concurrent.futures.process import BrokenProcessPool
+
+    configs = list(configs)
+    if not configs:
+        return
+    max_workers = min(max_workers or os.cpu_count() or 1, len(configs))
+
+    casualties = []
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(run_tenant, config): config for config in configs}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except BrokenProcessPool:
+                casualties.append(futures[future])
+                continue
+            print(format_tenant_result(result))
+            yield result
+
+    for config in casualties:
+        with ProcessPoolExecutor(max_workers=1) as pool:
+            try:
+                result = pool.submit(run_tenant, config).result()
+            except BrokenProcessPool as e:
+                result = {'name': config.get('name'), 'ok': False,
+                          'error': f"Worker process died: {e}",
+                          'changes': None, 'timings': {}, 'api': None}
+        print(format_tenant_result(result))
+        yield result
+
+
+def load_tenants(path):
+    """Read a JSON list of tenant configs for run_tenants()"""
+    with open(path) as f:
+        return json.load(f)
+
+
+def parse_date_range(agent, args):
+    """(start, end) from --start/--end ISO dates, defaulting to next month"""
+    if args.start and args.end:
+        return datetime.fromisoformat(args.start), datetime.fromisoformat(args.end)
+    if args.start or args.end:
+        raise Exception("Give both --start and --end, or neither")
+    return agent.get_next_month_range()
+
+
+def connect_google(agent, args):
+    """Authenticate from --credentials/--token, open --store and restore --state"""
+    agent.authenticate_google(args.credentials, args.token)
+    if args.store:
+        agent.open_event_store(args.store)
+    if args.state and os.path.exists(args.state):
+        agent.load_sync_state(args.state)
+
+
+def connect_apple(agent, args):
+    """Authenticate CalDAV from --apple-url/--apple-username when given"""
+    if args.apple_url:
+        agent.authenticate_apple(args.apple_url, args.apple_username,
+                                 os.environ.get('AUDRA_APPLE_PASSWORD', ''))
+
+
+def load_event_export(path):
+    """Events from a JSON export: a list of event dicts or an events().list() page"""
+    if path == '-':
+        data = json.load(sys.stdin)
+    else:
+        with open(path) as f:
+            data = json.load(f)
+    return data.get('items', []) if isinstance(data, dict) else data
+
+
+def command_categorize(agent, args):
+    events = load_event_export(args.export)
+    categories = agent.categorize_events(events)
+    if args.json:
+        print(json.dumps([{'id': event.get('id'), 'summary': event.get('summary'),
+                           'category': category}
+                          for event, category in zip(events, categories)], indent=2))
+    else:
+        for event, category in zip(events, categories):
+            print(f"{category}\t{event.get('summary', '')}")
+    return 0
+
+
+def command_hours(agent, args):
+    start_date, end_date = parse_date_range(agent, args)
+    if args.credentials or args.store:
+        if args.credentials:
+            connect_google(agent, args)
+        else:
+            agent.open_event_store(args.store, offline=True)
+        ok, hours = agent.calculate_category_hours(start_date, end_date)
+        if not ok:
+            raise Exception(f"Calendar {agent.TARGET_CALENDAR!r} not found")
+    else:
+        # Offline: roll up a calendar mirrored in a saved sync state
+        if not args.state:
+            raise Exception("Give --credentials to read testcal, --store to read an event "
+                            "store offline, or --state for a snapshot")
+        sync = agent.get_calendar_sync()
+        sync.load(args.state)
+        calendar_id = args.calendar
+        if calendar_id is None:
+            if len(sync.events) != 1:
+                raise Exception("Snapshot holds several calendars; pick one with --calendar: "
+                                + ', '.join(sync.events))
+            calendar_id = next(iter(sync.events))
+        records = [Event.from_google(event, calendar_id)
+                   for event in sync.events.get(calendar_id, {}).values()]
+        end_date = end_date.replace(hour=23, minute=59, second=59)
+        hours = CategoryRollup.from_records(agent.CATEGORIES, records,
+                                            start_date, end_date).totals()
+    for category, total in hours.items():
+        print(f"{category:<22} {total:8.2f}")
+    return 0
+
+
+def command_fill(agent, args):
+    if args.rules:
+        agent.load_category_rules(args.rules)
+    connect_google(agent, args)
+    agent.SCHEDULER = args.scheduler or agent.SCHEDULER
+    start_date, end_date = parse_date_range(agent, args)
+    plan = agent.plan_minimum_hours(start_date, end_date)
+    if plan is None:
+        raise Exception(f"Calendar {agent.TARGET_CALENDAR!r} not found")
+    print(plan.describe())
+    ok = True
+    if not args.dry_run:
+        ok = agent.commit_plan(plan)
+        if not ok:
+            print("Some event writes failed")
+    if args.state:
+        # Pick up the blocks just written so the snapshot reflects them
+        agent.get_calendar_sync().sync(agent.get_calendar_id(agent.TARGET_CALENDAR))
+        agent.save_sync_state(args.state)
+    return 0 if ok else 1
+
+
+def command_sync(agent, args):
+    connect_google(agent, args)
+    sync = agent.get_calendar_sync()
+    for name in args.calendar or [*agent.SOURCE_CALENDARS, agent.TARGET_CALENDAR]:
+        calendar_id = agent.get_calendar_id(name)
+        if not calendar_id:
+            print(f"{name}: not found")
+            continue
+        print(f"{name}: {len(sync.sync(calendar_id))} events")
+    agent.save_sync_state(args.state)
+    return 0
+
+
+def command_mirror(agent, args):
+    connect_google(agent, args)
+    connect_apple(agent, args)
+    start_date, end_date = parse_date_range(agent, args)
+    counts = agent.mirror_to_testcal(start_date, end_date)
+    if args.state:
+        agent.save_sync_state(args.state)
+    print(f"{counts['read']} events read: {counts['written']} written, "
+          f"{counts['existing']} already in {agent.TARGET_CALENDAR}, {counts['failed']} failed")
+    return 0 if not counts['failed'] else 1
+
+
+def command_backfill(agent, args):
+    connect_google(agent, args)
+    connect_apple(agent, args)
+    totals = agent.backfill(datetime.fromisoformat(args.start),
+                            datetime.fromisoformat(args.end), args.checkpoint,
+                            args.chunk_days, args.workers)
+    print(f"{totals['done']} chunks backfilled, {totals['skipped']} already done, "
+          f"{totals['unfinished']} unfinished")
+    print(f"{totals['read']} events read: {totals['written']} written, "
+          f"{totals['existing']} already in {agent.TARGET_CALENDAR}, {totals['failed']} failed")
+    if args.state:
+        agent.save_sync_state(args.state)
+    return 0 if not totals['unfinished'] else 1
+
+
+def command_batch(agent, args):
+    results = list(run_tenants(load_tenants(args.tenants), args.workers))
+    return 0 if all(result['ok'] for result in results) else 1
+
+
+def main(argv=None):
+    """
+    Command-line entry point: categorize, hours, fill, sync, mirror, backfill
+    and batch
+    Backends are imported by the commands that use them, so offline commands
+    start without loading the Google, CalDAV or HTTP client libraries.
+    """
+    parser = argparse.ArgumentParser(prog='audra_calendar_agent',
+                                     description="AuDRA calendar agent")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    def google_options(command, credentials_required=True, state_required=False):
+        command.add_argument('--credentials', required=credentials_required,
+                             help="Google OAuth client secrets JSON")
+        command.add_argument('--token', help="saved authorized-user token JSON")
+        command.add_argument('--state', required=state_required,
+                             help="sync state file: restored if present, saved afterwards")
+        command.add_argument('--store', help="SQLite event store kept alongside; without "
+                             "--credentials, hours reads it offline")
+
+    def apple_options(command):
+        command.add_argument('--apple-url', help="CalDAV URL to read Apple calendars from too")
+        command.add_argument('--apple-username',
+                             help="CalDAV username (password from AUDRA_APPLE_PASSWORD)")
+
+    def date_options(command):
+        command.add_argument('--start', help="ISO start date (default: next month)")
+        command.add_argument('--end', help="ISO end date")
+
+    categorize = commands.add_parser('categorize', help="categorize events in a JSON export")
+    categorize.add_argument('export', help="JSON list of events or events().list() page; - for stdin")
+    categorize.add_argument('--json', action='store_true', help="print JSON instead of lines")
+    categorize.set_defaults(handler=command_categorize)
+
+    hours = commands.add_parser('hours', help="hours per category in testcal or a snapshot")
+    google_options(hours, credentials_required=False)
+    hours.add_argument('--calendar', help="calendar ID in the --state snapshot")
+    date_options(hours)
+    hours.set_defaults(handler=command_hours)
+
+    fill = commands.add_parser('fill', help="plan and write blocks to meet minimum hours")
+    google_options(fill)
+    date_options(fill)
+    fill.add_argument('--scheduler', choices=sorted(SCHEDULING_ENGINES))
+    fill.add_argument('--dry-run', action='store_true', help="print the plan without writing")
+    fill.add_argument('--rules', help="JSON or YAML file of category minimums and/or "
+                      "constraints to use instead of the built-in ones")
+    fill.set_defaults(handler=command_fill)
+
+    sync = commands.add_parser('sync', help="mirror calendars into a sync state file")
+    google_options(sync, state_required=True)
+    sync.add_argument('--calendar', action='append',
+                      help="calendar name to sync (repeatable; default: sources and testcal)")
+    sync.set_defaults(handler=command_sync)
+
+    mirror = commands.add_parser('mirror', help="copy source events into testcal, categorized")
+    google_options(mirror)
+    apple_options(mirror)
+    date_options(mirror)
+    mirror.set_defaults(handler=command_mirror)
+
+    backfill = commands.add_parser('backfill',
+                                   help="mirror a long history in parallel, resumable chunks")
+    google_options(backfill)
+    apple_options(backfill)
+    backfill.add_argument('--start', required=True, help="ISO start date")
+    backfill.add_argument('--end', required=True, help="ISO end date")
+    backfill.add_argument('--checkpoint',
+                          help="file recording finished chunks; rerun with it to resume")
+    backfill.add_argument('--chunk-days', type=int, help="days per chunk (default: 31)")
+    backfill.add_argument('--workers', type=int, help="chunks run at once (default: 4)")
+    backfill.set_defaults(handler=command_backfill)
+
+    batch = commands.add_parser('batch', help="run a JSON list of tenant fills")
+    batch.add_argument('tenants', help="JSON list of run_tenant() configs")
+    batch.add_argument('--workers', type=int, help="worker processes (default: one per core)")
+    batch.set_defaults(handler=command_batch)
+
+    args = parser.parse_args(argv)
+    agent = AuDRACalendarAgent()
+    try:
+        status = args.handler(agent, args)
+    except Exception as e:
+        print(f"Error: {e}")
+        return 1
+    if agent.telemetry.summary.endpoints:
+        print(agent.telemetry.summary_line())
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
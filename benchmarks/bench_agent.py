@@ -0,0 +1,165 @@
+"""
+Benchmark the agent end to end against offline fakes of Google, CalDAV and Ollama
+
+Run from the repository root:
+    python -m benchmarks.bench_agent --scenario month --google-latency 0.05
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from audra_calendar_agent import AuDRACalendarAgent
+from benchmarks.fakes import (FakeDAVClient, FakeGoogleService, FakeOllama,
+                              synthetic_events)
+
+SCENARIOS = {'month': 30, 'year': 365, '5years': 5 * 365}
+START = datetime(2026, 1, 1)
+
+
+def build_agent(days, per_day, google, caldav, ollama, seed=0):
+    """Seed the fakes with a scenario's history and wire an agent to them"""
+    agent = wire_agent(google, caldav, ollama)
+    categories = [category_min['category'] for category_min in agent.CATEGORY_MINIMUMS]
+    for offset, name in enumerate(agent.SOURCE_CALENDARS):
+        google.load_events(google.add_calendar(name),
+                           synthetic_events(START, days, per_day, seed + offset))
+        caldav.load_events(name, synthetic_events(START, days, per_day, seed + 10 + offset))
+    google.load_events(google.add_calendar(agent.TARGET_CALENDAR),
+                       synthetic_events(START, days, per_day, seed + 20, categories))
+    return agent
+
+
+def wire_agent(google, caldav, ollama):
+    """A fresh agent using the fakes, with nothing synced or cached yet"""
+    agent = AuDRACalendarAgent()
+    agent.google_service = google
+    agent.apple_client = caldav
+    agent.ollama_url = ollama.url
+    agent.OLLAMA_CACHE_DIR = None  # Every run pays for its Ollama calls
+    agent.google_limiter.rate = google.quota
+    return agent
+
+
+def backfill_mirror(agent, end):
+    """Chunked, parallel copy of the whole history into the Mirror calendar"""
+    target = agent.TARGET_CALENDAR
+    agent.TARGET_CALENDAR = 'Mirror'
+    try:
+        return agent.backfill(START, end)
+    finally:
+        agent.TARGET_CALENDAR = target
+
+
+def measure(name, func, fakes, track_memory):
+    """
+    Run one stage, returning (name, seconds, API calls, (peak, retained) MB, result)
+    Retained is what the stage still holds when it returns, its result included.
+    """
+    before = [fake.log.snapshot() for fake in fakes]
+    if track_memory:
+        tracemalloc.start()
+    began = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - began
+    memory = None
+    if track_memory:
+        retained, peak = tracemalloc.get_traced_memory()
+        memory = (peak / 1024 / 1024, retained / 1024 / 1024)
+        tracemalloc.stop()
+    calls = sum((fake.log.snapshot() - counts for fake, counts in zip(fakes, before)),
+                start=type(before[0])())
+    return name, seconds, calls, memory, result
+
+
+def run_scenario(scenario, args):
+    days = SCENARIOS[scenario]
+    end = START + timedelta(days=days)
+    fill_start = end - timedelta(days=30)
+    google = FakeGoogleService(latency=args.google_latency, quota=args.google_quota)
+    caldav = FakeDAVClient(latency=args.caldav_latency)
+
+    with FakeOllama(latency=args.ollama_latency) as ollama, \
+            tempfile.TemporaryDirectory() as directory:
+        agent = build_agent(days, args.events_per_day, google, caldav, ollama, args.seed)
+        store_path = os.path.join(directory, 'events.db')
+        if args.event_store:
+            agent.open_event_store(store_path)
+        # The mirror stage writes somewhere the fake doesn't keep, so its peak is the agent's
+        google.discard_writes(google.add_calendar('Mirror'))
+        # Pace to the fake's quota, or not at all when it has none
+        agent.google_limiter.rate = args.google_quota
+        fakes = [google, caldav, ollama]
+        track = not args.no_memory
+        results = []
+
+        results.append(measure('read_all_calendars',
+                               lambda: agent.read_all_calendars(START, end), fakes, track))
+        results.append(measure('mirror_to_testcal',
+                               lambda: agent.mirror_to_testcal(START, end, 'Mirror'),
+                               fakes, track))
+        results.append(measure('backfill',
+                               lambda: backfill_mirror(agent, end), fakes, track))
+        # Fresh agents, so the sync mirror each mode builds (or doesn't) is counted
+        for compact in (False, True):
+            reader = wire_agent(google, caldav, ollama)
+            results.append(measure(
+                'read_all_records' + (' (compact)' if compact else ''),
+                lambda: (reader, reader.read_all_records(START, end, compact=compact)),
+                fakes, track))
+        records = agent.read_all_records(START, end)
+        results.append(measure('categorize_event',
+                               lambda: [agent.categorize_event(record) for record in records],
+                               fakes, track))
+        results.append(measure('calculate_category_hours',
+                               lambda: agent.calculate_category_hours(START, end), fakes, track))
+        results.append(measure('fill_minimum_hours',
+                               lambda: agent.fill_minimum_hours(fill_start, end), fakes, track))
+        if args.event_store:
+            offline = AuDRACalendarAgent()
+            offline.open_event_store(store_path, offline=True)
+            results.append(measure('calculate_category_hours (offline)',
+                                   lambda: offline.calculate_category_hours(START, end),
+                                   fakes, track))
+
+    events = len(records)
+    print(f"\n{scenario}: {days} days, {events} source events, "
+          f"{args.events_per_day}/day per calendar")
+    if track:
+        print(f"  {'':<36} {'':>9} {'peak':>8} {'kept':>8}")
+    for name, seconds, calls, megabytes, result in results:
+        memory = f"{megabytes[0]:8.1f} {megabytes[1]:8.1f} MB" if megabytes else ''
+        call_list = ', '.join(f"{endpoint} {count}" for endpoint, count in sorted(calls.items()))
+        print(f"  {name:<36} {seconds:8.3f}s {memory}  {call_list or 'no calls'}")
+    print(f"  {agent.telemetry.summary_line()}")
+    if args.google_quota:
+        print(f"  {google.rejected} Google calls rejected by the quota")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenario', choices=list(SCENARIOS) + ['all'], default='month')
+    parser.add_argument('--events-per-day', type=int, default=6)
+    parser.add_argument('--google-latency', type=float, default=0.0,
+                        help='seconds added to every Google call')
+    parser.add_argument('--google-quota', type=float, default=None,
+                        help='Google queries per second; the agent is paced to it')
+    parser.add_argument('--caldav-latency', type=float, default=0.0,
+                        help='seconds added to every CalDAV call')
+    parser.add_argument('--ollama-latency', type=float, default=0.0,
+                        help='seconds added to every Ollama generate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--event-store', action='store_true',
+                        help='keep synced events in SQLite and time offline analytics')
+    parser.add_argument('--no-memory', action='store_true',
+                        help='skip tracemalloc, which slows the timed code')
+    args = parser.parse_args()
+
+    for scenario in (SCENARIOS if args.scenario == 'all' else [args.scenario]):
+        run_scenario(scenario, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark compiled categorize_event against the original keyword scans
+
+Run from the repository root:
+    python -m benchmarks.bench_categorize --events 100000
+"""
+import argparse
+import random
+import time
+
+from audra_calendar_agent import AuDRACalendarAgent
+
+FILLER_WORDS = ['the', 'with', 'sync', 'plan', 'kids', 'pickup', 'call', 'home',
+                'weekly', 'review', 'quick', 'catch', 'up', 'notes', 'follow']
+LOCATIONS = ['', '', '', 'Zoom', 'Google Meet: meet.google.com/abc', 'Office',
+             '141 W Jackson Blvd, Chicago, IL', 'Virtual']
+
+
+def legacy_categorize(agent, event):
+    """The pre-compilation algorithm: lowercase, then any() scans in priority order"""
+    title = event.get('summary', '').lower()
+    description = event.get('description', '').lower()
+    location = event.get('location', '').lower()
+
+    if any(word in location for word in agent.VIRTUAL_LOCATION_KEYWORDS):
+        if any(word in title or word in description for word in
+               agent.VIRTUAL_MEETING_KEYWORDS):
+            return 'Work'
+
+    for category, keywords in agent.CATEGORY_KEYWORDS:
+        if any(word in title or word in description for word in keywords):
+            return category
+
+    return 'Free'
+
+
+def synthetic_events(agent, count, seed=0, recurring=0.0):
+    """
+    Build events whose titles and descriptions mix filler words and keywords
+    Args:
+        recurring (float): Share of events that are instances of a repeating series,
+            as singleEvents=True expansion returns them
+    """
+    rng = random.Random(seed)
+    keywords = [keyword for category, words in agent.CATEGORY_KEYWORDS
+                for keyword in words]
+
+    def text(words):
+        return ' '.join(rng.choice(keywords) if rng.random() < 0.08
+                        else rng.choice(FILLER_WORDS) for _ in range(words))
+
+    def new_event():
+        return {
+            'summary': text(rng.randint(2, 6)).title(),
+            'description': text(rng.randint(0, 40)),
+            'location': rng.choice(LOCATIONS),
+        }
+
+    series = [new_event() for _ in range(max(1, count // 50))]
+    return [dict(rng.choice(series)) if rng.random() < recurring else new_event()
+            for _ in range(count)]
+
+
+def timed(func):
+    start = time.perf_counter()
+    result = func()
+    return time.perf_counter() - start, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--events', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--recurring', type=float, default=0.0,
+                        help='share of events repeating an earlier series (0-1)')
+    args = parser.parse_args()
+
+    agent = AuDRACalendarAgent()
+    events = synthetic_events(agent, args.events, args.seed, args.recurring)
+
+    def cold(func):
+        # Start every measurement without compiled matchers or memoised answers
+        agent.keyword_matchers = None
+        agent.category_memo = {}
+        return timed(func)
+
+    legacy_time, expected = timed(
+        lambda: [legacy_categorize(agent, event) for event in events])
+    single_time, single = cold(
+        lambda: [agent.categorize_event(event) for event in events])
+    batch_time, batch = cold(lambda: list(agent.categorize_events(events)))
+
+    if single != expected or batch != expected:
+        mismatches = sum(a != b for a, b in zip(batch, expected))
+        raise SystemExit(f"Compiled matcher disagrees with legacy scans on {mismatches} events")
+
+    print(f"{args.events} events, {args.recurring:.0%} recurring")
+    for name, seconds in (('legacy any() scans', legacy_time),
+                          ('categorize_event', single_time),
+                          ('categorize_events', batch_time)):
+        print(f"  {name:<20} {seconds:8.3f}s  {args.events / seconds:>10,.0f} events/s"
+              f"  x{legacy_time / seconds:.2f}")
+
+
+if __name__ == '__main__':
+    main()
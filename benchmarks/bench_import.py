@@ -0,0 +1,111 @@
+"""
+Benchmark cold-start latency of the agent's CLI subcommands
+
+Each run is a fresh interpreter, so nothing is cached between runs. The
+offline commands (categorize, hours from a snapshot) run for real on
+generated inputs; fill and sync, which need Google credentials, are timed to
+the point where they would start authenticating (--help). Also reported:
+which heavy client libraries each command ended up importing.
+
+Run from the repository root:
+    python -m benchmarks.bench_import --runs 10
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+HEAVY_MODULES = ['google.oauth2', 'google_auth_oauthlib', 'googleapiclient.discovery',
+                 'caldav', 'requests', 'numpy', 'pytz']
+
+# Runs in the child: time the import and the command, then report on stderr
+CHILD = """
+import contextlib, io, json, sys, time
+began = time.perf_counter()
+import audra_calendar_agent
+imported = time.perf_counter()
+with contextlib.redirect_stdout(io.StringIO()):
+    try:
+        audra_calendar_agent.main(sys.argv[1:])
+    except SystemExit:
+        pass
+done = time.perf_counter()
+sys.stderr.write(json.dumps({
+    'import': imported - began,
+    'command': done - imported,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+""" % (HEAVY_MODULES,)
+
+
+def write_inputs(directory):
+    """A JSON export for categorize and a sync-state snapshot for hours"""
+    from benchmarks.fakes import synthetic_events
+    from audra_calendar_agent import AuDRACalendarAgent
+
+    start = datetime(2026, 1, 1)
+    export = os.path.join(directory, 'export.json')
+    with open(export, 'w') as f:
+        json.dump({'items': synthetic_events(start, 30, 6, seed=0)}, f)
+
+    categories = [category_min['category']
+                  for category_min in AuDRACalendarAgent().CATEGORY_MINIMUMS]
+    events = synthetic_events(start, 30, 6, seed=1, categories=categories)
+    for number, event in enumerate(events):
+        event.setdefault('id', f"event{number}")
+    state = os.path.join(directory, 'state.json')
+    with open(state, 'w') as f:
+        json.dump({'sync_tokens': {'testcal': None},
+                   'events': {'testcal': {event['id']: event for event in events}}}, f)
+    return export, state
+
+
+def run(args, cwd):
+    """One cold start: (wall seconds, child report)"""
+    began = time.perf_counter()
+    completed = subprocess.run([sys.executable, '-c', CHILD, *args], cwd=cwd,
+                               capture_output=True, text=True)
+    wall = time.perf_counter() - began
+    try:
+        report = json.loads(completed.stderr.strip().splitlines()[-1])
+    except (IndexError, ValueError):
+        raise SystemExit(f"{' '.join(args) or 'import'} failed:\n{completed.stderr}")
+    return wall, report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with tempfile.TemporaryDirectory() as directory:
+        export, state = write_inputs(directory)
+        cases = [
+            ('import only', ['--help']),
+            ('categorize', ['categorize', export]),
+            ('hours (snapshot)', ['hours', '--state', state, '--start', '2026-01-01',
+                                  '--end', '2026-01-31']),
+            ('fill --help', ['fill', '--help']),
+            ('sync --help', ['sync', '--help']),
+        ]
+
+        print(f"median of {args.runs} cold starts")
+        print(f"  {'command':<18} {'process':>9} {'import':>9} {'command':>9}  heavy modules loaded")
+        for name, command in cases:
+            runs = [run(command, root) for _ in range(args.runs)]
+            wall = statistics.median(wall for wall, report in runs)
+            imported = statistics.median(report['import'] for wall, report in runs)
+            executed = statistics.median(report['command'] for wall, report in runs)
+            loaded = ', '.join(runs[-1][1]['loaded']) or 'none'
+            print(f"  {name:<18} {wall * 1000:7.1f}ms {imported * 1000:7.1f}ms "
+                  f"{executed * 1000:7.1f}ms  {loaded}")
+
+
+if __name__ == '__main__':
+    main()
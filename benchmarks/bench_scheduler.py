@@ -0,0 +1,70 @@
+"""
+Benchmark the scheduling engines on a synthetic month of testcal events
+
+Run from the repository root:
+    python -m benchmarks.bench_scheduler --days 30 --events 60
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+from audra_calendar_agent import AuDRACalendarAgent
+from categories import CategoryRollup
+from events import Event, category_code, epoch_seconds
+from scheduling import SCHEDULING_ENGINES, SchedulePlanner
+
+
+def synthetic_records(start, days, count, seed=0):
+    """Fixed appointments of 30 minutes to 3 hours on a 15-minute grid"""
+    rng = random.Random(seed)
+    records = []
+    for number in range(count):
+        event_start = start + timedelta(minutes=15 * rng.randint(0, days * 96 - 1))
+        event_end = event_start + timedelta(minutes=15 * rng.randint(2, 12))
+        records.append(Event.from_google({
+            'id': f"fixed-{number}",
+            'summary': 'Appointment',
+            'description': '[Category:Health]',
+            'start': {'dateTime': event_start.isoformat()},
+            'end': {'dateTime': event_end.isoformat()},
+        }))
+    return records
+
+
+def remaining_shortfall(agent, records, plan, start, end):
+    """Hours still missing across every minimum once the plan is applied"""
+    added = [Event(f"planned-{number}", epoch_seconds(planned.start),
+                   epoch_seconds(planned.end), category_code([planned.category]))
+             for number, planned in enumerate(plan.adds)]
+    rollup = CategoryRollup.from_records(agent.CATEGORIES, records + added, start,
+                                         end - timedelta(seconds=1))
+    return float(rollup.needed_hours(agent.get_category_rules()).sum())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--events', type=int, default=60)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--time-budget', type=float, default=None)
+    args = parser.parse_args()
+
+    agent = AuDRACalendarAgent()
+    start = datetime(2026, 11, 1)
+    end = start + timedelta(days=args.days)
+    records = synthetic_records(start, args.days, args.events, args.seed)
+
+    print(f"{args.days} days, {args.events} fixed events")
+    for engine in SCHEDULING_ENGINES:
+        planner = SchedulePlanner(start, end, records, agent.get_category_rules(),
+                                  agent.CATEGORIES)
+        began = time.perf_counter()
+        plan = planner.plan(engine=engine, time_budget=args.time_budget)
+        seconds = time.perf_counter() - began
+        print(f"  {engine:<8} {seconds:8.3f}s  {len(plan.adds):5d} blocks  "
+              f"{remaining_shortfall(agent, records, plan, start, end):8.1f}h still short")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,455 @@
+"""
+In-process stand-ins for Google Calendar, CalDAV and Ollama, for offline benchmarks
+
+Each fake counts its calls per endpoint and can sleep a fixed latency per call,
+so benchmarks show both how many round trips a code path makes and roughly
+what they would cost against the real services.
+"""
+import collections
+import itertools
+import json
+import random
+import threading
+import time
+from datetime import timedelta
+from functools import cached_property
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httplib2
+import icalendar
+from googleapiclient.errors import HttpError
+
+from audra_calendar_agent import AuDRACalendarAgent
+from events import parse_event_time
+
+
+class CallLog:
+    """Thread-safe per-endpoint call counter with injected latency"""
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.counts = collections.Counter()
+        self._lock = threading.Lock()
+
+    def record(self, endpoint):
+        with self._lock:
+            self.counts[endpoint] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def snapshot(self):
+        with self._lock:
+            return collections.Counter(self.counts)
+
+
+def http_error(status, message='', reason=None):
+    """A googleapiclient HttpError like the real client raises"""
+    error = {'code': status, 'message': message}
+    if reason:
+        error['errors'] = [{'reason': reason, 'message': message}]
+    content = json.dumps({'error': error}).encode()
+    return HttpError(httplib2.Response({'status': status}), content)
+
+
+class FakeRequest:
+    """Deferred call, like googleapiclient's HttpRequest"""
+    def __init__(self, service, endpoint, func):
+        self.service = service
+        self.endpoint = endpoint
+        self.func = func
+
+    def execute(self):
+        self.service.log.record(self.endpoint)
+        self.service.admit()
+        return self.func()
+
+
+class FakeResource:
+    """calendarList(), calendars(), events() or freebusy() of a FakeGoogleService"""
+    def __init__(self, service, kind):
+        self._service = service
+        self._kind = kind
+
+    def __getattr__(self, method):
+        handler = getattr(self._service, f"_{self._kind}_{method}")
+
+        def build_request(**kwargs):
+            return FakeRequest(self._service, f"{self._kind}.{method}",
+                               lambda: handler(**kwargs))
+        return build_request
+
+
+class FakeBatch:
+    """new_batch_http_request(): sends every added request in one round trip"""
+    def __init__(self, service, callback=None):
+        self.service = service
+        self.callback = callback
+        self.requests = []
+
+    def add(self, request, callback=None, request_id=None):
+        self.requests.append((request, callback or self.callback, request_id))
+
+    def execute(self):
+        self.service.log.record('batch')
+        for request, callback, request_id in self.requests:
+            try:
+                self.service.admit()
+                response, exception = request.func(), None
+            except HttpError as e:
+                response, exception = None, e
+            if callback:
+                callback(request_id, response, exception)
+
+
+class FakeGoogleService:
+    """
+    Google Calendar v3 service held in memory
+
+    Supports what the agent uses: paginated calendarList, calendars.insert,
+    events list/get/insert/update/patch/delete with timeMin/timeMax windows,
+    syncToken incremental sync (410 for unknown tokens), freebusy.query and
+    batch requests. With a quota (queries per second, up to burst at once),
+    calls beyond it fail with 403 rateLimitExceeded, as the Calendar API does;
+    each batch item counts as one query.
+    """
+    def __init__(self, latency=0.0, page_size=250, quota=None, burst=50):
+        self.log = CallLog(latency)
+        self.page_size = page_size
+        self.quota = quota
+        self.burst = burst
+        self.allowance = burst
+        self.allowance_at = time.monotonic()
+        self.rejected = 0
+        self.calendars_by_id = {}  # calendar_id -> summary
+        self.store = {}            # calendar_id -> {event_id: event}, tombstones included
+        self.write_only = set()    # Calendars whose inserts are acknowledged, not kept
+        self._sequence = itertools.count(1)
+        self._version = 0
+        self._lock = threading.Lock()
+
+    def add_calendar(self, name):
+        calendar_id = f"{name.lower().replace(' ', '-')}@fake.calendar"
+        self.calendars_by_id[calendar_id] = name
+        self.store.setdefault(calendar_id, {})
+        return calendar_id
+
+    def discard_writes(self, calendar_id):
+        """Acknowledge inserts into a calendar without storing them, to measure the client alone"""
+        self.write_only.add(calendar_id)
+
+    def calendar_id(self, name):
+        return next((calendar_id for calendar_id, summary in self.calendars_by_id.items()
+                     if summary == name), None)
+
+    def load_events(self, calendar_id, events):
+        """Seed events without counting API calls"""
+        for event in events:
+            self._events_insert(calendarId=calendar_id, body=event)
+
+    def calendarList(self):
+        return FakeResource(self, 'calendarList')
+
+    def calendars(self):
+        return FakeResource(self, 'calendars')
+
+    def events(self):
+        return FakeResource(self, 'events')
+
+    def freebusy(self):
+        return FakeResource(self, 'freebusy')
+
+    def new_batch_http_request(self, callback=None):
+        return FakeBatch(self, callback)
+
+    def admit(self):
+        """Spend one query of the per-second quota, or raise the rate-limit error"""
+        if not self.quota:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self.allowance = min(self.burst,
+                                 self.allowance + (now - self.allowance_at) * self.quota)
+            self.allowance_at = now
+            if self.allowance < 1:
+                self.rejected += 1
+                raise http_error(403, 'Rate Limit Exceeded', 'rateLimitExceeded')
+            self.allowance -= 1
+
+    def _stamp(self, event):
+        with self._lock:
+            self._version = next(self._sequence)
+            event['_version'] = self._version
+        event['_bounds'] = (self._bound(event, 'start'), self._bound(event, 'end'))
+        return event
+
+    def _public(self, event):
+        # A fresh copy, as a parsed response would be, so clients can't share our dicts
+        return json.loads(json.dumps(
+            {key: value for key, value in event.items() if not key.startswith('_')}))
+
+    def _calendarList_list(self, pageToken=None, maxResults=100, **kwargs):
+        items = [{'id': calendar_id, 'summary': summary}
+                 for calendar_id, summary in self.calendars_by_id.items()]
+        return self._page(items, pageToken, maxResults)
+
+    def _calendars_insert(self, body):
+        return {'id': self.add_calendar(body['summary']), 'summary': body['summary']}
+
+    def _calendar(self, calendarId):
+        if calendarId not in self.store:
+            raise http_error(404, f"Calendar {calendarId} not found")
+        return self.store[calendarId]
+
+    def _events_insert(self, calendarId, body, **kwargs):
+        event = json.loads(json.dumps(body))
+        event.setdefault('id', f"fake{next(self._sequence)}")
+        event['status'] = 'confirmed'
+        if calendarId in self.write_only:
+            self._calendar(calendarId)
+            return event
+        if event['id'] in self._calendar(calendarId):
+            raise http_error(409, "The requested identifier already exists.", 'duplicate')
+        self._calendar(calendarId)[event['id']] = self._stamp(event)
+        return self._public(event)
+
+    def _events_get(self, calendarId, eventId, **kwargs):
+        event = self._calendar(calendarId).get(eventId)
+        if event is None or event.get('status') == 'cancelled':
+            raise http_error(404, f"Event {eventId} not found")
+        return self._public(event)
+
+    def _events_update(self, calendarId, eventId, body, **kwargs):
+        self._events_get(calendarId, eventId)
+        event = json.loads(json.dumps(body))
+        event['id'] = eventId
+        event['status'] = 'confirmed'
+        self._calendar(calendarId)[eventId] = self._stamp(event)
+        return self._public(event)
+
+    def _events_patch(self, calendarId, eventId, body, **kwargs):
+        event = self._events_get(calendarId, eventId)
+        event.update(json.loads(json.dumps(body)))
+        return self._events_update(calendarId, eventId, event)
+
+    def _events_delete(self, calendarId, eventId, **kwargs):
+        event = self._events_get(calendarId, eventId)
+        self._calendar(calendarId)[eventId] = self._stamp({
+            'id': eventId, 'status': 'cancelled',
+            'start': event['start'], 'end': event['end']})
+        return ''
+
+    def _events_list(self, calendarId, timeMin=None, timeMax=None, pageToken=None,
+                     maxResults=250, syncToken=None, privateExtendedProperty=None,
+                     **kwargs):
+        events = self._calendar(calendarId).values()
+        if syncToken is not None:
+            if not syncToken.isdigit() or int(syncToken) > self._version:
+                raise http_error(410, "Sync token is no longer valid")
+            items = [event for event in events if event['_version'] > int(syncToken)]
+        else:
+            items = [event for event in events if event.get('status') != 'cancelled']
+            window_start = parse_event_time(timeMin) if timeMin else None
+            window_end = parse_event_time(timeMax) if timeMax else None
+            if window_start or window_end:
+                items = [event for event in items
+                         if (window_start is None or event['_bounds'][1] > window_start)
+                         and (window_end is None or event['_bounds'][0] < window_end)]
+        if privateExtendedProperty:
+            wanted = [privateExtendedProperty] if isinstance(
+                privateExtendedProperty, str) else privateExtendedProperty
+            for condition in wanted:
+                key, value = condition.split('=', 1)
+                items = [event for event in items
+                         if event.get('extendedProperties', {}).get('private', {})
+                         .get(key) == value]
+        items.sort(key=lambda event: event['_bounds'][0])
+
+        page = self._page(items, pageToken, min(maxResults or 250, self.page_size))
+        page['items'] = [self._public(event) for event in page['items']]
+        if 'nextPageToken' not in page:
+            page['nextSyncToken'] = str(self._version)
+        return page
+
+    def _freebusy_query(self, body):
+        calendars = {}
+        for item in body.get('items', []):
+            events = self._events_list(calendarId=item['id'], timeMin=body['timeMin'],
+                                       timeMax=body['timeMax'], maxResults=None)['items']
+            busy = [{'start': event['start'].get('dateTime', event['start'].get('date')),
+                     'end': event['end'].get('dateTime', event['end'].get('date'))}
+                    for event in events if event.get('transparency') != 'transparent']
+            calendars[item['id']] = {'busy': busy}
+        return {'calendars': calendars}
+
+    @staticmethod
+    def _bound(event, side):
+        return parse_event_time(event[side].get('dateTime', event[side].get('date')))
+
+    @staticmethod
+    def _page(items, page_token, page_size):
+        page_size = page_size or len(items) or 1
+        start = int(page_token or 0)
+        page = {'items': items[start:start + page_size]}
+        if start + page_size < len(items):
+            page['nextPageToken'] = str(start + page_size)
+        return page
+
+
+class FakeDAVEvent:
+    """CalDAV event object exposing data and icalendar_component like caldav.Event"""
+    def __init__(self, calendar, uid, summary, description, start, end):
+        self.calendar = calendar
+        self.uid = uid
+        self.summary = summary
+        self.description = description
+        self.start = start
+        self.end = end
+
+    @cached_property
+    def icalendar_component(self):
+        component = icalendar.Event()
+        component.add('uid', self.uid)
+        component.add('summary', self.summary)
+        component.add('description', self.description)
+        component.add('dtstart', self.start)
+        component.add('dtend', self.end)
+        return component
+
+    @cached_property
+    def data(self):
+        calendar = icalendar.Calendar()
+        calendar.add('prodid', '-//AuDRA benchmark//EN')
+        calendar.add('version', '2.0')
+        calendar.add_component(self.icalendar_component)
+        return calendar.to_ical().decode()
+
+
+class FakeDAVCalendar:
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.url = f"https://caldav.fake/{name}/"
+        self.events = []  # Sorted by start
+
+    def date_search(self, start, end=None, **kwargs):
+        self.client.log.record('caldav.date_search')
+        # New objects each search, as a real client parses them from the response
+        return [FakeDAVEvent(self, event.uid, event.summary, event.description,
+                             event.start, event.end)
+                for event in self.events
+                if event.end > start and (end is None or event.start < end)]
+
+
+class FakeDAVPrincipal:
+    def __init__(self, client):
+        self.client = client
+
+    def calendars(self):
+        self.client.log.record('caldav.calendars')
+        return list(self.client.calendars_by_name.values())
+
+
+class FakeDAVClient:
+    """Local CalDAV stand-in for caldav.DAVClient"""
+    def __init__(self, latency=0.0):
+        self.log = CallLog(latency)
+        self.calendars_by_name = {}
+
+    def principal(self):
+        self.log.record('caldav.principal')
+        return FakeDAVPrincipal(self)
+
+    def load_events(self, name, events):
+        """Seed a calendar from Google-style event dicts"""
+        calendar = self.calendars_by_name.setdefault(name, FakeDAVCalendar(self, name))
+        for number, event in enumerate(events):
+            calendar.events.append(FakeDAVEvent(
+                calendar, f"{name}-{number}@fake", event.get('summary', ''),
+                event.get('description', ''),
+                parse_event_time(event['start']['dateTime']),
+                parse_event_time(event['end']['dateTime'])))
+        calendar.events.sort(key=lambda event: event.start)
+
+
+class FakeOllama:
+    """
+    Local HTTP server answering Ollama's /api/generate
+
+    JSON-format requests get a strategy for every "- Category:" line in the
+    prompt; plain requests get a single strategy number.
+    """
+    def __init__(self, latency=0.0, strategy=1):
+        self.log = CallLog(latency)
+        self.strategy = strategy
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}/api/generate"
+
+    def reply(self, payload):
+        if payload.get('format') == 'json':
+            categories = [line.strip()[2:].split(':', 1)[0]
+                          for line in payload.get('prompt', '').splitlines()
+                          if line.strip().startswith('- ')]
+            return json.dumps({category: self.strategy for category in categories})
+        return str(self.strategy)
+
+    def __enter__(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                fake.log.record('ollama.generate')
+                body = json.dumps({'model': payload.get('model'),
+                                   'response': fake.reply(payload), 'done': True}).encode()
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def synthetic_events(start, days, per_day, seed=0, categories=None):
+    """
+    Google-style events on a 15-minute grid, up to per_day each day
+    Args:
+        categories (list): When given, tag each event [Category:X] like testcal events
+    """
+    rng = random.Random(seed)
+    keywords = [keyword for category, words in AuDRACalendarAgent().CATEGORY_KEYWORDS
+                for keyword in words]
+    filler = ['sync', 'plan', 'review', 'catch up', 'notes', 'follow up', 'with Sam']
+    events = []
+    for day in range(days):
+        midnight = start + timedelta(days=day)
+        # Events start between 07:00 and 22:00
+        slots = sorted(rng.sample(range(7 * 4, 22 * 4), min(per_day, 15 * 4)))
+        for slot in slots[:per_day]:
+            event_start = midnight + timedelta(minutes=15 * slot)
+            event_end = event_start + timedelta(minutes=15 * rng.randint(1, 4))
+            summary = f"{rng.choice(keywords).title()} {rng.choice(filler)}"
+            description = ' '.join(rng.choice(filler) for _ in range(rng.randint(0, 8)))
+            if categories:
+                description += f"\n[Category:{rng.choice(categories)}]"
+            events.append({
+                'summary': summary,
+                'description': description,
+                'location': rng.choice(['', '', 'Zoom', 'Office']),
+                'start': {'dateTime': event_start.isoformat() + 'Z'},
+                'end': {'dateTime': min(event_end, midnight + timedelta(days=1))
+                        .isoformat() + 'Z'},
+            })
+    return events
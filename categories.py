@@ -0,0 +1,414 @@
+"""
+Category rules, the per-day, per-week and per-month hour rollup, and keyword matching
+"""
+from datetime import datetime, timedelta
+import json
+import re
+
+from events import SECONDS_PER_DAY, epoch_seconds
+
+
+def load_rule_tables(path):
+    """
+    Read category rule tables from a JSON or YAML file (YAML needs PyYAML)
+    Returns:
+        dict: 'minimums' and/or 'constraints', shaped like CATEGORY_MINIMUMS and
+            CATEGORY_CONSTRAINTS
+    """
+    with open(path) as f:
+        if path.endswith(('.yaml', '.yml')):
+            try:
+                import yaml
+            except ImportError:
+                raise Exception("Reading YAML rules needs PyYAML (pip install pyyaml)")
+            tables = yaml.safe_load(f)
+        else:
+            tables = json.load(f)
+    if not isinstance(tables, dict) or not {'minimums', 'constraints'} & set(tables):
+        raise Exception(f"{path}: expected a mapping with minimums and/or constraints")
+    return tables
+
+
+class CategoryRules:
+    """
+    Category minimums and preferred windows, validated and compiled once
+
+    Built from tables shaped like CATEGORY_MINIMUMS and CATEGORY_CONSTRAINTS.
+    Each category gets an id, its position in the minimums table; minimums
+    are a read-only (category, daily/weekly/monthly) array of hours and
+    windows are minutes after midnight, -1 where a category has none. Rules
+    never change once built, so they can be shared across planners and threads.
+    """
+    PERIODS = ('daily', 'weekly', 'monthly')
+    CONSTRAINT_KEYS = ('preferred_start_time', 'preferred_end_time', 'consecutive_hours',
+                       'weekday_only')
+
+    def __init__(self, minimums, constraints):
+        import numpy as np
+
+        if not isinstance(minimums, list):
+            raise Exception("Category minimums must be a list of entries")
+        if not isinstance(constraints, dict):
+            raise Exception("Category constraints must map category names to settings")
+
+        names = []
+        hours = np.zeros((len(minimums), len(self.PERIODS)))
+        for rule, entry in enumerate(minimums):
+            category = entry.get('category') if isinstance(entry, dict) else None
+            if not isinstance(category, str) or not category:
+                raise Exception(f"Minimums entry {rule} has no category name")
+            if category in names:
+                raise Exception(f"Category {category!r} has more than one minimums entry")
+            unknown = set(entry) - {'category', *self.PERIODS}
+            if unknown:
+                raise Exception(f"Unknown minimums keys for {category!r}: "
+                                + ', '.join(sorted(unknown)))
+            for period, key in enumerate(self.PERIODS):
+                value = entry.get(key, 0)
+                if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                    raise Exception(f"{category!r} {key} minimum must be a number of hours "
+                                    f"of at least 0, not {value!r}")
+                hours[rule, period] = value
+            names.append(category)
+
+        window_start = np.full(len(names), -1, dtype=np.int16)
+        window_end = np.full(len(names), -1, dtype=np.int16)
+        consecutive = np.zeros(len(names), dtype=bool)
+        weekday_only = np.zeros(len(names), dtype=bool)
+        for category, settings in constraints.items():
+            if category not in names:
+                raise Exception(f"Constraints for {category!r}, which has no minimums entry")
+            if not isinstance(settings, dict):
+                raise Exception(f"Constraints for {category!r} must be a mapping of settings")
+            rule = names.index(category)
+            unknown = set(settings) - set(self.CONSTRAINT_KEYS)
+            if unknown:
+                raise Exception(f"Unknown constraint keys for {category!r}: "
+                                + ', '.join(sorted(unknown)))
+            start = settings.get('preferred_start_time')
+            end = settings.get('preferred_end_time')
+            if (start is None) != (end is None):
+                raise Exception(f"{category!r} needs both a preferred start and end time")
+            if start is not None:
+                window_start[rule] = self._minutes(category, start)
+                window_end[rule] = self._minutes(category, end)
+            for flags, key in ((consecutive, 'consecutive_hours'), (weekday_only, 'weekday_only')):
+                value = settings.get(key, False)
+                if not isinstance(value, bool):
+                    raise Exception(f"{category!r} {key} must be true or false, not {value!r}")
+                flags[rule] = value
+
+        for array in (hours, window_start, window_end, consecutive, weekday_only):
+            array.setflags(write=False)
+        self.names = tuple(names)
+        self.ids = {category: rule for rule, category in enumerate(names)}
+        self.minimums = hours
+        self.window_start = window_start
+        self.window_end = window_end
+        self.consecutive = consecutive
+        self.weekday_only = weekday_only
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        if getattr(self, '_frozen', False):
+            raise Exception("CategoryRules are read-only; build new rules instead")
+        object.__setattr__(self, name, value)
+
+    @staticmethod
+    def _minutes(category, value):
+        """
+        A preferred time as minutes after midnight
+        Accepts 'HH:MM' or whole minutes, since YAML reads an unquoted 22:00 as 1320.
+        """
+        minutes = -1
+        if isinstance(value, int) and not isinstance(value, bool):
+            minutes = value
+        elif isinstance(value, str):
+            match = re.fullmatch(r'(\d{1,2}):([0-5]\d)', value.strip())
+            if match:
+                minutes = int(match[1]) * 60 + int(match[2])
+        if not 0 <= minutes <= 24 * 60:
+            raise Exception(f"{category!r} preferred time must be HH:MM, not {value!r}")
+        return minutes
+
+    @classmethod
+    def load(cls, path):
+        """Rules from a JSON or YAML file holding both tables"""
+        tables = load_rule_tables(path)
+        return cls(tables.get('minimums', []), tables.get('constraints', {}))
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, category):
+        return category in self.ids
+
+    def window(self, rule):
+        """Preferred window of a category id as (start, end) minutes, or None"""
+        if self.window_start[rule] < 0:
+            return None
+        return int(self.window_start[rule]), int(self.window_end[rule])
+
+    def describe(self, category):
+        """Constraint values of a category as text, for AI prompts"""
+        rule = self.ids.get(category)
+        window = self.window(rule) if rule is not None else None
+        clock = [f"{minutes // 60:02d}:{minutes % 60:02d}" for minutes in window or ()]
+        return {
+            'preferred_start_time': clock[0] if clock else 'any',
+            'preferred_end_time': clock[1] if clock else 'any',
+            'consecutive_hours': bool(rule is not None and self.consecutive[rule]),
+            'weekday_only': bool(rule is not None and self.weekday_only[rule]),
+        }
+
+
+class CategoryRollup:
+    """
+    Per-day, per-ISO-week and per-month category hours over a window
+
+    Events are turned into columnar start/end/category-code arrays once and
+    split at midnight in one vectorized pass; weekly and monthly hours are
+    sums of whole days, so every horizon comes from the same daily table.
+    """
+    def __init__(self, categories, starts, ends, codes, window_start, window_end):
+        import numpy as np
+
+        self.categories = list(categories)
+        self.codes = {category: code for code, category in enumerate(self.categories)}
+        self.window_start = window_start
+        self.window_end = window_end
+
+        origin = window_start.replace(hour=0, minute=0, second=0, microsecond=0)
+        origin_seconds = epoch_seconds(origin)
+        window_seconds = (epoch_seconds(window_start), epoch_seconds(window_end))
+        self.day_count = max(0, -(-(window_seconds[1] - origin_seconds) // SECONDS_PER_DAY))
+        self.days = [origin.date() + timedelta(days=day) for day in range(self.day_count)]
+
+        # Clip every event to the window and drop anything left empty
+        starts = np.maximum(np.asarray(starts, dtype=np.int64), window_seconds[0])
+        ends = np.minimum(np.asarray(ends, dtype=np.int64), window_seconds[1])
+        codes = np.asarray(codes, dtype=np.int64)
+        keep = ends > starts
+        starts, ends, codes = starts[keep], ends[keep], codes[keep]
+
+        # Split each event into one segment per day it touches
+        first_day = (starts - origin_seconds) // SECONDS_PER_DAY
+        last_day = (ends - 1 - origin_seconds) // SECONDS_PER_DAY
+        spans = last_day - first_day + 1
+        owner = np.repeat(np.arange(len(starts)), spans)
+        offsets = np.arange(len(owner)) - np.repeat(np.cumsum(spans) - spans, spans)
+        segment_day = first_day[owner] + offsets
+        day_start = origin_seconds + segment_day * SECONDS_PER_DAY
+        segment_hours = (np.minimum(ends[owner], day_start + SECONDS_PER_DAY) -
+                         np.maximum(starts[owner], day_start)) / 3600
+
+        category_count = len(self.categories)
+        self.daily = np.bincount(
+            codes[owner] * self.day_count + segment_day, weights=segment_hours,
+            minlength=category_count * self.day_count
+        ).reshape(category_count, self.day_count)
+
+        # Day -> ISO week and day -> month membership, as 0/1 matrices
+        self.weeks, week_of_day = self._group_days(
+            lambda day: tuple(day.isocalendar())[:2])
+        self.months, month_of_day = self._group_days(lambda day: (day.year, day.month))
+        self.weekly = self.daily @ self._membership(week_of_day, len(self.weeks))
+        self.monthly = self.daily @ self._membership(month_of_day, len(self.months))
+
+        # How much of each week and month the window covers, for prorating minimums
+        self.week_coverage = np.bincount(week_of_day, minlength=len(self.weeks)) / 7
+        self.month_coverage = np.bincount(
+            month_of_day, minlength=len(self.months)) / np.array(
+            [self._month_length(year, month) for year, month in self.months])
+
+    @classmethod
+    def from_records(cls, categories, records, window_start, window_end):
+        """Build a rollup from Event records; an event counts toward each of its tags"""
+        codes = {category: code for code, category in enumerate(categories)}
+        tag_codes = {}  # Interned tag code -> rollup codes
+        starts, ends, event_codes = [], [], []
+        for record in records:
+            matched = tag_codes.get(record.category)
+            if matched is None:
+                matched = tag_codes[record.category] = [
+                    codes[name] for name in record.categories if name in codes]
+            for code in matched:
+                starts.append(record.start)
+                ends.append(record.end)
+                event_codes.append(code)
+        return cls(categories, starts, ends, event_codes, window_start, window_end)
+
+    def _group_days(self, label_of):
+        """Label each day, returning (ordered unique labels, label index per day)"""
+        import numpy as np
+
+        labels = []
+        positions = {}
+        index_of_day = np.empty(self.day_count, dtype=np.int64)
+        for day_index, day in enumerate(self.days):
+            label = label_of(day)
+            if label not in positions:
+                positions[label] = len(labels)
+                labels.append(label)
+            index_of_day[day_index] = positions[label]
+        return labels, index_of_day
+
+    def _membership(self, group_of_day, group_count):
+        import numpy as np
+
+        matrix = np.zeros((self.day_count, group_count))
+        matrix[np.arange(self.day_count), group_of_day] = 1
+        return matrix
+
+    @staticmethod
+    def _month_length(year, month):
+        next_month = datetime(year + month // 12, month % 12 + 1, 1)
+        return (next_month - datetime(year, month, 1)).days
+
+    def total(self, category):
+        """Total hours of a category over the window"""
+        code = self.codes.get(category)
+        return float(self.daily[code].sum()) if code is not None else 0
+
+    def totals(self):
+        """Return {category: total hours} for every category"""
+        sums = self.daily.sum(axis=1)
+        return {category: float(sums[code]) for category, code in self.codes.items()}
+
+    def shortfalls(self, rules, category):
+        """
+        Hours missing in each period for one category's minimums
+        Weekly and monthly minimums are prorated for periods the window only partly covers.
+        Returns:
+            dict: 'daily', 'weekly' and 'monthly' arrays of missing hours per period
+        """
+        import numpy as np
+
+        code = self.codes.get(category)
+        rule = rules.ids.get(category)
+        if code is None or rule is None:
+            return {'daily': np.zeros(self.day_count),
+                    'weekly': np.zeros(len(self.weeks)),
+                    'monthly': np.zeros(len(self.months))}
+        daily, weekly, monthly = rules.minimums[rule]
+        return {
+            'daily': np.maximum(daily - self.daily[code], 0),
+            'weekly': np.maximum(weekly * self.week_coverage - self.weekly[code], 0),
+            'monthly': np.maximum(monthly * self.month_coverage - self.monthly[code], 0),
+        }
+
+    def needed_hours(self, rules):
+        """
+        Hours each category needs added so its daily, weekly and monthly minimums are met
+        Returns:
+            numpy array indexed by category id in rules
+        """
+        import numpy as np
+
+        codes = np.array([self.codes.get(category, -1) for category in rules.names],
+                         dtype=np.int64)
+        tracked = codes >= 0
+        codes = np.where(tracked, codes, 0)
+        daily, weekly, monthly = rules.minimums.T
+        needed = np.maximum.reduce([
+            np.maximum(daily[:, None] - self.daily[codes], 0).sum(axis=1),
+            np.maximum(weekly[:, None] * self.week_coverage - self.weekly[codes], 0).sum(axis=1),
+            np.maximum(monthly[:, None] * self.month_coverage - self.monthly[codes], 0).sum(axis=1),
+        ])
+        return np.where(tracked, needed, 0.0)
+
+
+class KeywordMatcher:
+    """
+    Prioritised substring matcher compiled once from (label, keywords) rules
+
+    A keyword without whitespace can only occur inside a single whitespace-free
+    token, so the best rank found in each distinct token is computed once and
+    memoised. Multi-word phrases are checked against the whole text, and only
+    when one of the text's tokens ends with the phrase's first word.
+    """
+    def __init__(self, rules, max_cached_tokens=100000):
+        self.rules = [(label, list(keywords)) for label, keywords in rules]
+        self.labels = [label for label, keywords in self.rules] + [None]
+        self.no_match = len(self.rules)
+        self.max_cached_tokens = max_cached_tokens
+
+        ranks = {}
+        for rank, (label, keywords) in enumerate(self.rules):
+            for keyword in keywords:
+                ranks.setdefault(keyword, rank)
+        self._ranks = ranks
+        ordered = sorted(ranks, key=ranks.get)
+
+        # Single-token keywords, in priority order
+        self._words = tuple(keyword for keyword in ordered if keyword.split() == [keyword])
+        # Phrases that no better-or-equal keyword is a substring of (others can never decide)
+        self._phrases = tuple(
+            (ranks[phrase], phrase, phrase.split()[0]) for phrase in ordered
+            if phrase.split() != [phrase] and not any(
+                other != phrase and ranks[other] <= ranks[phrase] and other in phrase
+                for other in ordered))
+        self._token_ranks = {}
+        self._token_phrases = {}
+
+    def _learn_token(self, token):
+        """Compute and memoise the best rank and candidate phrases for a token"""
+        keyword = next(filter(token.__contains__, self._words), None)
+        rank = self._ranks[keyword] if keyword is not None else self.no_match
+        phrases = 0
+        for index, (phrase_rank, phrase, first_word) in enumerate(self._phrases):
+            if token.endswith(first_word):
+                phrases |= 1 << index
+        self._token_ranks[token] = rank
+        self._token_phrases[token] = phrases
+        return rank, phrases
+
+    def _token_phrases_of(self, token):
+        """Return a token's candidate phrases, learning the token if it isn't memoised"""
+        phrases = self._token_phrases.get(token)
+        if phrases is None:
+            phrases = self._learn_token(token)[1]
+        return phrases
+
+    def match_rank(self, text):
+        """Return the rank of the highest-priority keyword found in text"""
+        tokens = text.split()
+        token_ranks = self._token_ranks
+        try:
+            best = min(map(token_ranks.__getitem__, tokens), default=self.no_match)
+        except KeyError:
+            if len(token_ranks) >= self.max_cached_tokens:
+                token_ranks.clear()
+                self._token_phrases.clear()
+            # Work from local results, as the memo may be cleared again meanwhile
+            best = self.no_match
+            for token in set(tokens):
+                rank = token_ranks.get(token)
+                if rank is None:
+                    rank = self._learn_token(token)[0]
+                best = min(best, rank)
+
+        if self._phrases and best > self._phrases[0][0]:
+            try:
+                candidates = 0
+                for phrases in map(self._token_phrases.__getitem__, tokens):
+                    candidates |= phrases
+            except KeyError:
+                candidates = 0
+                for phrases in map(self._token_phrases_of, tokens):
+                    candidates |= phrases
+            index = 0
+            while candidates:
+                rank, phrase, first_word = self._phrases[index]
+                if rank >= best:
+                    break
+                if candidates & 1 and phrase in text:
+                    best = rank
+                    break
+                candidates >>= 1
+                index += 1
+        return best
+
+    def match(self, text):
+        """Return the label of the highest-priority keyword found in text, or None"""
+        return self.labels[self.match_rank(text)]
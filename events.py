@@ -0,0 +1,274 @@
+"""
+Normalized Event records and the time and category helpers every module shares
+"""
+from datetime import datetime, timedelta, timezone
+import json
+import hashlib
+import re
+import threading
+
+
+def naive_utc(moment):
+    """A datetime as naive UTC, converting it first if it carries a timezone"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone(timezone.utc).replace(tzinfo=None)
+    return moment
+
+
+def parse_event_time(value):
+    """Parse a Google dateTime/date string into a naive UTC datetime"""
+    return naive_utc(datetime.fromisoformat(value.replace('Z', '+00:00')))
+
+
+def event_bounds(event):
+    """Return the (start, end) of a Google event as naive UTC datetimes"""
+    start = parse_event_time(event['start'].get('dateTime', event['start'].get('date')))
+    end = parse_event_time(event['end'].get('dateTime', event['end'].get('date')))
+    return start, end
+
+
+def ical_time(value):
+    """iCalendar date or datetime as a naive UTC datetime"""
+    if not isinstance(value, datetime):
+        return datetime(value.year, value.month, value.day)  # All-day event
+    return naive_utc(value)
+
+
+def caldav_event_bounds(event):
+    """Return the (start, end) of a CalDAV event as naive UTC datetimes"""
+    component = event.icalendar_component
+    dtstart = component.get('dtstart').dt
+    start = ical_time(dtstart)
+    if component.get('dtend') is not None:
+        end = ical_time(component.get('dtend').dt)
+    elif component.get('duration') is not None:
+        end = start + component.get('duration').dt
+    elif not isinstance(dtstart, datetime):
+        end = start + timedelta(days=1)  # All-day event without an end
+    else:
+        end = start
+    return start, end
+
+
+CATEGORY_TAG = re.compile(r'\[Category:([^\]\n]*)\]')  # Legacy description tag
+LEGACY_CATEGORY_TAG = re.compile(r'\n?\[Category:[^\]\n]*\]')  # Tag and its line break
+CATEGORY_PROPERTY = 'category'  # extendedProperties.private key holding the category
+EPOCH = datetime(1970, 1, 1)
+SECONDS_PER_DAY = 86400
+
+
+def epoch_seconds(moment):
+    """Naive UTC datetime -> integer seconds since the Unix epoch"""
+    return (moment - EPOCH) // timedelta(seconds=1)
+
+
+def from_epoch_seconds(seconds):
+    """Integer seconds since the Unix epoch -> naive UTC datetime"""
+    return EPOCH + timedelta(seconds=seconds)
+
+
+def tagged_categories(description):
+    """Return the names in every [Category:X] tag of an event description"""
+    return CATEGORY_TAG.findall(description or '')
+
+
+def event_categories(event):
+    """
+    Category names of a Google event: its private category property first, then
+    any legacy [Category:X] tags in the description
+    """
+    names = tagged_categories(event.get('description'))
+    private = (event.get('extendedProperties') or {}).get('private') or {}
+    category = private.get(CATEGORY_PROPERTY)
+    return [category, *names] if category else names
+
+
+def set_event_category(event, category):
+    """Store category in an event body's private extended properties"""
+    properties = dict(event.get('extendedProperties') or {})
+    properties['private'] = {**(properties.get('private') or {}), CATEGORY_PROPERTY: category}
+    event['extendedProperties'] = properties
+    return event
+
+
+def category_filter(category):
+    """privateExtendedProperty value for events().list() matching one category"""
+    return f"{CATEGORY_PROPERTY}={category}"
+
+
+# Interned category tags: code -> tuple of tag names, code 0 meaning untagged
+CATEGORY_TAG_SETS = [()]
+CATEGORY_TAG_CODES = {(): 0}
+category_tag_lock = threading.Lock()
+
+
+def category_code(names):
+    """Intern a list of category names and return their code"""
+    names = tuple(dict.fromkeys(names))
+    code = CATEGORY_TAG_CODES.get(names)
+    if code is None:
+        with category_tag_lock:
+            code = CATEGORY_TAG_CODES.get(names)
+            if code is None:
+                code = len(CATEGORY_TAG_SETS)
+                CATEGORY_TAG_SETS.append(names)
+                CATEGORY_TAG_CODES[names] = code
+    return code
+
+
+class Event:
+    """
+    Normalized calendar event from Google or CalDAV
+
+    Times are epoch seconds parsed once at construction and the category is an
+    interned tag code. The source payload is either held as-is or, when compact,
+    as serialized text that is only decoded if raw is asked for.
+    """
+    __slots__ = ('id', 'start', 'end', 'category', 'source', 'calendar_id',
+                 '_payload', '_raw')
+
+    def __init__(self, event_id, start, end, category=0, source=None, calendar_id=None,
+                 payload=None, raw=None):
+        self.id = event_id
+        self.start = start
+        self.end = end
+        self.category = category
+        self.source = source
+        self.calendar_id = calendar_id
+        self._payload = payload
+        self._raw = raw
+
+    @classmethod
+    def from_google(cls, event, calendar_id=None, compact=False):
+        """
+        Adapt a Google event dict
+        Args:
+            compact (bool): Keep the event as JSON text instead of holding the dict
+        """
+        start, end = event_bounds(event)
+        if compact:
+            payload, raw = json.dumps(event, separators=(',', ':')), None
+        else:
+            payload, raw = None, event
+        return cls(event.get('id'), epoch_seconds(start), epoch_seconds(end),
+                   category_code(event_categories(event)), 'google', calendar_id,
+                   payload, raw)
+
+    @classmethod
+    def from_caldav(cls, event, calendar_id=None, compact=False):
+        """
+        Adapt a CalDAV event object
+        Args:
+            compact (bool): Keep the event as iCalendar text instead of holding the object
+        """
+        component = event.icalendar_component
+        start, end = caldav_event_bounds(event)
+        if compact:
+            payload, raw = event.data, None
+        else:
+            payload, raw = None, event
+        return cls(str(component.get('uid', '')) or None, epoch_seconds(start),
+                   epoch_seconds(end),
+                   category_code(tagged_categories(str(component.get('description', '')))),
+                   'caldav', calendar_id, payload, raw)
+
+    @property
+    def raw(self):
+        """The source payload: a Google event dict or a CalDAV event object"""
+        if self._raw is None and self._payload is not None:
+            if self.source == 'google':
+                self._raw = json.loads(self._payload)
+            else:
+                import caldav
+                self._raw = caldav.Event(data=self._payload)
+        return self._raw
+
+    def serialized(self):
+        """The source payload as text: Google event JSON or iCalendar data"""
+        if self._payload is not None:
+            return self._payload
+        if self.source == 'google':
+            return json.dumps(self._raw, separators=(',', ':'))
+        return self._raw.data
+
+    def compacted(self):
+        """Return a copy that keeps the payload as serialized text"""
+        if self._payload is not None or self._raw is None:
+            return self
+        return Event(self.id, self.start, self.end, self.category, self.source,
+                     self.calendar_id, self.serialized())
+
+    @property
+    def busy(self):
+        """Whether the event blocks time, as freebusy counts it: not marked transparent"""
+        raw = self.raw
+        if self.source == 'google':
+            return raw.get('transparency') != 'transparent'
+        transparency = raw.icalendar_component.get('transp')
+        return transparency is None or str(transparency).upper() != 'TRANSPARENT'
+
+    def release(self):
+        """Drop a decoded compact payload; raw decodes it again on next use"""
+        if self._payload is not None:
+            self._raw = None
+
+    @property
+    def start_time(self):
+        return from_epoch_seconds(self.start)
+
+    @property
+    def end_time(self):
+        return from_epoch_seconds(self.end)
+
+    @property
+    def categories(self):
+        """Category names on the event, as event_categories() reads them"""
+        return CATEGORY_TAG_SETS[self.category]
+
+    def overlaps(self, start, end):
+        """Whether the event overlaps [start, end), given as epoch seconds"""
+        return self.start < end and self.end > start
+
+    def get(self, key, default=None):
+        """Look up summary, description, location or id as on a Google event dict"""
+        raw = self.raw
+        if self.source == 'google':
+            return raw.get(key, default)
+        value = raw.icalendar_component.get('uid' if key == 'id' else key)
+        return default if value is None else str(value)
+
+    def __repr__(self):
+        return (f"Event({self.id!r}, {self.start_time.isoformat()}, "
+                f"{self.end_time.isoformat()}, categories={self.categories!r})")
+
+
+MIRROR_FIELDS = ('summary', 'description', 'location', 'transparency', 'visibility')
+
+
+def mirror_event_id(record):
+    """
+    Stable testcal event ID for a source Event record
+    A hex digest of (source, calendar, event ID, start) is a valid Google event ID
+    and tells the instances of a recurring event apart.
+    """
+    key = f"{record.source}\n{record.calendar_id}\n{record.id}\n{record.start}"
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def mirror_event_body(record, category):
+    """Google insert body copying a source Event record into testcal under category"""
+    if record.source == 'google':
+        raw = record.raw
+        body = {field: raw[field] for field in MIRROR_FIELDS if field in raw}
+        body['start'], body['end'] = raw['start'], raw['end']
+    else:
+        body = {field: record.get(field) for field in MIRROR_FIELDS[:3]
+                if record.get(field) is not None}
+        if isinstance(record.raw.icalendar_component.get('dtstart').dt, datetime):
+            body['start'] = {'dateTime': record.start_time.isoformat() + 'Z'}
+            body['end'] = {'dateTime': record.end_time.isoformat() + 'Z'}
+        else:
+            body['start'] = {'date': record.start_time.date().isoformat()}
+            body['end'] = {'date': record.end_time.date().isoformat()}
+    body['id'] = mirror_event_id(record)
+    return set_event_category(body, category)
@@ -0,0 +1,334 @@
+"""
+Google Calendar access: the calendar registry, batched writes and incremental sync
+"""
+import json
+import time
+
+from events import Event, epoch_seconds
+from telemetry import error_status
+
+
+class CalendarRegistry:
+    """
+    Resolve Google calendar names to IDs with a TTL cache over calendarList()
+    """
+    def __init__(self, service, ttl=300):
+        self.service = service
+        self.ttl = ttl
+        self._ids = {}
+        self._loaded_at = None
+
+    def is_stale(self):
+        """Check whether the cached calendar listing needs reloading"""
+        if self._loaded_at is None:
+            return True
+        return self.ttl is not None and time.monotonic() - self._loaded_at > self.ttl
+
+    def refresh(self):
+        """Reload the full calendar listing, following every page"""
+        ids = {}
+        page_token = None
+        while True:
+            calendar_list = self.service.calendarList().list(
+                pageToken=page_token
+            ).execute()
+            for calendar in calendar_list.get('items', []):
+                # Keep the first match, like the old linear scans did
+                ids.setdefault(calendar['summary'], calendar['id'])
+            page_token = calendar_list.get('nextPageToken')
+            if not page_token:
+                break
+        self._ids = ids
+        self._loaded_at = time.monotonic()
+
+    def get_id(self, name):
+        """Return the ID of the named calendar, or None if it doesn't exist"""
+        if self.is_stale():
+            self.refresh()
+        return self._ids.get(name)
+
+    def get_or_create(self, name, time_zone='UTC'):
+        """Return the ID of the named calendar, creating it if missing"""
+        calendar_id = self.get_id(name)
+        if not calendar_id:
+            created_calendar = self.service.calendars().insert(
+                body={'summary': name, 'timeZone': time_zone}).execute()
+            calendar_id = created_calendar['id']
+            self._ids[name] = calendar_id
+        return calendar_id
+
+    def invalidate(self, name=None):
+        """Forget one cached calendar (or all of them) and reload on next lookup"""
+        if name is None:
+            self._ids = {}
+        else:
+            self._ids.pop(name, None)
+        self._loaded_at = None
+
+
+class PendingWrite:
+    """
+    Handle for a buffered Google write whose result arrives when the buffer flushes
+    """
+    def __init__(self, buffer, kind, request):
+        self.buffer = buffer
+        self.kind = kind        # 'insert', 'update' or 'delete'
+        self.request = request
+        self.response = None
+        self.error = None
+        self._done = False
+
+    def done(self):
+        """Check whether the write has been sent"""
+        return self._done
+
+    def result(self):
+        """Return the API response, flushing the owning buffer if still pending"""
+        if not self._done:
+            self.buffer.flush()
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+    def _complete(self, request_id, response, exception):
+        """Batch callback recording the per-item outcome"""
+        self.response = response
+        self.error = exception
+        self._done = True
+
+
+class WriteBuffer:
+    """
+    Collect event inserts, updates and deletes and send them as batch requests
+    """
+    def __init__(self, service, batch_size=50, ignore_conflicts=False):
+        self.service = service
+        self.batch_size = batch_size  # Calendar API accepts at most 50 calls per batch
+        # Treat 409 as written: an insert under a client-chosen ID an earlier run sent
+        self.ignore_conflicts = ignore_conflicts
+        self._pending = []
+        self.failed = []  # Every failed write since the buffer was created
+
+    def __len__(self):
+        return len(self._pending)
+
+    def insert(self, calendar_id, body):
+        """Queue an event insert"""
+        return self._queue('insert', self.service.events().insert(
+            calendarId=calendar_id, body=body))
+
+    def update(self, calendar_id, event_id, body):
+        """Queue an event update"""
+        return self._queue('update', self.service.events().update(
+            calendarId=calendar_id, eventId=event_id, body=body))
+
+    def delete(self, calendar_id, event_id):
+        """Queue an event delete"""
+        return self._queue('delete', self.service.events().delete(
+            calendarId=calendar_id, eventId=event_id))
+
+    def _queue(self, kind, request):
+        handle = PendingWrite(self, kind, request)
+        self._pending.append(handle)
+        return handle
+
+    def flush(self):
+        """
+        Send all queued writes in batch chunks
+        Returns:
+            list: PendingWrite handles that failed, each with its error set
+        """
+        failed = []
+        while self._pending:
+            chunk = self._pending[:self.batch_size]
+            del self._pending[:self.batch_size]
+
+            batch = self.service.new_batch_http_request()
+            for index, handle in enumerate(chunk):
+                batch.add(handle.request, callback=handle._complete,
+                          request_id=str(index))
+            try:
+                batch.execute()
+            except Exception as e:
+                # The whole chunk failed to send; report it against every item
+                for handle in chunk:
+                    if not handle.done():
+                        handle._complete(None, None, e)
+
+            for handle in chunk:
+                if handle.error is not None:
+                    if self.ignore_conflicts and error_status(handle.error) == 409:
+                        continue
+                    print(f"Error in batched {handle.kind}: {handle.error}")
+                    failed.append(handle)
+        self.failed.extend(failed)
+        return failed
+
+
+class CalendarSync:
+    """
+    Mirror Google calendars locally, fetching only changed events after the first sync
+    """
+    def __init__(self, service, page_size=2500, store=None):
+        self.service = service
+        self.page_size = page_size
+        self.store = store     # EventStore every sync is written through to, or None
+        self.sync_tokens = {}  # calendar_id -> nextSyncToken from the last sync
+        self.events = {}       # calendar_id -> {event_id: event}
+        self.records = {}      # calendar_id -> {event_id: Event} over the mirrored dicts
+
+    def iter_pages(self, calendar_id, service=None, page_size=None, **params):
+        """
+        Fetch events().list() one page at a time, only as the caller asks for more
+        Args:
+            service: Google service to call instead of self.service (e.g. a per-thread one)
+            page_size (int): maxResults per page; self.page_size by default
+        Yields:
+            dict: Each page response; the last one carries nextSyncToken
+        """
+        service = service or self.service
+        page_token = None
+        while True:
+            events_result = service.events().list(
+                calendarId=calendar_id,
+                maxResults=page_size or self.page_size,
+                pageToken=page_token,
+                **params
+            ).execute()
+            yield events_result
+            page_token = events_result.get('nextPageToken')
+            if not page_token:
+                return
+
+    def list_pages(self, calendar_id, service=None, **params):
+        """
+        Fetch every page of events().list()
+        Args:
+            service: Google service to call instead of self.service (e.g. a per-thread one)
+        Returns:
+            tuple: (list of events, nextSyncToken or None)
+        """
+        items = []
+        for events_result in self.iter_pages(calendar_id, service, **params):
+            items.extend(events_result.get('items', []))
+        return items, events_result.get('nextSyncToken')
+
+    def sync(self, calendar_id, service=None):
+        """Bring the local mirror of a calendar up to date and return it"""
+        from googleapiclient.errors import HttpError
+
+        sync_token = self.sync_tokens.get(calendar_id)
+        if sync_token is None and self.store is not None:
+            sync_token = self.restore(calendar_id)
+        if sync_token and calendar_id in self.events:
+            try:
+                changes, next_token = self.list_pages(
+                    calendar_id, service, singleEvents=True, syncToken=sync_token)
+            except HttpError as e:
+                if e.resp.status != 410:
+                    raise
+                # Sync token expired; the server wants a full resync
+                return self.full_sync(calendar_id, service)
+
+            mirror = self.events[calendar_id]
+            for event in changes:
+                if event.get('status') == 'cancelled':
+                    mirror.pop(event['id'], None)
+                else:
+                    mirror[event['id']] = event
+            self.sync_tokens[calendar_id] = next_token
+            if self.store is not None and changes:
+                self.store.apply(
+                    calendar_id, 'google',
+                    [Event.from_google(event, calendar_id) for event in changes
+                     if event.get('status') != 'cancelled'],
+                    [event['id'] for event in changes if event.get('status') == 'cancelled'],
+                    next_token)
+            return mirror
+
+        return self.full_sync(calendar_id, service)
+
+    def full_sync(self, calendar_id, service=None):
+        """Discard the local mirror of a calendar and fetch all of it again"""
+        items, next_token = self.list_pages(calendar_id, service, singleEvents=True)
+        self.events[calendar_id] = {event['id']: event for event in items
+                                    if event.get('status') != 'cancelled'}
+        self.sync_tokens[calendar_id] = next_token
+        if self.store is not None:
+            self.store.replace(calendar_id, 'google',
+                               [Event.from_google(event, calendar_id)
+                                for event in self.events[calendar_id].values()], next_token)
+        return self.events[calendar_id]
+
+    def restore(self, calendar_id):
+        """
+        Reload a calendar's mirror from the store, so sync continues incrementally
+        Returns:
+            str: The stored sync token, or None if the calendar was never synced
+        """
+        sync_token = self.store.sync_token(calendar_id)
+        if sync_token:
+            self.events[calendar_id] = self.store.google_events(calendar_id)
+            self.sync_tokens[calendar_id] = sync_token
+        return sync_token
+
+    def get_records(self, calendar_id, start_date=None, end_date=None, service=None):
+        """
+        Sync a calendar and return Event records overlapping a window, sorted by start
+        Only events that are new or changed since the last call are parsed.
+        Args:
+            start_date (datetime): Only events ending after this (naive UTC)
+            end_date (datetime): Only events starting before this (naive UTC)
+        """
+        mirror = self.sync(calendar_id, service)
+        known = self.records.get(calendar_id, {})
+        records = {}
+        for event_id, event in mirror.items():
+            record = known.get(event_id)
+            if record is None or record.raw is not event:
+                record = Event.from_google(event, calendar_id)
+            records[event_id] = record
+        self.records[calendar_id] = records
+
+        lo = epoch_seconds(start_date) if start_date is not None else None
+        hi = epoch_seconds(end_date) if end_date is not None else None
+        matched = [record for record in records.values()
+                   if (lo is None or record.end > lo) and (hi is None or record.start < hi)]
+        matched.sort(key=lambda record: record.start)
+        return matched
+
+    def get_events(self, calendar_id, start_date=None, end_date=None, service=None):
+        """
+        Sync a calendar and return its events overlapping a window, sorted by start
+        Args:
+            start_date (datetime): Only events ending after this (naive UTC)
+            end_date (datetime): Only events starting before this (naive UTC)
+        """
+        return [record.raw for record in
+                self.get_records(calendar_id, start_date, end_date, service)]
+
+    def forget(self, calendar_id=None):
+        """Drop the mirror and sync token so the next sync is a full one"""
+        if self.store is not None:
+            self.store.forget(calendar_id)
+        if calendar_id is None:
+            self.sync_tokens = {}
+            self.events = {}
+            self.records = {}
+        else:
+            self.sync_tokens.pop(calendar_id, None)
+            self.events.pop(calendar_id, None)
+            self.records.pop(calendar_id, None)
+
+    def save(self, path):
+        """Write sync tokens and mirrored events to a JSON file"""
+        with open(path, 'w') as f:
+            json.dump({'sync_tokens': self.sync_tokens, 'events': self.events}, f)
+
+    def load(self, path):
+        """Restore sync tokens and mirrored events written by save()"""
+        with open(path) as f:
+            state = json.load(f)
+        self.sync_tokens = state.get('sync_tokens', {})
+        self.events = state.get('events', {})
+        self.records = {}
@@ -0,0 +1,125 @@
+"""
+On-disk cache and single-flight coalescing for Ollama responses
+"""
+import json
+import time
+import hashlib
+import os
+import threading
+
+
+class ResponseCache:
+    """
+    On-disk cache of LLM responses keyed on (model, normalized prompt),
+    with a TTL and size-bounded LRU eviction
+    """
+    def __init__(self, directory, ttl=None, max_bytes=50 * 1024 * 1024):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def key(model, prompt, response_format=None):
+        """Hash a model and prompt, ignoring differences in whitespace"""
+        normalized = ' '.join(prompt.split())
+        return hashlib.sha256(
+            json.dumps([model, normalized, response_format]).encode()).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def get(self, key):
+        """Return a cached response, or None if missing or expired"""
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if self.ttl is not None and time.time() - entry['created'] > self.ttl:
+            self._remove(path)
+            return None
+        # Touch the file so eviction sees it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['response']
+
+    def put(self, key, response):
+        """Store a response, then evict least recently used entries over the size cap"""
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({'created': time.time(), 'response': response}, f)
+            os.replace(temp_path, path)
+        except OSError:
+            self._remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used entries until the cache fits max_bytes"""
+        if self.max_bytes is None:
+            return
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith('.json'):
+                continue
+            try:
+                stat = entry.stat()
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.json'):
+                self._remove(entry.path)
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls with the same key into one execution
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}  # key -> Future shared by every caller
+
+    def do(self, key, func):
+        """Run func for key, or wait for the call already in flight and share its result"""
+        from concurrent.futures import Future
+
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+        if not leader:
+            return future.result()
+
+        try:
+            future.set_result(func())
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                del self._calls[key]
+        return future.result()
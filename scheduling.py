@@ -0,0 +1,1193 @@
+"""
+Free-time search, the availability cache and the schedulers that fill category minimums
+"""
+from datetime import datetime, timedelta
+import time
+import bisect
+import uuid
+import heapq
+
+from categories import CategoryRollup
+from events import (SECONDS_PER_DAY, Event, epoch_seconds, event_bounds, event_categories,
+                    parse_event_time, set_event_category)
+
+
+class EventIntervalIndex:
+    """
+    Sorted-array interval index over events, answering overlap queries with bisect
+    """
+    def __init__(self):
+        self._keys = []   # Sorted (start, event_id) pairs
+        self._by_id = {}  # event_id -> (start, end, event)
+        self._max_duration = timedelta(0)
+
+    def __len__(self):
+        return len(self._by_id)
+
+    def __contains__(self, event_id):
+        return event_id in self._by_id
+
+    def get(self, event_id):
+        """Return the indexed event with this ID, or None"""
+        entry = self._by_id.get(event_id)
+        return entry[2] if entry else None
+
+    def add(self, event_id, start, end, event):
+        """Index an event, replacing any earlier entry with the same ID"""
+        self.remove(event_id)
+        bisect.insort(self._keys, (start, event_id))
+        self._by_id[event_id] = (start, end, event)
+        self._max_duration = max(self._max_duration, end - start)
+
+    def add_event(self, event):
+        """Index a Google event dict by its ID and start/end times"""
+        start, end = event_bounds(event)
+        self.add(event['id'], start, end, event)
+
+    def add_record(self, record):
+        """Index the payload of an Event record without re-parsing its times"""
+        self.add(record.id, record.start_time, record.end_time, record.raw)
+
+    def remove(self, event_id):
+        """Drop an event from the index if present"""
+        entry = self._by_id.pop(event_id, None)
+        if entry is None:
+            return None
+        position = bisect.bisect_left(self._keys, (entry[0], event_id))
+        del self._keys[position]
+        return entry[2]
+
+    def clear(self):
+        self._keys = []
+        self._by_id = {}
+        self._max_duration = timedelta(0)
+
+    def overlapping(self, start, end):
+        """Return events overlapping [start, end), in start order"""
+        # No event starting before start - max_duration can reach start
+        lo = bisect.bisect_left(self._keys, (start - self._max_duration,))
+        hi = bisect.bisect_left(self._keys, (end,))
+        matched = []
+        for key in self._keys[lo:hi]:
+            event_start, event_end, event = self._by_id[key[1]]
+            if event_end > start:
+                matched.append(event)
+        return matched
+
+    def at(self, moment):
+        """Return events in progress at a point in time"""
+        return self.overlapping(moment, moment + timedelta(microseconds=1))
+
+
+def merge_intervals(intervals):
+    """Sort (start, end) pairs and merge any that overlap or touch"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        elif end > start:
+            merged.append([start, end])
+    return [(start, end) for start, end in merged]
+
+
+class FreeTimeEngine:
+    """
+    Free gaps in a window, computed once by sweeping merged busy intervals
+    """
+    def __init__(self, start_date, end_date, busy_periods=(), min_duration=timedelta(0)):
+        self._starts = []  # Sorted gap starts
+        self._ends = []    # Gap ends, parallel to _starts
+
+        cursor = start_date
+        for busy_start, busy_end in merge_intervals(busy_periods):
+            if busy_end <= cursor:
+                continue
+            if busy_start >= end_date:
+                break
+            self._add_gap(cursor, min(busy_start, end_date), min_duration)
+            cursor = max(cursor, busy_end)
+        self._add_gap(cursor, end_date, min_duration)
+
+    def _add_gap(self, start, end, min_duration):
+        """Append a free gap, split at day boundaries"""
+        while start < end:
+            day_end = (start + timedelta(days=1)).replace(
+                hour=0, minute=0, second=0, microsecond=0)
+            piece_end = min(day_end, end)
+            if piece_end - start > min_duration:
+                self._starts.append(start)
+                self._ends.append(piece_end)
+            start = piece_end
+
+    def __len__(self):
+        return len(self._starts)
+
+    def slots(self):
+        """Return the current free gaps as (start, end) pairs in time order"""
+        return list(zip(self._starts, self._ends))
+
+    def iter_slots(self):
+        """
+        Walk free gaps in time order while they are being booked
+        Leftovers of a gap booked from its start are visited next.
+        """
+        previous_start = None
+        while True:
+            if previous_start is None:
+                position = 0
+            else:
+                position = bisect.bisect_right(self._starts, previous_start)
+            if position >= len(self._starts):
+                return
+            previous_start = self._starts[position]
+            yield self._starts[position], self._ends[position]
+
+    def gap_at(self, moment):
+        """Return the free gap containing a moment, or None"""
+        position = bisect.bisect_right(self._starts, moment) - 1
+        if position >= 0 and self._ends[position] > moment:
+            return self._starts[position], self._ends[position]
+        return None
+
+    def is_free(self, start, end):
+        """Check whether [start, end) lies entirely inside one free gap"""
+        gap = self.gap_at(start)
+        return gap is not None and end <= gap[1]
+
+    def book(self, start, end):
+        """Carve [start, end) out of the free gaps"""
+        position = max(bisect.bisect_right(self._starts, start) - 1, 0)
+        while position < len(self._starts) and self._starts[position] < end:
+            gap_start, gap_end = self._starts[position], self._ends[position]
+            if gap_end <= start:
+                position += 1
+                continue
+            pieces = []
+            if gap_start < start:
+                pieces.append((gap_start, start))
+            if end < gap_end:
+                pieces.append((end, gap_end))
+            self._starts[position:position + 1] = [piece[0] for piece in pieces]
+            self._ends[position:position + 1] = [piece[1] for piece in pieces]
+            position += len(pieces)
+
+
+class OccupancyGrid:
+    """
+    Free time as a NumPy bool array of fixed-size cells, with per-category window masks
+
+    Cell i starts i * granularity after midnight of the first day, and True means
+    free. A preferred window becomes a mask of the same shape, wrapping past
+    midnight when it ends before it starts (Sleep's 22:00-08:30), so free runs
+    of at least N minutes inside a category's window come from one vectorized
+    pass over the whole grid, and a run may carry on across midnight.
+    """
+    def __init__(self, start_date, end_date, busy_periods=(), granularity=timedelta(minutes=15)):
+        import numpy as np
+
+        self.cell_seconds = int(granularity.total_seconds())
+        if SECONDS_PER_DAY % self.cell_seconds:
+            raise Exception("Occupancy granularity must divide a day evenly")
+        self.cells_per_day = SECONDS_PER_DAY // self.cell_seconds
+        self.origin = start_date.replace(hour=0, minute=0, second=0, microsecond=0)
+        self.origin_seconds = epoch_seconds(self.origin)
+        self.day_count = max(1, -(-(epoch_seconds(end_date) - self.origin_seconds) //
+                                  SECONDS_PER_DAY))
+        self.free = np.zeros(self.day_count * self.cells_per_day, dtype=bool)
+        self.free[slice(*self._cells(start_date, end_date, outer=False))] = True
+        for busy_start, busy_end in busy_periods:
+            self.book(busy_start, busy_end)
+        self._masks = {}  # (window, weekday_only) -> mask
+
+    def _cells(self, start, end, outer=True):
+        """
+        [start, end) as a (first, end) cell range within the grid
+        Args:
+            outer (bool): Include cells start and end only partly cover
+        """
+        lo = epoch_seconds(start) - self.origin_seconds
+        hi = epoch_seconds(end) - self.origin_seconds
+        if outer:
+            first, last = lo // self.cell_seconds, -(-hi // self.cell_seconds)
+        else:
+            first, last = -(-lo // self.cell_seconds), hi // self.cell_seconds
+        return max(first, 0), max(min(last, len(self.free)), 0)
+
+    def time(self, cell):
+        """Start of a cell as a naive UTC datetime"""
+        return self.origin + timedelta(seconds=int(cell) * self.cell_seconds)
+
+    def book(self, start, end):
+        """Mark every cell [start, end) touches busy"""
+        first, last = self._cells(start, end)
+        self.free[first:last] = False
+
+    def is_free(self, start, end):
+        """Check whether every cell [start, end) touches is free"""
+        first, last = self._cells(start, end)
+        return first < last and bool(self.free[first:last].all())
+
+    def window_mask(self, window=None, weekday_only=False):
+        """
+        Cells a category may use: its preferred window, on weekdays only if required
+        Args:
+            window (tuple): (start, end) minutes after midnight, as CategoryRules.window()
+                gives; None allows the whole day
+        """
+        import numpy as np
+
+        key = (window, bool(weekday_only))
+        mask = self._masks.get(key)
+        if mask is None:
+            cell = np.arange(self.cells_per_day)
+            first = last = 0
+            if window is not None:
+                first = -(-window[0] * 60 // self.cell_seconds)
+                last = window[1] * 60 // self.cell_seconds
+            if first == last:
+                in_window = np.ones(self.cells_per_day, dtype=bool)
+            elif first < last:
+                in_window = (cell >= first) & (cell < last)
+            else:
+                in_window = (cell >= first) | (cell < last)  # Wraps past midnight
+            allowed_days = np.ones(self.day_count, dtype=bool)
+            if weekday_only:
+                allowed_days = (self.origin.weekday() + np.arange(self.day_count)) % 7 < 5
+            mask = self._masks[key] = (allowed_days[:, None] & in_window[None, :]).ravel()
+        return mask
+
+    def free_runs(self, mask=None, min_duration=timedelta(0), after=None):
+        """
+        Maximal runs of free cells inside a mask, in time order
+        Args:
+            min_duration (timedelta): Leave out shorter runs
+            after (datetime): Only look at cells starting at or after this
+        Returns:
+            list: (start, end) naive UTC datetimes
+        """
+        import numpy as np
+
+        offset = self._cells(after, after, outer=False)[0] if after is not None else 0
+        usable = self.free[offset:] if mask is None else self.free[offset:] & mask[offset:]
+        edges = np.flatnonzero(np.diff(usable, prepend=False, append=False))
+        starts, ends = edges[0::2], edges[1::2]
+        keep = (ends - starts) * self.cell_seconds >= min_duration.total_seconds()
+        return [(self.time(offset + first), self.time(offset + last))
+                for first, last in zip(starts[keep], ends[keep])]
+
+    def next_free_run(self, mask=None, min_duration=timedelta(0), after=None):
+        """The first free run of at least min_duration inside a mask, or None"""
+        runs = self.free_runs(mask, min_duration, after)
+        return runs[0] if runs else None
+
+
+class AvailabilityCache:
+    """
+    Busy time per calendar over a window, seeded from one freebusy query
+
+    Bookings, moves and deletes are applied locally as sorted, merged interval
+    lists, so availability checks between commits never touch the network.
+    """
+    def __init__(self, start_date, end_date, busy=None):
+        self.start_date = start_date
+        self.end_date = end_date
+        self.busy = {calendar_id: merge_intervals(periods)
+                     for calendar_id, periods in (busy or {}).items()}
+        self.unavailable = set()  # Calendars the server couldn't report on
+        self.changes = 0  # Local edits since the cache was seeded
+
+    @classmethod
+    def from_freebusy(cls, response, start_date, end_date):
+        """
+        Build from a freebusy().query() response
+        Calendars the server reported errors for are left out.
+        """
+        busy = {}
+        unavailable = set()
+        for calendar_id, calendar in response.get('calendars', {}).items():
+            if calendar.get('errors'):
+                print(f"Error reading availability of {calendar_id}: {calendar['errors']}")
+                unavailable.add(calendar_id)
+                continue
+            busy[calendar_id] = [(parse_event_time(period['start']),
+                                  parse_event_time(period['end']))
+                                 for period in calendar.get('busy', [])]
+        cache = cls(start_date, end_date, busy)
+        cache.unavailable = unavailable
+        return cache
+
+    def covers(self, start_date, end_date, calendar_ids=()):
+        """Check whether the cache can answer for a window and set of calendars"""
+        return (self.start_date <= start_date and end_date <= self.end_date
+                and all(calendar_id in self.busy or calendar_id in self.unavailable
+                        for calendar_id in calendar_ids))
+
+    def book(self, calendar_id, start, end):
+        """Mark [start, end) busy on a calendar"""
+        periods = self.busy.setdefault(calendar_id, [])
+        lo = bisect.bisect_left(periods, (start,))
+        if lo and periods[lo - 1][1] >= start:
+            lo -= 1
+        hi = lo
+        while hi < len(periods) and periods[hi][0] <= end:
+            start, end = min(start, periods[hi][0]), max(end, periods[hi][1])
+            hi += 1
+        periods[lo:hi] = [(start, end)]
+        self.changes += 1
+
+    def release(self, calendar_id, start, end, still_busy=()):
+        """
+        Mark [start, end) free on a calendar, e.g. after deleting an event
+        Args:
+            still_busy: (start, end) pairs of other events overlapping the freed
+                time, which stay busy
+        """
+        periods = self.busy.setdefault(calendar_id, [])
+        lo = max(bisect.bisect_left(periods, (start,)) - 1, 0)
+        hi = lo
+        pieces = []
+        while hi < len(periods) and periods[hi][0] < end:
+            busy_start, busy_end = periods[hi]
+            if busy_end > start:
+                if busy_start < start:
+                    pieces.append((busy_start, start))
+                if end < busy_end:
+                    pieces.append((end, busy_end))
+            else:
+                pieces.append((busy_start, busy_end))
+            hi += 1
+        periods[lo:hi] = pieces
+        self.changes += 1
+        for busy_start, busy_end in still_busy:
+            if busy_start < end and busy_end > start:
+                self.book(calendar_id, max(busy_start, start), min(busy_end, end))
+
+    def move(self, calendar_id, old_start, old_end, start, end, still_busy=()):
+        """Release an event's old time and book its new one"""
+        self.release(calendar_id, old_start, old_end, still_busy)
+        self.book(calendar_id, start, end)
+
+    def busy_periods(self, start_date, end_date, calendar_ids=None):
+        """Merged busy (start, end) pairs overlapping a window, across calendars"""
+        calendar_ids = self.busy if calendar_ids is None else calendar_ids
+        periods = []
+        for calendar_id in calendar_ids:
+            calendar_periods = self.busy.get(calendar_id, [])
+            lo = max(bisect.bisect_left(calendar_periods, (start_date,)) - 1, 0)
+            for busy_start, busy_end in calendar_periods[lo:]:
+                if busy_start >= end_date:
+                    break
+                if busy_end > start_date:
+                    periods.append((busy_start, busy_end))
+        return merge_intervals(periods)
+
+    def is_free(self, start, end, calendar_ids=None):
+        """Check whether [start, end) is clear on every calendar"""
+        return not self.busy_periods(start, end, calendar_ids)
+
+    def free_time(self, start_date, end_date, calendar_ids=None, min_duration=timedelta(0)):
+        """FreeTimeEngine over a window of this cache"""
+        return FreeTimeEngine(start_date, end_date,
+                              self.busy_periods(start_date, end_date, calendar_ids),
+                              min_duration)
+
+
+OFFICE_LOCATION = "141 W Jackson Blvd, Chicago, IL"
+SCHEDULED_TITLE_PREFIX = "Scheduled "
+
+
+def work_location(start_time, events, categories):
+    """
+    Office address for an in-person Work block, or None to leave it unset
+    Tuesday-Thursday Work is in person unless a non-virtual, non-Work event
+    is already booked before 3 PM that day.
+    Args:
+        events: Event dicts overlapping the day up to 3 PM
+    """
+    if start_time.weekday() not in [1, 2, 3]:
+        return None
+    for event in events:
+        tagged = event_categories(event)
+        event_category = next((cat for cat in categories if cat in tagged), None)
+        if (event_category != 'Work' and
+                event.get('location') and
+                'virtual' not in event.get('location', '').lower()):
+            return None
+    return OFFICE_LOCATION
+
+
+def scheduled_category(event):
+    """
+    Category of an event the scheduler created ("Scheduled X" in category X),
+    or None for anything else
+    """
+    summary = event.get('summary') or ''
+    if not summary.startswith(SCHEDULED_TITLE_PREFIX):
+        return None
+    category = summary[len(SCHEDULED_TITLE_PREFIX):]
+    categories = (event.categories if isinstance(event, Event)
+                  else event_categories(event))
+    if category not in categories:
+        return None
+    return category
+
+
+class PlannedEvent:
+    """An event the scheduler wants in testcal"""
+    __slots__ = ('category', 'start', 'end', 'description', 'location')
+
+    def __init__(self, category, start, end, description="", location=None):
+        self.category = category
+        self.start = start
+        self.end = end
+        self.description = description
+        self.location = location
+
+    @property
+    def title(self):
+        return f"{SCHEDULED_TITLE_PREFIX}{self.category}"
+
+    def key(self):
+        """(category, start, end) in epoch seconds, for matching existing events"""
+        return self.category, epoch_seconds(self.start), epoch_seconds(self.end)
+
+    def body(self, event_id=None):
+        """Google event body for this block"""
+        event = {
+            'id': event_id or uuid.uuid4().hex,
+            'summary': self.title,
+            'description': self.description,
+            'start': {
+                'dateTime': self.start.isoformat(),
+                'timeZone': 'UTC',
+            },
+            'end': {
+                'dateTime': self.end.isoformat(),
+                'timeZone': 'UTC',
+            },
+        }
+        if self.location:
+            event['location'] = self.location
+        return set_event_category(event, self.category)
+
+    def __repr__(self):
+        return (f"PlannedEvent({self.category!r}, {self.start.isoformat()}, "
+                f"{self.end.isoformat()})")
+
+
+def record_key(record):
+    """(category, start, end) of an existing scheduled Event record"""
+    return scheduled_category(record), record.start, record.end
+
+
+class SchedulePlan:
+    """
+    Changes that bring testcal's scheduled events in line with a planned schedule
+    Attributes:
+        adds (list): PlannedEvents to insert
+        moves (list): (event_id, PlannedEvent) pairs to rewrite in place
+        deletes (list): IDs of scheduled events that are no longer wanted
+        kept (int): Scheduled events that already match the plan
+    """
+    def __init__(self, adds=(), moves=(), deletes=(), kept=0):
+        self.adds = list(adds)
+        self.moves = list(moves)
+        self.deletes = list(deletes)
+        self.kept = kept
+
+    def __len__(self):
+        return len(self.adds) + len(self.moves) + len(self.deletes)
+
+    @classmethod
+    def from_desired(cls, desired, existing):
+        """
+        Diff wanted blocks against scheduled Event records
+        Exact (category, start, end) matches are kept as they are. Leftovers of
+        the same category are paired up in time order and become moves, so a
+        shifted block costs one update instead of a delete and an insert.
+        """
+        unmatched = {}
+        for record in sorted(existing, key=lambda record: record.start):
+            unmatched.setdefault(record_key(record), []).append(record)
+
+        kept = 0
+        leftover_desired = {}
+        for planned in sorted(desired, key=lambda planned: planned.start):
+            matches = unmatched.get(planned.key())
+            if matches:
+                matches.pop(0)
+                kept += 1
+            else:
+                leftover_desired.setdefault(planned.category, []).append(planned)
+
+        leftover_existing = {}
+        for (category, start, end), records in sorted(
+                unmatched.items(), key=lambda item: item[0][1]):
+            leftover_existing.setdefault(category, []).extend(records)
+
+        plan = cls(kept=kept)
+        for category in set(leftover_desired) | set(leftover_existing):
+            wanted = leftover_desired.get(category, [])
+            current = leftover_existing.get(category, [])
+            plan.moves.extend((record.id, planned) for record, planned in zip(current, wanted))
+            plan.adds.extend(wanted[len(current):])
+            plan.deletes.extend(record.id for record in current[len(wanted):])
+        plan.adds.sort(key=lambda planned: planned.start)
+        plan.moves.sort(key=lambda move: move[1].start)
+        return plan
+
+    def describe(self):
+        """Human-readable listing of the changes, for dry runs"""
+        lines = [f"{len(self.adds)} to add, {len(self.moves)} to move, "
+                 f"{len(self.deletes)} to delete, {self.kept} unchanged"]
+        lines += [f"  + {planned.title} {planned.start:%Y-%m-%d %H:%M}-{planned.end:%H:%M}"
+                  for planned in self.adds]
+        lines += [f"  ~ {event_id} -> {planned.title} "
+                  f"{planned.start:%Y-%m-%d %H:%M}-{planned.end:%H:%M}"
+                  for event_id, planned in self.moves]
+        lines += [f"  - {event_id}" for event_id in self.deletes]
+        return '\n'.join(lines)
+
+
+class SchedulePlanner:
+    """
+    Decide which scheduled blocks testcal should hold, entirely in memory
+
+    The planner works from a snapshot of testcal Event records. Events it
+    created on earlier runs are set aside and planned again from scratch, so
+    an unchanged calendar plans the same blocks and the resulting diff is empty.
+    """
+    def __init__(self, start_date, end_date, records, rules, categories, busy_periods=()):
+        """
+        Args:
+            records: testcal Event records overlapping the window
+            rules (CategoryRules): Minimums and preferred windows to plan for
+            busy_periods: Extra (start, end) pairs to keep clear, e.g. other calendars
+        """
+        self.start_date = start_date
+        self.end_date = end_date
+        self.rules = rules
+        self.categories = categories
+
+        window = (epoch_seconds(start_date), epoch_seconds(end_date))
+        self.scheduled = []  # Earlier scheduler output inside the window; planned again
+        self.fixed = []      # Everything else stays where it is
+        for record in records:
+            if (window[0] <= record.start and record.end <= window[1] and
+                    scheduled_category(record)):
+                self.scheduled.append(record)
+            else:
+                self.fixed.append(record)
+
+        self.rollup = CategoryRollup.from_records(
+            categories, self.fixed, start_date,
+            end_date.replace(hour=23, minute=59, second=59))
+        self.busy_periods = list(busy_periods) + [
+            (record.start_time, record.end_time) for record in self.fixed
+            if record.get('transparency') != 'transparent']
+
+    def free_time(self):
+        """Free slots longer than 30 minutes, split at midnight"""
+        return FreeTimeEngine(self.start_date, self.end_date, self.busy_periods,
+                              min_duration=timedelta(minutes=30))
+
+    def occupancy(self, granularity=timedelta(minutes=15)):
+        """Free time as an OccupancyGrid, for searches inside preferred windows"""
+        return OccupancyGrid(self.start_date, self.end_date, self.busy_periods, granularity)
+
+    def slot_count(self):
+        return len(self.free_time())
+
+    def category_needed_hours(self):
+        """
+        Return {category: hours still needed} to meet every category's daily,
+        weekly and monthly minimums, in rules order
+        """
+        needed = dict(zip(self.rules.names, self.rollup.needed_hours(self.rules).tolist()))
+
+        # Apply sleep maximum of 8 hours per day
+        if 'Sleep' in needed:
+            max_sleep_hours = 8 * self.rollup.day_count
+            current = self.rollup.total('Sleep')
+            if current + needed['Sleep'] > max_sleep_hours:
+                needed['Sleep'] = max(0, max_sleep_hours - current)
+
+        return needed
+
+    def needed_hours(self):
+        """Return {category: hours still needed} for every category the planner fills"""
+        return {category: hours for category, hours in self.category_needed_hours().items()
+                if category not in ['Workout', 'SSS']}
+
+    def fixed_index(self):
+        """Interval index over the fixed events"""
+        index = EventIntervalIndex()
+        for record in self.fixed:
+            index.add_record(record)
+        return index
+
+    def planned_event(self, index, category, start, end, description):
+        """
+        Make a PlannedEvent and add it to index
+        Work blocks get the office location when work_location says the day is in person.
+        """
+        location = None
+        if category == 'Work':
+            location = work_location(
+                start, index.overlapping(start.replace(hour=0, minute=0, second=0),
+                                         start.replace(hour=15, minute=0, second=0)),
+                self.categories)
+        planned = PlannedEvent(category, start, end, description, location)
+        index.add(f"planned-{len(index)}", start, end, planned.body(''))
+        return planned
+
+    def plan(self, strategies=None, engine='greedy', time_budget=None):
+        """
+        Plan the scheduled blocks and diff them against the snapshot
+        Args:
+            strategies (dict): Category -> AI strategy (1-4); missing ones use 3
+            engine: Name in SCHEDULING_ENGINES, or an object with
+                schedule(planner, strategies, deadline) returning PlannedEvents
+            time_budget (float): Seconds the engine may run before greedy takes over
+        Returns:
+            SchedulePlan
+        """
+        strategies = strategies or {}
+        if isinstance(engine, str):
+            engine = SCHEDULING_ENGINES[engine]()
+        deadline = time.monotonic() + time_budget if time_budget is not None else None
+        try:
+            desired = engine.schedule(self, strategies, deadline)
+        except SchedulerTimeout:
+            print(f"{type(engine).__name__} ran out of time; falling back to greedy")
+            desired = GreedyScheduler().schedule(self, strategies)
+        return SchedulePlan.from_desired(desired, self.scheduled)
+
+
+class SchedulerTimeout(Exception):
+    """Raised by a scheduling engine that has used up its time budget"""
+
+
+class GreedyScheduler:
+    """
+    First-fit scheduling: Sleep (each block followed by SSS and maybe Workout),
+    then every other category in list order takes the earliest free runs
+    inside its preferred window
+    """
+    SLEEP_DAILY_CAP = 8  # Hours per window occurrence, e.g. one night
+
+    def __init__(self, granularity=timedelta(minutes=15)):
+        self.granularity = granularity
+
+    def schedule(self, planner, strategies, deadline=None):
+        free_time = planner.free_time()
+        occupancy = planner.occupancy(self.granularity)
+        rules = planner.rules
+        needed = planner.needed_hours()
+
+        # Fixed events plus everything planned so far, as get_events_at_time saw them
+        index = planner.fixed_index()
+        desired = []
+
+        def add(category, start, end, description):
+            desired.append(planner.planned_event(index, category, start, end, description))
+            free_time.book(start, end)
+            occupancy.book(start, end)
+
+        # Process Sleep first to establish base schedule
+        if 'Sleep' in rules:
+            self._fill_category(occupancy, add, rules, 'Sleep', needed['Sleep'],
+                                strategies.get('Sleep', 3))
+            self._follow_sleep(planner, free_time, add, index)
+
+        # Process remaining categories
+        for category in rules.names:
+            if category in ['Sleep', 'Workout', 'SSS']:
+                continue
+            self._fill_category(occupancy, add, rules, category, needed[category],
+                                strategies.get(category, 3))
+
+        return desired
+
+    def _fill_category(self, occupancy, add, rules, category, needed_hours, strategy):
+        """First-fit a category's needed hours into free runs inside its preferred window"""
+        hours_to_fill = needed_hours
+
+        # Apply AI strategy
+        if strategy == 1:  # Larger blocks
+            min_duration = 2.0  # Minimum 2 hours
+        elif strategy == 2:  # Smaller sessions
+            min_duration = 0.5  # 30 minutes
+        else:  # Strategy 3 or 4
+            min_duration = 1.0  # 1 hour
+
+        # Runs of the window (weekdays only if required) long enough for one block
+        rule = rules.ids[category]
+        window = rules.window(rule)
+        runs = occupancy.free_runs(
+            occupancy.window_mask(window, rules.weekday_only[rule]),
+            timedelta(hours=min_duration))
+        cap = self.SLEEP_DAILY_CAP if category == 'Sleep' else None
+        placed = {}  # Window occurrence -> hours placed in it
+        for start, end in runs:
+            # What's left of a run after a block is used next
+            slot_duration = (end - start).total_seconds() / 3600
+            while hours_to_fill > 0 and slot_duration >= min_duration:
+                hours_to_use = min(
+                    slot_duration,
+                    hours_to_fill if strategy != 2 else min(2.0, hours_to_fill)
+                )
+                if cap is not None:
+                    occurrence = self._window_occurrence(window, start)
+                    room = cap - placed.get(occurrence, 0)
+                    if room < min_duration:
+                        break
+                    hours_to_use = min(hours_to_use, room)
+                    placed[occurrence] = placed.get(occurrence, 0) + hours_to_use
+
+                add(category, start, start + timedelta(hours=hours_to_use),
+                    f"Automatically scheduled to meet minimum hours\nAI Strategy: {strategy}")
+                hours_to_fill -= hours_to_use
+                start += timedelta(hours=hours_to_use)
+                slot_duration -= hours_to_use
+            if hours_to_fill <= 0:
+                break
+
+    @staticmethod
+    def _window_occurrence(window, moment):
+        """
+        Date a moment's window occurrence opens on: a window wrapping midnight,
+        like Sleep's 22:00-08:30, belongs to the evening it starts
+        """
+        if window is not None and window[0] > window[1]:
+            if moment.hour * 60 + moment.minute < window[1]:
+                return moment.date() - timedelta(days=1)
+        return moment.date()
+
+    def _follow_sleep(self, planner, free_time, add, index):
+        """After each Sleep block, schedule SSS and potentially Workout"""
+        has_workout = 'Workout' in planner.rules
+
+        for start, end in free_time.slots():
+            # A free slot that opens right as a Sleep event ends
+            nearby_events = index.overlapping(start - timedelta(minutes=1),
+                                              start + timedelta(minutes=1))
+            if not any('Sleep' in event_categories(event) for event in nearby_events):
+                continue
+            sleep_end = start
+
+            # Schedule SSS immediately after Sleep
+            sss_duration = 1  # 1 hour for SSS
+            sss_end = sleep_end + timedelta(hours=sss_duration)
+            workout_duration = 1.5  # 1.5 hours for morning workout
+
+            # Check if it's morning hours (before 9 AM)
+            is_morning = sleep_end.hour < 9
+
+            if (is_morning and has_workout and free_time.is_free(
+                    sleep_end, sss_end + timedelta(hours=workout_duration))):
+                # Schedule Workout between Sleep and SSS
+                sss_start = sleep_end + timedelta(hours=workout_duration)
+                add('Workout', sleep_end, sss_start, "Morning workout following sleep")
+                add('SSS', sss_start, sss_start + timedelta(hours=sss_duration),
+                    "Morning SSS following workout")
+            elif free_time.is_free(sleep_end, sss_end):
+                # Just schedule SSS after Sleep
+                add('SSS', sleep_end, sss_end, "SSS following sleep")
+
+
+class MinCostFlow:
+    """
+    Min-cost max-flow by the primal-dual method
+
+    Each round runs Dijkstra with node potentials to find the cheapest
+    augmenting cost, then sends a blocking flow along every path of that
+    cost at once. Arc costs must be non-negative integers.
+    """
+    INFINITY = float('inf')
+
+    def __init__(self, node_count):
+        self.node_count = node_count
+        self.heads = [[] for _ in range(node_count)]  # node -> arc indices leaving it
+        self.targets = []
+        self.capacities = []
+        self.costs = []
+
+    def add_edge(self, source, target, capacity, cost=0):
+        """Add an arc and return its index, for reading its flow after solve()"""
+        arc = len(self.targets)
+        self.targets += [target, source]
+        self.capacities += [capacity, 0]
+        self.costs += [cost, -cost]
+        self.heads[source].append(arc)
+        self.heads[target].append(arc + 1)
+        return arc
+
+    def flow(self, arc):
+        """Flow sent along an arc returned by add_edge()"""
+        return self.capacities[arc ^ 1]
+
+    def solve(self, source, sink, deadline=None):
+        """
+        Send as much flow as possible from source to sink at minimum cost
+        Args:
+            deadline (float): time.monotonic() value after which SchedulerTimeout is raised
+        Returns:
+            tuple: (flow, cost)
+        """
+        potential = [0] * self.node_count
+        total_flow = total_cost = 0
+        while True:
+            if deadline is not None and time.monotonic() > deadline:
+                raise SchedulerTimeout()
+            distance = self._distances(source, potential)
+            if distance[sink] == self.INFINITY:
+                return total_flow, total_cost
+            limit = distance[sink]
+            for node in range(self.node_count):
+                potential[node] += min(distance[node], limit)
+
+            # Every arc with zero reduced cost now lies on a cheapest path
+            while True:
+                level = self._levels(source, potential)
+                if level[sink] < 0:
+                    break
+                pointer = [0] * self.node_count
+                while True:
+                    pushed = self._push(source, sink, self.INFINITY, level, pointer, potential)
+                    if not pushed:
+                        break
+                    total_flow += pushed
+                    total_cost += pushed * (potential[sink] - potential[source])
+
+    def _distances(self, source, potential):
+        """Dijkstra over residual arcs using reduced costs"""
+        distance = [self.INFINITY] * self.node_count
+        distance[source] = 0
+        heap = [(0, source)]
+        targets, capacities, costs = self.targets, self.capacities, self.costs
+        while heap:
+            node_distance, node = heapq.heappop(heap)
+            if node_distance > distance[node]:
+                continue
+            base = node_distance + potential[node]
+            for arc in self.heads[node]:
+                if capacities[arc]:
+                    target = targets[arc]
+                    candidate = base + costs[arc] - potential[target]
+                    if candidate < distance[target]:
+                        distance[target] = candidate
+                        heapq.heappush(heap, (candidate, target))
+        return distance
+
+    def _admissible(self, arc, node, potential):
+        return (self.capacities[arc] and
+                self.costs[arc] + potential[node] == potential[self.targets[arc]])
+
+    def _levels(self, source, potential):
+        """BFS depth of each node over zero-reduced-cost residual arcs (-1 if unreached)"""
+        level = [-1] * self.node_count
+        level[source] = 0
+        queue = [source]
+        for node in queue:
+            for arc in self.heads[node]:
+                target = self.targets[arc]
+                if level[target] < 0 and self._admissible(arc, node, potential):
+                    level[target] = level[node] + 1
+                    queue.append(target)
+        return level
+
+    def _push(self, node, sink, limit, level, pointer, potential):
+        """Send one augmenting path's worth of flow, Dinic style"""
+        if node == sink:
+            return limit
+        arcs = self.heads[node]
+        while pointer[node] < len(arcs):
+            arc = arcs[pointer[node]]
+            target = self.targets[arc]
+            if level[target] == level[node] + 1 and self._admissible(arc, node, potential):
+                pushed = self._push(target, sink, min(limit, self.capacities[arc]),
+                                    level, pointer, potential)
+                if pushed:
+                    self.capacities[arc] -= pushed
+                    self.capacities[arc ^ 1] += pushed
+                    return pushed
+            pointer[node] += 1
+        return 0
+
+
+class FlowScheduler:
+    """
+    Place every category at once as a min-cost flow over a grid of time cells
+
+    Daily shortfalls from the rollup become per-day demands; whatever the
+    weekly and monthly minimums need on top becomes a per-week demand that
+    any day of that week can serve. Free cells are grouped into segments that
+    lie wholly inside or outside each category's preferred window, and each
+    ISO week is solved as one network:
+
+        source -> demand(category, day or week) -> collector(category, day)
+               -> segment -> sink
+
+    Demand that can't be placed drains to the sink through tiers of rising
+    cost, so leaving many categories slightly short beats starving one.
+    Consecutive categories are pulled toward the start of their window so
+    their cells stay together, and every segment is laid out contiguously.
+    """
+    UNMET_TIERS = 4
+    UNMET_COST = 1000          # Per cell, per tier
+    OUTSIDE_WINDOW_COST = 50   # Per cell placed outside the preferred window
+    STRICT_STRATEGY = 3        # "Stick strictly to preferred times"
+    SLEEP_DAILY_CAP = 8        # Hours
+
+    def __init__(self, granularity=timedelta(minutes=15), min_block=timedelta(minutes=30)):
+        self.granularity = granularity
+        self.min_block = min_block
+
+    def schedule(self, planner, strategies, deadline=None):
+        cell_seconds = int(self.granularity.total_seconds())
+        self.cells_per_day = SECONDS_PER_DAY // cell_seconds
+        self.cells_per_hour = 3600 / cell_seconds
+        rollup = planner.rollup
+
+        rules = planner.rules
+        categories = [category for category, hours in planner.category_needed_hours().items()
+                      if hours > 0]
+        windows = {category: self._window(rules.window(rules.ids[category]))
+                   for category in categories}
+        day_demand, week_demand, day_cap = self._demands(planner, categories)
+
+        segments = self._segments(planner, windows)  # day index -> [(first, last)]
+        allocations = {}  # (day index, first cell) -> [(category, cells)]
+        for week_days in self._weeks(rollup):
+            week_days = [day for day in week_days if segments.get(day)]
+            if week_days:
+                self._solve_week(planner, strategies, categories, windows, week_days,
+                                 segments, day_demand, week_demand, day_cap,
+                                 allocations, deadline)
+
+        return self._layout(planner, strategies, windows, allocations)
+
+    def _window(self, window):
+        """
+        Preferred (start, end) minutes as (first cell, end cell), wrapping
+        midnight if first > end
+        """
+        if window is None:
+            return None
+        cell_minutes = self.granularity.total_seconds() / 60
+        first = int(window[0] // cell_minutes)
+        end_cell = -int(-window[1] // cell_minutes)
+        if end_cell == first:
+            return None
+        return first, end_cell
+
+    def _in_window(self, window, cell):
+        if window is None:
+            return True
+        first, end = window
+        if first <= end:
+            return first <= cell < end
+        return cell >= first or cell < end
+
+    def _cells(self, hours):
+        return int(-(-round(hours * self.cells_per_hour, 6) // 1))
+
+    def _demands(self, planner, categories):
+        """Per-(category, day) and per-(category, week) demand in cells, and Sleep's daily cap"""
+        rollup = planner.rollup
+        week_of_day = [rollup.weeks.index(tuple(day.isocalendar())[:2]) for day in rollup.days]
+        month_of_day = [rollup.months.index((day.year, day.month)) for day in rollup.days]
+
+        day_demand, week_demand, day_cap = {}, {}, {}
+        for category in categories:
+            shortfalls = rollup.shortfalls(planner.rules, category)
+            daily = shortfalls['daily']
+
+            # Weekly hours beyond what the daily minimums already add
+            week_extra = [max(0.0, shortfalls['weekly'][week] -
+                              sum(daily[day] for day in range(rollup.day_count)
+                                  if week_of_day[day] == week))
+                          for week in range(len(rollup.weeks))]
+
+            # Monthly hours beyond both, spread evenly over the month's days
+            day_extra = [0.0] * rollup.day_count
+            for month in range(len(rollup.months)):
+                month_days = [day for day in range(rollup.day_count)
+                              if month_of_day[day] == month]
+                covered = sum(daily[day] + week_extra[week_of_day[day]] /
+                              week_of_day.count(week_of_day[day]) for day in month_days)
+                extra = max(0.0, shortfalls['monthly'][month] - covered)
+                for day in month_days:
+                    day_extra[day] = extra / len(month_days)
+
+            for day in range(rollup.day_count):
+                day_demand[category, day] = self._cells(daily[day])
+            for week in range(len(rollup.weeks)):
+                week_demand[category, week] = self._cells(
+                    week_extra[week] + sum(day_extra[day] for day in range(rollup.day_count)
+                                           if week_of_day[day] == week))
+
+            if category == 'Sleep':
+                code = rollup.codes.get('Sleep')
+                for day in range(rollup.day_count):
+                    booked = rollup.daily[code][day] if code is not None else 0
+                    day_cap[category, day] = max(
+                        0, int((self.SLEEP_DAILY_CAP - booked) * self.cells_per_hour))
+        self.week_of_day = week_of_day
+        return day_demand, week_demand, day_cap
+
+    def _weeks(self, rollup):
+        """Day indexes grouped by ISO week, in order"""
+        groups = {}
+        for day, date in enumerate(rollup.days):
+            groups.setdefault(tuple(date.isocalendar())[:2], []).append(day)
+        return list(groups.values())
+
+    def _segments(self, planner, windows):
+        """
+        Free cells of each day as (first, last + 1) runs, split wherever a
+        preferred window starts or ends
+        """
+        origin = planner.rollup.days[0] if planner.rollup.days else None
+        cell = self.granularity
+        cuts = {0, self.cells_per_day}
+        for window in windows.values():
+            if window is not None:
+                cuts.update(window)
+        cuts = sorted(cuts)
+
+        segments = {}
+        for start, end in planner.free_time().slots():
+            day = (start.date() - origin).days
+            midnight = datetime(start.year, start.month, start.day)
+            first = -int(-(start - midnight) // cell)
+            last = int((end - midnight) // cell)
+            for cut_start, cut_end in zip(cuts, cuts[1:]):
+                run = (max(first, cut_start), min(last, cut_end))
+                if run[0] < run[1]:
+                    segments.setdefault(day, []).append(run)
+        return segments
+
+    def _solve_week(self, planner, strategies, categories, windows, week_days, segments,
+                    day_demand, week_demand, day_cap, allocations, deadline):
+        """Build and solve one ISO week's network, recording cells per segment"""
+        node_count = [2]  # 0 = source, 1 = sink
+
+        def new_node():
+            node_count[0] += 1
+            return node_count[0] - 1
+
+        source, sink = 0, 1
+        edges = []   # Deferred until the node count is known
+        readers = []  # (edge position, day, segment, category)
+
+        def edge(u, v, capacity, cost=0):
+            edges.append((u, v, capacity, cost))
+            return len(edges) - 1
+
+        def demand(cells, rank):
+            """A demand node fed with cells, draining unmet cells through costly tiers"""
+            node = new_node()
+            edge(source, node, cells)
+            tier = -(-cells // self.UNMET_TIERS)
+            for level in range(1, self.UNMET_TIERS + 1):
+                edge(node, sink, tier, self.UNMET_COST * level + rank)
+            return node
+
+        segment_nodes = {}
+        for day in week_days:
+            for run in segments[day]:
+                node = segment_nodes[day, run] = new_node()
+                edge(node, sink, run[1] - run[0])
+
+        week = self.week_of_day[week_days[0]]
+        rules = planner.rules
+        for rank, category in enumerate(reversed(categories)):
+            rule = rules.ids[category]
+            strict = strategies.get(category, self.STRICT_STRATEGY) == self.STRICT_STRATEGY
+            window = windows[category]
+            pull = 1 if rules.consecutive[rule] else 0
+
+            week_cells = week_demand.get((category, week), 0)
+            week_node = demand(week_cells, rank) if week_cells else None
+            for day in week_days:
+                date = planner.rollup.days[day]
+                if rules.weekday_only[rule] and date.weekday() >= 5:
+                    continue
+                day_cells = day_demand.get((category, day), 0)
+                if not day_cells and week_node is None:
+                    continue
+
+                collector = new_node()
+                released = new_node()
+                edge(collector, released,
+                     day_cap.get((category, day), day_cells + week_cells))
+                if day_cells:
+                    edge(demand(day_cells, rank), collector, day_cells)
+                if week_node is not None:
+                    edge(week_node, collector, week_cells)
+
+                for run in segments[day]:
+                    inside = self._in_window(window, run[0])
+                    if not inside and strict:
+                        continue
+                    cost = 0 if inside else self.OUTSIDE_WINDOW_COST
+                    if pull and window is not None and inside:
+                        # Hours from the window start, keeping the category together
+                        cost += int(((run[0] - window[0]) % self.cells_per_day) //
+                                    self.cells_per_hour)
+                    readers.append((edge(released, segment_nodes[day, run],
+                                         run[1] - run[0], cost), day, run, category))
+
+        network = MinCostFlow(node_count[0])
+        arcs = [network.add_edge(*spec) for spec in edges]
+        network.solve(source, sink, deadline)
+
+        for position, day, run, category in readers:
+            cells = network.flow(arcs[position])
+            if cells:
+                allocations.setdefault((day, run[0]), []).append((category, cells))
+
+    def _deadline(self, window, cell):
+        """Cells from cell to the end of its window, or more than a day if it isn't in one"""
+        if window is None or not self._in_window(window, cell):
+            return self.cells_per_day * 2
+        return (window[1] - cell) % self.cells_per_day
+
+    def _layout(self, planner, strategies, windows, allocations):
+        """Turn cells per segment into PlannedEvents, merging blocks that touch"""
+        cell = self.granularity
+        blocks = []  # [category, start, end]
+        for (day, first), placed in sorted(allocations.items()):
+            date = planner.rollup.days[day]
+            cursor = datetime(date.year, date.month, date.day) + first * cell
+
+            # Earliest window end goes first, e.g. Sleep before SSS before Workout
+            order = sorted((self._deadline(windows[category], first), position, category, cells)
+                           for position, (category, cells) in enumerate(placed))
+            for _, _, category, cells in order:
+                end = cursor + cells * cell
+                if blocks and blocks[-1][0] == category and blocks[-1][2] == cursor:
+                    blocks[-1][2] = end
+                else:
+                    blocks.append([category, cursor, end])
+                cursor = end
+
+        index = planner.fixed_index()
+        desired = []
+        for category, start, end in blocks:
+            if end - start < self.min_block:
+                continue
+            strategy = strategies.get(category, self.STRICT_STRATEGY)
+            desired.append(planner.planned_event(
+                index, category, start, end,
+                f"Automatically scheduled to meet minimum hours\nAI Strategy: {strategy}"))
+        return desired
+
+
+SCHEDULING_ENGINES = {
+    'greedy': GreedyScheduler,
+    'flow': FlowScheduler,
+}
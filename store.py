@@ -0,0 +1,197 @@
+"""
+SQLite store of synced and searched events, for range scans and offline runs
+"""
+import json
+import threading
+
+from events import Event, category_code, epoch_seconds, from_epoch_seconds
+
+
+class EventStore:
+    """
+    Local SQLite copy of the events the agent reads, for range scans without the network
+
+    Rows are keyed by (source, calendar, event ID, start), which keeps each
+    instance of a recurring CalDAV event apart, and indexed by (calendar, start).
+    An overlap scan starts one longest-event-so-far before the window, so it
+    never walks the calendar's whole history. Calendar names and sync tokens are
+    kept alongside, so a later run can resume incremental sync or work offline.
+    """
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS calendars (
+            calendar_id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            name TEXT,
+            sync_token TEXT,
+            max_duration INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS calendars_by_name ON calendars (name, source);
+        CREATE TABLE IF NOT EXISTS events (
+            source TEXT NOT NULL,
+            calendar_id TEXT NOT NULL,
+            event_id TEXT NOT NULL,
+            start_at INTEGER NOT NULL,
+            end_at INTEGER NOT NULL,
+            busy INTEGER NOT NULL,
+            categories TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (source, calendar_id, event_id, start_at)
+        );
+        CREATE INDEX IF NOT EXISTS events_by_start ON events (calendar_id, start_at);
+    """
+
+    def __init__(self, path):
+        import sqlite3
+
+        self.path = path
+        # One connection shared by worker threads, each use holding self._lock
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self._names = {}  # calendar_id -> name already recorded
+
+    def close(self):
+        with self._lock:
+            self.connection.close()
+
+    def set_calendar(self, calendar_id, source, name=None):
+        """Record a calendar, with its display name when known"""
+        if name is not None and self._names.get(calendar_id) == name:
+            return
+        with self._lock, self.connection:
+            self.connection.execute(
+                "INSERT INTO calendars (calendar_id, source, name) VALUES (?, ?, ?) "
+                "ON CONFLICT (calendar_id) DO UPDATE SET name = COALESCE(excluded.name, name)",
+                (calendar_id, source, name))
+        if name is not None:
+            self._names[calendar_id] = name
+
+    def calendar_id(self, name, source='google'):
+        """ID of a stored calendar by display name, or None"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT calendar_id FROM calendars WHERE name = ? AND source = ?",
+                (name, source)).fetchone()
+        return row[0] if row else None
+
+    def sync_token(self, calendar_id):
+        """The sync token stored with a calendar's events, or None"""
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT sync_token FROM calendars WHERE calendar_id = ?",
+                (calendar_id,)).fetchone()
+        return row[0] if row else None
+
+    def forget(self, calendar_id=None):
+        """Drop stored sync tokens, one calendar's or all, so the next sync is a full one"""
+        with self._lock, self.connection:
+            if calendar_id is None:
+                self.connection.execute("UPDATE calendars SET sync_token = NULL")
+            else:
+                self.connection.execute(
+                    "UPDATE calendars SET sync_token = NULL WHERE calendar_id = ?",
+                    (calendar_id,))
+
+    def replace(self, calendar_id, source, records, sync_token=None, start_date=None,
+                end_date=None):
+        """
+        Store a calendar's events, dropping what was stored for it before
+        Args:
+            start_date, end_date (datetime): Only replace events overlapping this
+                window, as a search of it returned them; the whole calendar when None
+        """
+        where, params = "calendar_id = ?", [calendar_id]
+        if end_date is not None:
+            where += " AND start_at < ?"
+            params.append(epoch_seconds(end_date))
+        if start_date is not None:
+            where += " AND end_at > ?"
+            params.append(epoch_seconds(start_date))
+        with self._lock, self.connection:
+            self.connection.execute(f"DELETE FROM events WHERE {where}", params)
+            self._write(calendar_id, source, records, sync_token,
+                        reset=start_date is None and end_date is None)
+
+    def apply(self, calendar_id, source, changed, removed_ids, sync_token=None):
+        """Store changed events and drop removed ones, as an incremental sync reports them"""
+        with self._lock, self.connection:
+            self.connection.executemany(
+                "DELETE FROM events WHERE calendar_id = ? AND event_id = ?",
+                [(calendar_id, event_id) for event_id in
+                 [record.id for record in changed] + list(removed_ids)])
+            self._write(calendar_id, source, changed, sync_token)
+
+    def _write(self, calendar_id, source, records, sync_token, reset=False):
+        rows = [(source, calendar_id, record.id or '', record.start, record.end,
+                 record.busy, '\n'.join(record.categories), record.serialized())
+                for record in records]
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        longest = max((row[4] - row[3] for row in rows), default=0)
+        self.connection.execute(
+            "INSERT INTO calendars (calendar_id, source, sync_token, max_duration) "
+            "VALUES (?, ?, ?, ?) ON CONFLICT (calendar_id) DO UPDATE SET "
+            "sync_token = COALESCE(excluded.sync_token, sync_token), max_duration = "
+            f"{'excluded.max_duration' if reset else 'MAX(max_duration, excluded.max_duration)'}",
+            (calendar_id, source, sync_token, longest))
+
+    def _scan(self, columns, calendar_id, start_date, end_date, busy_only=False):
+        """Rows of a calendar overlapping a window, by an index range scan"""
+        query = f"SELECT {columns} FROM events WHERE calendar_id = ?"
+        params = [calendar_id]
+        if end_date is not None:
+            query += " AND start_at < ?"
+            params.append(epoch_seconds(end_date))
+        if start_date is not None:
+            row = self.connection.execute(
+                "SELECT max_duration FROM calendars WHERE calendar_id = ?",
+                (calendar_id,)).fetchone()
+            lo = epoch_seconds(start_date)
+            query += " AND start_at >= ? AND end_at > ?"
+            params += [lo - (row[0] if row else 0), lo]
+        if busy_only:
+            query += " AND busy"
+        return self.connection.execute(query + " ORDER BY start_at", params).fetchall()
+
+    def records(self, calendar_id, start_date=None, end_date=None):
+        """
+        Stored events of a calendar overlapping a window as Event records, sorted by start
+        Payloads stay serialized until an Event's raw is used.
+        """
+        with self._lock:
+            rows = self._scan("source, event_id, start_at, end_at, categories, payload",
+                              calendar_id, start_date, end_date)
+        codes = {'': 0}
+        records = []
+        for source, event_id, start, end, categories, payload in rows:
+            code = codes.get(categories)
+            if code is None:
+                code = codes[categories] = category_code(categories.split('\n'))
+            records.append(Event(event_id or None, start, end, code, source, calendar_id,
+                                 payload))
+        return records
+
+    def busy_periods(self, calendar_ids, start_date, end_date):
+        """
+        Busy time of stored calendars over a window, as freebusy would report it
+        Returns:
+            dict: calendar_id -> list of (start, end) naive UTC datetimes
+        """
+        busy = {}
+        with self._lock:
+            for calendar_id in calendar_ids:
+                busy[calendar_id] = [
+                    (from_epoch_seconds(start), from_epoch_seconds(end))
+                    for start, end in self._scan("start_at, end_at", calendar_id,
+                                                 start_date, end_date, busy_only=True)]
+        return busy
+
+    def google_events(self, calendar_id):
+        """A stored Google calendar as CalendarSync mirrors it: {event_id: event}"""
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT event_id, payload FROM events WHERE calendar_id = ?",
+                (calendar_id,)).fetchall()
+        return {event_id: json.loads(payload) for event_id, payload in rows}
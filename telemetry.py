@@ -0,0 +1,657 @@
+"""
+API call telemetry, and the rate limiter and retry policy wrapping Google calls
+"""
+from datetime import datetime, timezone
+import json
+import time
+import bisect
+import os
+import random
+import sys
+import threading
+import uuid
+from contextlib import contextmanager
+
+
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)  # Upper bounds, seconds
+
+
+def payload_size(value):
+    """
+    Approximate wire size in bytes of a request body or decoded response
+    JSON values are re-serialized; CalDAV objects count their iCalendar data.
+    """
+    if value is None:
+        return 0
+    if isinstance(value, (str, bytes)):
+        return len(value)
+    if isinstance(value, dict):
+        return len(json.dumps(value, separators=(',', ':'), default=str))
+    if isinstance(value, (list, tuple)):
+        return sum(payload_size(item) for item in value)
+    return payload_size(getattr(value, 'data', None))
+
+
+def describe_error(error):
+    """Short label for a failed call: the HTTP status when there is one"""
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    if status is not None:
+        return f"HTTP {status}"
+    return type(error).__name__
+
+
+class ApiCall:
+    """
+    One outbound Google, CalDAV or Ollama call, as handed to telemetry sinks
+    """
+    __slots__ = ('service', 'endpoint', 'caller', 'started', 'seconds',
+                 'request_bytes', 'response_bytes', 'error', 'thread', 'response')
+    FIELDS = __slots__[:-1]
+
+    def __init__(self, service, endpoint, caller=None, request_bytes=0):
+        self.service = service      # 'google', 'caldav' or 'ollama'
+        self.endpoint = endpoint    # e.g. 'events.list', 'date_search', 'generate'
+        self.caller = caller        # Agent method that made the call
+        self.started = time.time()
+        self.seconds = 0.0
+        self.request_bytes = request_bytes
+        self.response_bytes = 0
+        self.error = None
+        self.thread = threading.current_thread().name
+        self.response = None  # Sized into response_bytes once the clock has stopped
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+
+class CallStats:
+    """
+    Running totals and a latency histogram for one endpoint or caller
+    """
+    __slots__ = ('calls', 'seconds', 'max_seconds', 'histogram',
+                 'request_bytes', 'response_bytes', 'errors')
+
+    def __init__(self, bucket_count):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (bucket_count + 1)  # Last slot counts overflow
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.errors = {}  # error label -> count
+
+    def add(self, call, buckets):
+        self.calls += 1
+        self.seconds += call.seconds
+        self.max_seconds = max(self.max_seconds, call.seconds)
+        self.histogram[bisect.bisect_left(buckets, call.seconds)] += 1
+        self.request_bytes += call.request_bytes
+        self.response_bytes += call.response_bytes
+        if call.error is not None:
+            self.errors[call.error] = self.errors.get(call.error, 0) + 1
+
+    def quantile(self, q, buckets):
+        """Upper bound of the histogram bucket holding the q-th call (max for overflow)"""
+        rank = q * self.calls
+        seen = 0
+        for index, count in enumerate(self.histogram):
+            seen += count
+            if count and seen >= rank:
+                return buckets[index] if index < len(buckets) else self.max_seconds
+        return 0.0
+
+
+class TelemetrySummary:
+    """
+    In-memory sink aggregating API calls per endpoint and per calling method
+    """
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.endpoints = {}  # (service, endpoint) -> CallStats
+        self.callers = {}    # caller -> CallStats
+
+    def record(self, call):
+        with self.lock:
+            for table, key in ((self.endpoints, (call.service, call.endpoint)),
+                               (self.callers, call.caller)):
+                stats = table.get(key)
+                if stats is None:
+                    stats = table[key] = CallStats(len(self.buckets))
+                stats.add(call, self.buckets)
+
+    def _row(self, stats):
+        return {
+            'calls': stats.calls,
+            'seconds': stats.seconds,
+            'p50': stats.quantile(0.5, self.buckets),
+            'p95': stats.quantile(0.95, self.buckets),
+            'max': stats.max_seconds,
+            'request_bytes': stats.request_bytes,
+            'response_bytes': stats.response_bytes,
+            'errors': dict(stats.errors),
+        }
+
+    def rows(self):
+        """Per-endpoint totals, slowest first"""
+        with self.lock:
+            items = sorted(self.endpoints.items(), key=lambda item: -item[1].seconds)
+            return [dict(service=service, endpoint=endpoint, **self._row(stats))
+                    for (service, endpoint), stats in items]
+
+    def caller_rows(self):
+        """Per-calling-method totals, slowest first"""
+        with self.lock:
+            items = sorted(self.callers.items(), key=lambda item: -item[1].seconds)
+            return [dict(caller=caller, **self._row(stats)) for caller, stats in items]
+
+    def summary_line(self):
+        """
+        One line showing where the API time went, e.g.
+        "api 42 calls, 3.10s: google 2.40s (events.list 12x 2.10s, ...); caldav 0.70s (...)"
+        Call time is summed across threads, so it can exceed wall-clock time.
+        """
+        rows = self.rows()
+        if not rows:
+            return "api 0 calls"
+        services = {}
+        for row in rows:
+            services.setdefault(row['service'], []).append(row)
+        parts = []
+        for service, service_rows in sorted(services.items(),
+                                            key=lambda item: -sum(r['seconds'] for r in item[1])):
+            endpoints = ', '.join(f"{row['endpoint']} {row['calls']}x {row['seconds']:.2f}s"
+                                  for row in service_rows)
+            seconds = sum(row['seconds'] for row in service_rows)
+            parts.append(f"{service} {seconds:.2f}s ({endpoints})")
+        calls = sum(row['calls'] for row in rows)
+        seconds = sum(row['seconds'] for row in rows)
+        errors = sum(sum(row['errors'].values()) for row in rows)
+        line = f"api {calls} calls, {seconds:.2f}s: " + '; '.join(parts)
+        if errors:
+            line += f"; {errors} errors"
+        return line
+
+
+class JsonLinesSink:
+    """
+    Sink appending one JSON object per API call to a file
+    """
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self._file = None
+
+    def record(self, call):
+        line = json.dumps(call.as_dict())
+        with self.lock:
+            if self._file is None:
+                self._file = open(self.path, 'a')
+            self._file.write(line + '\n')
+            self._file.flush()
+
+    def close(self):
+        with self.lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SpanSink:
+    """
+    Sink exporting API calls as OpenTelemetry-style spans
+    Args:
+        tracer: An OpenTelemetry tracer (opentelemetry.trace.get_tracer(...)) to
+            report spans to; without one they are kept in self.spans as dicts
+            shaped like OTLP spans
+    """
+    def __init__(self, tracer=None):
+        self.tracer = tracer
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.lock = threading.Lock()
+
+    def record(self, call):
+        start = int(call.started * 1e9)
+        end = start + int(call.seconds * 1e9)
+        attributes = {
+            'rpc.system': call.service,
+            'rpc.method': call.endpoint,
+            'code.function': call.caller or '',
+            'thread.name': call.thread,
+            'audra.request_bytes': call.request_bytes,
+            'audra.response_bytes': call.response_bytes,
+        }
+        if call.error is not None:
+            attributes['error.type'] = call.error
+        name = f"{call.service} {call.endpoint}"
+
+        if self.tracer is not None:
+            span = self.tracer.start_span(name, start_time=start, attributes=attributes)
+            span.end(end_time=end)
+            return
+        with self.lock:
+            self.spans.append({
+                'trace_id': self.trace_id,
+                'span_id': os.urandom(8).hex(),
+                'name': name,
+                'start_time_unix_nano': start,
+                'end_time_unix_nano': end,
+                'attributes': attributes,
+                'status': {'code': 'ERROR' if call.error else 'OK',
+                           'message': call.error or ''},
+            })
+
+
+class ApiTelemetry:
+    """
+    Time every outbound API call and hand it to pluggable sinks
+    Calls are attributed to the nearest public method of the owner class on the
+    calling thread's stack. self.summary, an in-memory TelemetrySummary, is always
+    attached; add JsonLinesSink, SpanSink or any object with record(call).
+    """
+    def __init__(self, owner=None, sinks=(), measure_payloads=True):
+        self.summary = TelemetrySummary()
+        self.sinks = [self.summary, *sinks]
+        self.measure_payloads = measure_payloads
+        self.callers = {}  # code object -> public method name
+        if owner is not None:
+            for name in dir(owner):
+                code = getattr(getattr(owner, name), '__code__', None)
+                if code is not None and not name.startswith('_'):
+                    self.callers[code] = name
+
+    def add_sink(self, sink):
+        self.sinks.append(sink)
+        return sink
+
+    def size(self, value):
+        """payload_size(value), or 0 when payload measurement is off"""
+        return payload_size(value) if self.measure_payloads else 0
+
+    def caller(self):
+        """Name of the nearest owner method on the current stack"""
+        frame = sys._getframe(1)
+        while frame is not None:
+            name = self.callers.get(frame.f_code)
+            if name is not None:
+                return name
+            frame = frame.f_back
+        return None
+
+    @contextmanager
+    def span(self, service, endpoint, request=None):
+        """
+        Time the enclosed call; set response (or response_bytes) and error on the
+        yielded ApiCall. Exceptions are recorded and re-raised.
+        """
+        call = ApiCall(service, endpoint, self.caller(), self.size(request))
+        began = time.perf_counter()
+        try:
+            yield call
+        except Exception as e:
+            call.error = describe_error(e)
+            raise
+        finally:
+            call.seconds = time.perf_counter() - began
+            if call.response is not None:
+                call.response_bytes = self.size(call.response)
+                call.response = None
+            for sink in self.sinks:
+                try:
+                    sink.record(call)
+                except Exception as e:
+                    print(f"Error in telemetry sink {type(sink).__name__}: {e}")
+
+    def summary_line(self):
+        return self.summary.summary_line()
+
+    def reset(self):
+        """Clear the in-memory summary, e.g. between runs"""
+        with self.summary.lock:
+            self.summary.clear()
+
+
+RATE_LIMIT_REASONS = {'rateLimitExceeded', 'userRateLimitExceeded'}
+
+
+def error_status(error):
+    """HTTP status of a googleapiclient HttpError, or None"""
+    status = getattr(getattr(error, 'resp', None), 'status', None)
+    return int(status) if status is not None else None
+
+
+def error_reasons(error):
+    """The 'reason' strings in a Google API error body"""
+    try:
+        body = json.loads(error.content)
+    except (AttributeError, TypeError, ValueError):
+        return set()
+    if not isinstance(body, dict) or not isinstance(body.get('error'), dict):
+        return set()
+    return {item.get('reason') for item in body['error'].get('errors', [])
+            if isinstance(item, dict)}
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait in a Retry-After header, or None"""
+    headers = getattr(error, 'resp', None)
+    value = headers.get('retry-after') if hasattr(headers, 'get') else None
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    from email.utils import parsedate_to_datetime
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, (moment - datetime.now(timezone.utc)).total_seconds())
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread making Google calls
+    Callers reserve tokens and sleep off any deficit, so a batch larger than the
+    burst simply waits longer. pause() holds everyone back after server pushback.
+    """
+    def __init__(self, rate, burst=None):
+        self.rate = rate                # Tokens per second; None disables limiting
+        self.burst = burst or rate      # Bucket size
+        self.tokens = self.burst
+        self.resume_at = 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """Block until tokens calls may be sent"""
+        with self._lock:
+            now = time.monotonic()
+            wait = self.resume_at - now
+            if self.rate:
+                self.tokens = min(self.burst,
+                                  self.tokens + (now - self._updated) * self.rate)
+                self.tokens -= tokens
+                wait = max(wait, -self.tokens / self.rate)
+            self._updated = now
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, seconds):
+        """Stop handing out tokens for the next seconds"""
+        with self._lock:
+            self.resume_at = max(self.resume_at, time.monotonic() + seconds)
+
+
+class RetryPolicy:
+    """
+    Retry Google calls on 429, 5xx and rate-limit 403s with jittered exponential backoff
+    A Retry-After header overrides the computed delay. Rate-limit errors also
+    pause the shared limiter, so other threads back off too.
+    """
+    APPLIED_STATUSES = {'events.insert': {409}, 'events.delete': {404, 410}}
+
+    def __init__(self, limiter=None, max_retries=6, base_delay=1.0, max_delay=64.0):
+        self.limiter = limiter
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_rate_limit(self, error):
+        status = error_status(error)
+        return status == 429 or (status == 403 and bool(error_reasons(error) & RATE_LIMIT_REASONS))
+
+    def is_retryable(self, error):
+        status = error_status(error)
+        return status is not None and (status >= 500 or self.is_rate_limit(error))
+
+    def is_idempotent(self, endpoint, body):
+        """
+        Whether resending a write can't apply it twice: an insert needs a
+        client-chosen ID, or a retry after a lost response makes a duplicate
+        """
+        return endpoint != 'events.insert' or bool((body or {}).get('id'))
+
+    def can_retry(self, error, endpoint=None, body=None):
+        """
+        Whether a failed call should be resent: a rate-limit rejection always,
+        since nothing was applied, and other retryable errors only if idempotent
+        """
+        return self.is_retryable(error) and (self.is_rate_limit(error) or
+                                             self.is_idempotent(endpoint, body))
+
+    def already_applied(self, endpoint, error, body=None):
+        """
+        Whether a retried write failed only because an earlier attempt took effect:
+        an insert under a client-chosen ID gets 409 when repeated, and a repeated
+        delete finds the event gone
+        """
+        return (self.is_idempotent(endpoint, body) and
+                error_status(error) in self.APPLIED_STATUSES.get(endpoint, ()))
+
+    @staticmethod
+    def applied_response(endpoint, body):
+        """Stand-in response for a write that already_applied(): the inserted body"""
+        return body if endpoint == 'events.insert' else ''
+
+    def delay(self, attempt, error):
+        """Seconds to wait before retry number attempt (0-based)"""
+        requested = retry_after(error)
+        if requested is not None:
+            return requested
+        ceiling = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return random.uniform(ceiling / 2, ceiling)
+
+    def backoff(self, attempt, errors):
+        """Wait out the longest delay the errors call for"""
+        delay = max(self.delay(attempt, error) for error in errors)
+        if self.limiter is not None and any(self.is_rate_limit(error) for error in errors):
+            self.limiter.pause(delay)
+        time.sleep(delay)
+
+    def call(self, func, tokens=1, endpoint=None, body=None):
+        """
+        Run func(), acquiring tokens first and retrying retryable HttpErrors
+        Args:
+            endpoint, body: The write being sent, so a retry that finds an
+                earlier attempt landed counts as success
+        """
+        from googleapiclient.errors import HttpError
+
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                self.limiter.acquire(tokens)
+            try:
+                return func()
+            except HttpError as e:
+                if attempt and self.already_applied(endpoint, e, body):
+                    return self.applied_response(endpoint, body)
+                if attempt >= self.max_retries or not self.can_retry(e, endpoint, body):
+                    raise
+                self.backoff(attempt, [e])
+                attempt += 1
+
+
+class InstrumentedGoogleService:
+    """
+    Google service (or resource) wrapper reporting every execute() to an ApiTelemetry
+    With a RetryPolicy, every call is also paced by its rate limiter and retried
+    when the server pushes back.
+    """
+    def __init__(self, service, telemetry, retry=None, path=''):
+        self.wrapped = service
+        self.telemetry = telemetry
+        self.retry = retry
+        self.path = path  # Resource path so far, e.g. 'events'
+
+    def __getattr__(self, name):
+        attribute = getattr(self.wrapped, name)
+        if not callable(attribute):
+            return attribute
+        path = f"{self.path}.{name}" if self.path else name
+
+        def call(*args, **kwargs):
+            result = attribute(*args, **kwargs)
+            if name == 'new_batch_http_request':
+                options = {key: value for key, value in kwargs.items() if key != 'callback'}
+                return InstrumentedBatch(result, self.telemetry, self.retry,
+                                         lambda: attribute(*args, **options),
+                                         kwargs.get('callback'))
+            if hasattr(result, 'execute'):
+                return InstrumentedRequest(result, self.telemetry, path, kwargs.get('body'),
+                                           self.retry)
+            return InstrumentedGoogleService(result, self.telemetry, self.retry, path)
+        return call
+
+
+class InstrumentedRequest:
+    """
+    Deferred Google request whose execute() is timed, paced and retried
+    Every attempt is reported as its own call.
+    """
+    def __init__(self, request, telemetry, endpoint, body=None, retry=None):
+        self.wrapped = request
+        self.telemetry = telemetry
+        self.endpoint = endpoint
+        self.body = body
+        self.request_bytes = telemetry.size(body)
+        self.retry = retry
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+    def execute(self, *args, **kwargs):
+        if self.retry is None:
+            return self._send(*args, **kwargs)
+        return self.retry.call(lambda: self._send(*args, **kwargs),
+                               endpoint=self.endpoint, body=self.body)
+
+    def _send(self, *args, **kwargs):
+        with self.telemetry.span('google', self.endpoint) as call:
+            call.request_bytes = self.request_bytes
+            response = self.wrapped.execute(*args, **kwargs)
+            call.response = response
+        return response
+
+
+class InstrumentedBatch:
+    """
+    Google batch request timed as one 'batch' call per round trip
+    With a RetryPolicy, each round trip takes one limiter token per item, and items
+    failing with retryable errors are resent in a fresh batch after backoff.
+    Callbacks only see each item's final outcome.
+    """
+    def __init__(self, batch, telemetry, retry=None, new_batch=None, callback=None):
+        self.wrapped = batch
+        self.telemetry = telemetry
+        self.retry = retry
+        self.new_batch = new_batch  # Returns a fresh underlying batch for retries
+        self.callback = callback    # Batch-wide default, as new_batch_http_request takes
+        # (request, callback, request_id, request_bytes, endpoint, body)
+        self.items = []
+
+    def __getattr__(self, name):
+        return getattr(self.wrapped, name)
+
+    def add(self, request, callback=None, request_id=None):
+        request_bytes, endpoint, body = 0, None, None
+        if isinstance(request, InstrumentedRequest):
+            request_bytes, endpoint, body = request.request_bytes, request.endpoint, request.body
+            request = request.wrapped
+        self.items.append((request, callback or self.callback, request_id, request_bytes,
+                           endpoint, body))
+
+    def execute(self):
+        from googleapiclient.errors import HttpError
+
+        retry = self.retry
+        batch = self.wrapped
+        pending = self.items
+        attempt = 0
+        while pending:
+            if retry is not None and retry.limiter is not None:
+                retry.limiter.acquire(len(pending))
+            try:
+                outcomes = self._send(batch, pending)
+            except HttpError as e:
+                if (retry is None or attempt >= retry.max_retries or
+                        not all(retry.can_retry(e, item[4], item[5]) for item in pending)):
+                    raise
+                retry.backoff(attempt, [e])
+            else:
+                again = []
+                for item, (response, exception) in zip(pending, outcomes):
+                    if (exception is not None and attempt
+                            and retry.already_applied(item[4], exception, item[5])):
+                        # An earlier attempt of this write landed
+                        response, exception = retry.applied_response(item[4], item[5]), None
+                    if (exception is not None and retry is not None
+                            and attempt < retry.max_retries
+                            and retry.can_retry(exception, item[4], item[5])):
+                        again.append((item, exception))
+                    elif item[1]:
+                        item[1](item[2], response, exception)
+                pending = [item for item, exception in again]
+                if not pending:
+                    break
+                retry.backoff(attempt, [exception for item, exception in again])
+            attempt += 1
+            batch = self.new_batch()
+        self.items = []
+
+    def _send(self, batch, items):
+        """One batch round trip, returning (response, exception) per item"""
+        outcomes = [(None, None)] * len(items)
+
+        def complete(index):
+            def callback(item_id, response, exception):
+                outcomes[index] = (response, exception)
+            return callback
+
+        for index, (request, callback, request_id, *sizes) in enumerate(items):
+            batch.add(request, callback=complete(index), request_id=request_id)
+        with self.telemetry.span('google', 'batch') as call:
+            call.request_bytes = sum(item[3] for item in items)
+            batch.execute()
+            call.response = [response for response, exception in outcomes
+                             if exception is None]
+            failures = [exception for response, exception in outcomes
+                        if exception is not None]
+            if failures:
+                call.error = f"batch item {describe_error(failures[0])}"
+        return outcomes
+
+
+class InstrumentedDAV:
+    """
+    CalDAV client, principal or calendar wrapper reporting every method call
+    Principals and calendars it returns are wrapped too; events are left bare.
+    """
+    def __init__(self, target, telemetry):
+        self.wrapped = target
+        self.telemetry = telemetry
+
+    def __getattr__(self, name):
+        attribute = getattr(self.wrapped, name)
+        if name.startswith('_') or not callable(attribute):
+            return attribute
+
+        def call(*args, **kwargs):
+            with self.telemetry.span('caldav', name) as api_call:
+                result = attribute(*args, **kwargs)
+                api_call.response = result
+            return self._wrap(result)
+        return call
+
+    def _wrap(self, result):
+        if isinstance(result, list):
+            return [self._wrap(item) for item in result]
+        if hasattr(result, 'calendars') or hasattr(result, 'date_search'):
+            return InstrumentedDAV(result, self.telemetry)
+        return result
@@ -0,0 +1,22 @@
+"""
+Fixtures shared by the tests: an agent wired to the in-memory fakes in benchmarks/fakes.py
+"""
+import pytest
+
+from audra_calendar_agent import AuDRACalendarAgent
+from benchmarks.fakes import FakeGoogleService
+
+
+@pytest.fixture
+def google():
+    return FakeGoogleService()
+
+
+@pytest.fixture
+def agent(google):
+    agent = AuDRACalendarAgent()
+    agent.google_service = google
+    agent.google_limiter.rate = None  # No pacing
+    agent.google_retry.base_delay = 0.001
+    agent.OLLAMA_CACHE_DIR = None
+    return agent
@@ -0,0 +1,110 @@
+"""
+Availability cache: seeded from one freebusy query, then kept current locally
+"""
+from datetime import datetime, timedelta
+
+from scheduling import AvailabilityCache
+
+DAY = datetime(2026, 11, 2)
+
+
+def at(hour, minute=0):
+    return DAY + timedelta(hours=hour, minutes=minute)
+
+
+def busy(cache, calendar_id='cal'):
+    return cache.busy[calendar_id]
+
+
+def test_booking_merges_touching_and_overlapping_periods():
+    cache = AvailabilityCache(DAY, DAY + timedelta(days=1),
+                              {'cal': [(at(9), at(10)), (at(14), at(15))]})
+    cache.book('cal', at(12), at(13))
+    assert busy(cache) == [(at(9), at(10)), (at(12), at(13)), (at(14), at(15))]
+    cache.book('cal', at(10), at(12, 30))
+    assert busy(cache) == [(at(9), at(13)), (at(14), at(15))]
+    cache.book('cal', at(8), at(16))
+    assert busy(cache) == [(at(8), at(16))]
+    assert cache.changes == 3
+
+
+def test_release_splits_periods_and_keeps_other_events_busy():
+    cache = AvailabilityCache(DAY, DAY + timedelta(days=1), {'cal': [(at(9), at(17))]})
+    cache.release('cal', at(12), at(13))
+    assert busy(cache) == [(at(9), at(12)), (at(13), at(17))]
+    assert cache.is_free(at(12), at(13))
+
+    cache.release('cal', at(9), at(12), still_busy=[(at(11), at(12, 30))])
+    assert busy(cache) == [(at(11), at(12)), (at(13), at(17))]
+
+
+def test_move_frees_the_old_time_and_books_the_new():
+    cache = AvailabilityCache(DAY, DAY + timedelta(days=1), {'cal': [(at(9), at(10))]})
+    cache.move('cal', at(9), at(10), at(15), at(16))
+    assert busy(cache) == [(at(15), at(16))]
+
+
+def test_busy_periods_merge_across_calendars_within_the_window():
+    cache = AvailabilityCache(DAY, DAY + timedelta(days=1),
+                              {'a': [(at(9), at(11))], 'b': [(at(10), at(12)), (at(20), at(21))]})
+    assert cache.busy_periods(at(8), at(13)) == [(at(9), at(12))]
+    assert cache.busy_periods(at(8), at(13), ['b']) == [(at(10), at(12))]
+    assert cache.is_free(at(12), at(20))
+    assert not cache.is_free(at(12), at(20, 30))
+
+
+def test_from_freebusy_sets_aside_calendars_with_errors():
+    response = {'calendars': {
+        'a': {'busy': [{'start': '2026-11-02T09:00:00Z', 'end': '2026-11-02T10:00:00Z'}]},
+        'b': {'errors': [{'reason': 'notFound'}]},
+    }}
+    cache = AvailabilityCache.from_freebusy(response, DAY, DAY + timedelta(days=1))
+    assert busy(cache, 'a') == [(at(9), at(10))]
+    assert cache.unavailable == {'b'}
+    assert cache.covers(at(8), at(18), ['a', 'b'])
+    assert not cache.covers(at(8), at(18), ['c'])
+    assert not cache.covers(DAY - timedelta(hours=1), at(18), ['a'])
+
+
+def event(event_id, start, end):
+    return {'id': event_id, 'summary': event_id,
+            'start': {'dateTime': start.isoformat() + 'Z'},
+            'end': {'dateTime': end.isoformat() + 'Z'}}
+
+
+def test_agent_checks_stay_local_between_bookings(agent, google):
+    testcal = google.add_calendar('testcal')
+    personal = google.add_calendar('Personal')
+    google.load_events(personal, [event('dentist', at(9), at(10))])
+    week = (DAY, DAY + timedelta(days=7))
+
+    assert agent.get_availability(*week) == []  # testcal only
+    cache = agent.get_availability_cache(*week)
+    assert cache.busy_periods(*week) == [(at(9), at(10))]
+
+    agent.create_new_event('Focus', at(13), at(14), category='Work')
+    assert agent.get_availability(*week) == [{'start': '2026-11-02T13:00:00Z',
+                                              'end': '2026-11-02T14:00:00Z'}]
+    slots = [(at(8), at(15))]
+    agent.update_available_slots(slots)
+    assert slots == [(at(8), at(9)), (at(10), at(13)), (at(14), at(15))]
+    assert google.log.snapshot()['freebusy.query'] == 1
+
+    assert agent.remove_category_events('Work') == 1
+    assert agent.get_availability(*week) == []
+    assert google.log.snapshot()['freebusy.query'] == 1
+    assert testcal in agent.availability.busy
+
+
+def test_windows_outside_the_cache_and_refreshes_query_again(agent, google):
+    google.add_calendar('testcal')
+    agent.get_availability(DAY, DAY + timedelta(days=1))
+    agent.get_availability(DAY + timedelta(days=3), DAY + timedelta(days=4))
+    assert google.log.snapshot()['freebusy.query'] == 2
+    assert agent.availability.start_date == DAY  # Still answers for the first window
+
+    agent.refresh_availability()
+    assert google.log.snapshot()['freebusy.query'] == 3
+    agent.invalidate_availability()
+    agent.get_availability(DAY, DAY + timedelta(days=1))
+    assert google.log.snapshot()['freebusy.query'] == 4
@@ -0,0 +1,82 @@
+"""
+Backfill of source history into testcal: parallel chunks and checkpoint resume
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from audra_calendar_agent import AuDRACalendarAgent
+from events import event_categories
+from benchmarks.fakes import FakeDAVClient, FakeDAVEvent, synthetic_events
+
+START = datetime(2026, 1, 1)
+DAYS = 60
+END = START + timedelta(days=DAYS)
+
+
+@pytest.fixture
+def sources(agent, google):
+    """Two Google and two Apple source calendars, one event a day each"""
+    apple = FakeDAVClient()
+    for seed, name in enumerate(agent.SOURCE_CALENDARS):
+        google.load_events(google.add_calendar(name), synthetic_events(START, DAYS, 1, seed))
+        apple.load_events(name, synthetic_events(START, DAYS, 1, 10 + seed))
+    # An overnight flight across the boundary between the first two chunks
+    family = apple.calendars_by_name['Family']
+    family.events.append(FakeDAVEvent(family, 'flight@example.com', 'Flight', '',
+                                      START + timedelta(days=9, hours=22),
+                                      START + timedelta(days=10, hours=3)))
+    family.events.sort(key=lambda event: event.start)
+    agent.apple_client = apple
+    return DAYS * 4 + 1
+
+
+def mirrored(google):
+    return list(google.store[google.calendar_id('testcal')].values())
+
+
+def test_backfill_copies_every_event_once(agent, google, sources):
+    totals = agent.backfill(START, END, chunk_days=10, workers=3)
+    events = mirrored(google)
+    assert len(events) == sources
+    assert totals['written'] == sources and totals['done'] == 6
+    assert totals['failed'] == 0 and totals['unfinished'] == 0
+
+    # Workers categorize with their own matchers, agreeing with the main thread's
+    for event in events:
+        assert event_categories(event)[:1] == [agent.categorize_event(event)]
+
+
+def test_interrupted_backfill_resumes_from_its_checkpoint(agent, google, sources,
+                                                          tmp_path, monkeypatch):
+    checkpoint = str(tmp_path / 'backfill.json')
+    mirror_window = AuDRACalendarAgent._mirror_window
+
+    def network_down_after_day_30(self, start, end, *args, **kwargs):
+        if start >= START + timedelta(days=30):
+            raise RuntimeError("network down")
+        return mirror_window(self, start, end, *args, **kwargs)
+    monkeypatch.setattr(AuDRACalendarAgent, '_mirror_window', network_down_after_day_30)
+    first = agent.backfill(START, END, checkpoint, chunk_days=10, workers=3)
+    assert first['done'] == 3 and first['unfinished'] == 3
+    with open(checkpoint) as f:
+        assert len(json.load(f)['done']) == 3
+
+    monkeypatch.setattr(AuDRACalendarAgent, '_mirror_window', mirror_window)
+    second = agent.backfill(START, END, checkpoint, chunk_days=10, workers=3)
+    assert second['skipped'] == 3 and second['done'] == 3 and second['unfinished'] == 0
+    assert first['written'] + second['written'] == sources
+    assert len(mirrored(google)) == sources
+
+    again = agent.backfill(START, END, checkpoint, chunk_days=10)
+    assert again['skipped'] == 6 and again['read'] == 0
+
+
+def test_checkpoint_of_another_range_is_refused(agent, sources, tmp_path):
+    checkpoint = str(tmp_path / 'backfill.json')
+    agent.backfill(START, START + timedelta(days=10), checkpoint, chunk_days=10)
+    with pytest.raises(Exception, match="different backfill range"):
+        agent.backfill(START, END, checkpoint, chunk_days=10)
+    with pytest.raises(Exception, match="end date must be after"):
+        agent.backfill(END, START)
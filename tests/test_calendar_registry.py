@@ -0,0 +1,61 @@
+"""
+Calendar name resolution through the paginated, cached calendarList registry
+"""
+from google_calendar import CalendarRegistry
+
+
+def listed(google):
+    return google.log.snapshot()['calendarList.list']
+
+
+def test_registry_follows_every_page(google):
+    for number in range(250):
+        google.add_calendar(f"Calendar {number}")
+    last = google.add_calendar('Last')
+    registry = CalendarRegistry(google)
+
+    assert registry.get_id('Last') == last
+    assert listed(google) == 3  # 100 calendars per page
+
+
+def test_registry_keeps_the_first_of_duplicate_names(google):
+    first = google.add_calendar('Work')
+    google.calendars_by_id['work-2@fake.calendar'] = 'Work'
+    assert CalendarRegistry(google).get_id('Work') == first
+
+
+def test_registry_caches_until_ttl_or_invalidation(google):
+    google.add_calendar('Personal')
+    registry = CalendarRegistry(google, ttl=None)
+    registry.get_id('Personal')
+    registry.get_id('Personal')
+    assert registry.get_id('Missing') is None
+    assert listed(google) == 1
+
+    registry.invalidate('Personal')
+    registry.get_id('Personal')
+    assert listed(google) == 2
+
+    expiring = CalendarRegistry(google, ttl=0)
+    expiring.get_id('Personal')
+    expiring.get_id('Personal')
+    assert listed(google) == 4
+
+
+def test_get_or_create_creates_once(google):
+    registry = CalendarRegistry(google, ttl=None)
+    created = registry.get_or_create('testcal')
+    assert google.calendars_by_id[created] == 'testcal'
+    assert registry.get_or_create('testcal') == created
+    assert google.log.snapshot()['calendars.insert'] == 1
+    assert listed(google) == 1
+
+
+def test_agent_resolves_through_one_registry(agent, google):
+    personal = google.add_calendar('Personal')
+    assert agent.get_calendar_id('Personal') == personal
+    assert agent.get_calendar_id('Personal') == personal
+    assert agent.get_calendar_id('Nope') is None
+    assert listed(google) == 1
+    created = agent.get_calendar_id('testcal', create=True)
+    assert agent.get_calendar_id('testcal') == created
@@ -0,0 +1,96 @@
+"""
+Incremental Google sync: full pagination first, syncToken changes after, 410 resyncs
+"""
+import json
+from datetime import datetime
+
+from google_calendar import CalendarSync
+from benchmarks.fakes import FakeGoogleService
+
+
+def event(event_id, day, hour=10):
+    return {'id': event_id, 'summary': event_id,
+            'start': {'dateTime': f"2026-11-{day:02d}T{hour:02d}:00:00Z"},
+            'end': {'dateTime': f"2026-11-{day:02d}T{hour + 1:02d}:00:00Z"}}
+
+
+def listed(google):
+    return google.log.snapshot()['events.list']
+
+
+def seeded(count=25):
+    google = FakeGoogleService(page_size=10)
+    calendar = google.add_calendar('Personal')
+    google.load_events(calendar, [event(f"e{number}", 1 + number % 28)
+                                  for number in range(count)])
+    return google, calendar
+
+
+def test_first_sync_follows_every_page():
+    google, calendar = seeded()
+    mirror = CalendarSync(google).sync(calendar)
+    assert len(mirror) == 25
+    assert listed(google) == 3
+
+
+def test_later_syncs_fetch_only_changes():
+    google, calendar = seeded()
+    sync = CalendarSync(google)
+    sync.sync(calendar)
+
+    google.events().insert(calendarId=calendar, body=event('new', 3)).execute()
+    google.events().delete(calendarId=calendar, eventId='e0').execute()
+    google.events().patch(calendarId=calendar, eventId='e1', body={'summary': 'moved'}).execute()
+    before = listed(google)
+    mirror = sync.sync(calendar)
+
+    assert listed(google) - before == 1
+    assert 'new' in mirror and 'e0' not in mirror
+    assert mirror['e1']['summary'] == 'moved'
+    assert len(mirror) == 25
+
+    before = listed(google)
+    assert sync.sync(calendar) is mirror
+    assert listed(google) - before == 1
+
+
+def test_expired_sync_token_falls_back_to_a_full_resync():
+    google, calendar = seeded()
+    sync = CalendarSync(google)
+    sync.sync(calendar)
+    google.events().delete(calendarId=calendar, eventId='e5').execute()
+    sync.sync_tokens[calendar] = 'expired'
+
+    mirror = sync.sync(calendar)
+    assert len(mirror) == 24 and 'e5' not in mirror
+    assert sync.sync_tokens[calendar] != 'expired'
+
+
+def test_records_are_windowed_and_reparsed_only_when_changed():
+    google, calendar = seeded()
+    sync = CalendarSync(google)
+    records = sync.get_records(calendar, datetime(2026, 11, 1), datetime(2026, 11, 3))
+    assert [record.start_time.day for record in records] == [1, 2]
+    kept = {record.id: record for record in records}
+
+    google.events().patch(calendarId=calendar, eventId='e1', body={'summary': 'x'}).execute()
+    again = {record.id: record
+             for record in sync.get_records(calendar, datetime(2026, 11, 1),
+                                            datetime(2026, 11, 3))}
+    assert again['e0'] is kept['e0']
+    assert again['e1'] is not kept['e1']
+
+
+def test_saved_state_resumes_incrementally(tmp_path):
+    google, calendar = seeded()
+    sync = CalendarSync(google)
+    sync.sync(calendar)
+    path = tmp_path / 'sync.json'
+    sync.save(str(path))
+    assert set(json.loads(path.read_text())) == {'sync_tokens', 'events'}
+
+    restored = CalendarSync(google)
+    restored.load(str(path))
+    before = listed(google)
+    assert len(restored.sync(calendar)) == 25
+    assert listed(google) - before == 1
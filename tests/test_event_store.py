@@ -0,0 +1,110 @@
+"""
+SQLite event store: windowed range scans, sync write-through and offline reads
+"""
+from datetime import datetime, timedelta
+
+from audra_calendar_agent import AuDRACalendarAgent
+from events import Event, set_event_category
+from store import EventStore
+from benchmarks.fakes import FakeDAVClient, synthetic_events
+
+DAY = datetime(2026, 11, 2)
+
+
+def event(event_id, start, hours=1, category=None, **fields):
+    body = {'id': event_id, 'summary': event_id,
+            'start': {'dateTime': start.isoformat() + 'Z'},
+            'end': {'dateTime': (start + timedelta(hours=hours)).isoformat() + 'Z'}, **fields}
+    return set_event_category(body, category) if category else body
+
+
+def records(*events):
+    return [Event.from_google(body, 'cal') for body in events]
+
+
+def ids(found):
+    return [record.id for record in found]
+
+
+def test_scans_find_long_events_that_started_before_the_window(tmp_path):
+    store = EventStore(str(tmp_path / 'events.db'))
+    store.replace('cal', 'google', records(
+        event('trip', DAY - timedelta(days=3), hours=96),
+        event('lunch', DAY + timedelta(hours=12)),
+        event('old', DAY - timedelta(days=10))))
+    assert ids(store.records('cal', DAY, DAY + timedelta(days=1))) == ['trip', 'lunch']
+    assert ids(store.records('cal')) == ['old', 'trip', 'lunch']
+    evening = DAY + timedelta(hours=20)
+    assert ids(store.records('cal', evening, evening + timedelta(hours=1))) == ['trip']
+
+
+def test_windowed_replace_keeps_events_outside_the_window(tmp_path):
+    store = EventStore(str(tmp_path / 'events.db'))
+    store.replace('cal', 'caldav', records(event('a', DAY), event('b', DAY + timedelta(days=5))))
+    store.replace('cal', 'caldav', records(event('c', DAY + timedelta(hours=2))),
+                  start_date=DAY, end_date=DAY + timedelta(days=1))
+    assert ids(store.records('cal')) == ['c', 'b']
+
+
+def test_incremental_changes_and_busy_time(tmp_path):
+    store = EventStore(str(tmp_path / 'events.db'))
+    store.replace('cal', 'google',
+                  records(event('a', DAY), event('b', DAY + timedelta(hours=3))), sync_token='1')
+    store.apply('cal', 'google',
+                records(event('a', DAY + timedelta(hours=1)),
+                        event('free', DAY + timedelta(hours=5), transparency='transparent')),
+                ['b'], sync_token='2')
+    assert ids(store.records('cal')) == ['a', 'free']
+    assert store.sync_token('cal') == '2'
+    assert store.busy_periods(['cal'], DAY, DAY + timedelta(days=1)) == {
+        'cal': [(DAY + timedelta(hours=1), DAY + timedelta(hours=2))]}
+    store.forget()
+    assert store.sync_token('cal') is None
+
+
+def seeded(google):
+    testcal = google.add_calendar('testcal')
+    google.load_events(testcal, [event('work', DAY + timedelta(hours=9), 3, 'Work'),
+                                 event('sleep', DAY - timedelta(hours=1), 8, 'Sleep')])
+    return testcal
+
+
+def test_synced_state_resumes_incrementally_in_a_new_run(agent, google, tmp_path):
+    path = str(tmp_path / 'events.db')
+    testcal = seeded(google)
+    agent.open_event_store(path)
+    assert len(agent.get_records(testcal)) == 2
+    google.events().insert(calendarId=testcal,
+                           body=event('gym', DAY + timedelta(hours=18), 1, 'Exercise')).execute()
+
+    later = AuDRACalendarAgent()
+    later.google_service = google
+    later.google_limiter.rate = None
+    later.open_event_store(path)
+    listed = google.log.snapshot()['events.list']
+    assert ids(later.get_records(testcal)) == ['sleep', 'work', 'gym']
+    assert google.log.snapshot()['events.list'] - listed == 1
+    assert len(later.event_store.records(testcal)) == 3
+
+
+def test_offline_reads_need_no_service(agent, google, tmp_path):
+    path = str(tmp_path / 'events.db')
+    seeded(google)
+    apple = FakeDAVClient()
+    apple.load_events('Personal', synthetic_events(DAY, 2, 3))
+    agent.apple_client = apple
+    agent.open_event_store(path)
+    online = agent.calculate_category_hours(DAY, DAY)
+    agent.read_apple_calendar('Personal', DAY, DAY + timedelta(days=2))
+
+    offline = AuDRACalendarAgent()
+    offline.open_event_store(path, offline=True)
+    assert offline.calculate_category_hours(DAY, DAY) == online
+    assert online[1]['Work'] == 3 and online[1]['Sleep'] == 7
+    assert len(offline.read_apple_records('Personal', DAY, DAY + timedelta(days=2))) == 6
+    assert offline.read_apple_records('Family', DAY, DAY + timedelta(days=2)) == []
+    window = (DAY, DAY + timedelta(days=1))
+    assert offline.get_availability_cache(*window).busy_periods(*window) == [
+        (DAY - timedelta(hours=1), DAY + timedelta(hours=7)),
+        (DAY + timedelta(hours=9), DAY + timedelta(hours=12))]
+    assert offline.google_service is None
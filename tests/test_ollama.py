@@ -0,0 +1,123 @@
+"""
+Ollama requests: the on-disk response cache (TTL and LRU) and single-flight coalescing
+"""
+import json
+import os
+import threading
+import time
+
+import pytest
+
+import ollama_cache
+from ollama_cache import ResponseCache, SingleFlight
+from benchmarks.fakes import FakeOllama
+
+
+def test_cache_keys_ignore_whitespace_but_not_model_or_format():
+    key = ResponseCache.key('llama3', 'Plan  my\n week')
+    assert key == ResponseCache.key('llama3', ' Plan my week ')
+    assert key != ResponseCache.key('mistral', 'Plan my week')
+    assert key != ResponseCache.key('llama3', 'Plan my week', 'json')
+
+
+def test_cache_round_trip_and_ttl(tmp_path):
+    cache = ResponseCache(str(tmp_path), ttl=60)
+    cache.put('a', '3')
+    assert cache.get('a') == '3'
+    assert cache.get('missing') is None
+
+    path = tmp_path / 'a.json'
+    entry = json.loads(path.read_text())
+    entry['created'] -= 61
+    path.write_text(json.dumps(entry))
+    assert cache.get('a') is None
+    assert not path.exists()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = ResponseCache(str(tmp_path), max_bytes=None)
+    for key in 'abc':
+        cache.put(key, 'x' * 100)
+    size = os.path.getsize(tmp_path / 'a.json')
+    for age, key in enumerate('abc'):
+        os.utime(tmp_path / f"{key}.json", (1000 + age, 1000 + age))
+
+    cache.get('a')  # Now the most recently used
+    cache.max_bytes = 2 * size
+    cache.put('d', 'x' * 100)
+
+    assert sorted(entry.name for entry in os.scandir(tmp_path)) == ['a.json', 'd.json']
+
+
+def test_failed_cache_write_leaves_no_temp_file(tmp_path, monkeypatch):
+    cache = ResponseCache(str(tmp_path))
+
+    def fail(source, target):
+        raise OSError("disk full")
+    monkeypatch.setattr(ollama_cache.os, 'replace', fail)
+    with pytest.raises(OSError):
+        cache.put('a', '3')
+    assert os.listdir(tmp_path) == []
+
+
+def test_unusable_cache_directory_disables_caching(agent, tmp_path):
+    blocker = tmp_path / 'file'
+    blocker.write_text('')
+    agent.OLLAMA_CACHE_DIR = str(blocker)
+    assert agent.get_ollama_cache() is None
+    assert agent.OLLAMA_CACHE_DIR is None
+
+
+def test_single_flight_runs_concurrent_callers_once():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def work():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return 'shared'
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(flight.do('key', work)))
+               for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    started.wait(5)
+    time.sleep(0.1)  # Let the other callers join the flight
+    release.set()
+    for thread in threads:
+        thread.join()
+
+    assert results == ['shared'] * 5
+    assert len(calls) == 1
+    assert flight.do('key', lambda: 'again') == 'again'  # Nothing left in flight
+
+
+def test_single_flight_shares_failures():
+    flight = SingleFlight()
+
+    def fail():
+        raise ValueError("model not loaded")
+    with pytest.raises(ValueError):
+        flight.do('key', fail)
+    assert flight.do('key', lambda: 1) == 1
+
+
+def test_query_ollama_is_cached_and_coalesced(agent, tmp_path):
+    with FakeOllama(latency=0.2, strategy=2) as ollama:
+        agent.ollama_url = ollama.url
+
+        threads = [threading.Thread(target=agent.query_ollama, args=('Pick one',))
+                   for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert ollama.log.snapshot()['ollama.generate'] == 1
+
+        agent.OLLAMA_CACHE_DIR = str(tmp_path)
+        assert agent.query_ollama('Pick  one ') == '2'
+        assert agent.query_ollama('Pick one') == '2'
+        assert ollama.log.snapshot()['ollama.generate'] == 2
@@ -0,0 +1,178 @@
+"""
+Google call pacing and retries: error classification, backoff, Retry-After and the token bucket
+"""
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import httplib2
+import pytest
+from googleapiclient.errors import HttpError
+
+import telemetry
+from google_calendar import WriteBuffer
+from telemetry import RateLimiter, RetryPolicy, retry_after
+from benchmarks.fakes import http_error
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Record time.sleep calls instead of sleeping"""
+    slept = []
+    monkeypatch.setattr(telemetry.time, 'sleep', slept.append)
+    return slept
+
+
+def with_retry_after(status, value):
+    return HttpError(httplib2.Response({'status': status, 'retry-after': value}), b'{}')
+
+
+def failing(*errors, result='ok'):
+    """A call raising each error in turn, then returning result"""
+    remaining = list(errors)
+    calls = []
+
+    def call():
+        calls.append(1)
+        if remaining:
+            raise remaining.pop(0)
+        return result
+    call.calls = calls
+    return call
+
+
+@pytest.mark.parametrize('error, retryable, rate_limit', [
+    (http_error(429), True, True),
+    (http_error(403, 'Rate Limit Exceeded', 'rateLimitExceeded'), True, True),
+    (http_error(403, 'User Rate Limit Exceeded', 'userRateLimitExceeded'), True, True),
+    (http_error(403, 'Forbidden', 'forbidden'), False, False),
+    (http_error(500), True, False),
+    (http_error(503), True, False),
+    (http_error(404), False, False),
+])
+def test_error_classification(error, retryable, rate_limit):
+    policy = RetryPolicy()
+    assert policy.is_retryable(error) == retryable
+    assert policy.is_rate_limit(error) == rate_limit
+
+
+def test_retry_after_reads_seconds_and_dates():
+    assert retry_after(with_retry_after(429, '7')) == 7.0
+    later = datetime.now(timezone.utc) + timedelta(seconds=30)
+    assert 25 < retry_after(with_retry_after(503, format_datetime(later, usegmt=True))) <= 30
+    assert retry_after(with_retry_after(503, 'soon')) is None
+    assert retry_after(http_error(503)) is None
+
+
+def test_delay_backs_off_with_jitter_and_honours_retry_after():
+    policy = RetryPolicy(base_delay=1.0, max_delay=8.0)
+    for attempt, ceiling in [(0, 1), (1, 2), (2, 4), (3, 8), (6, 8)]:
+        assert ceiling / 2 <= policy.delay(attempt, http_error(503)) <= ceiling
+    assert policy.delay(0, with_retry_after(429, '20')) == 20.0
+
+
+def test_call_retries_until_success(sleeps):
+    call = failing(http_error(503), http_error(500))
+    assert RetryPolicy(base_delay=1.0).call(call) == 'ok'
+    assert len(call.calls) == 3
+    assert len(sleeps) == 2 and 0.5 <= sleeps[0] <= 1 and 1 <= sleeps[1] <= 2
+
+
+def test_call_gives_up_on_permanent_errors_and_after_max_retries(sleeps):
+    call = failing(http_error(404))
+    with pytest.raises(HttpError):
+        RetryPolicy().call(call)
+    assert len(call.calls) == 1
+
+    call = failing(*[http_error(503)] * 4)
+    with pytest.raises(HttpError):
+        RetryPolicy(max_retries=2).call(call)
+    assert len(call.calls) == 3
+
+
+def test_rate_limit_pauses_the_shared_limiter(sleeps):
+    limiter = RateLimiter(rate=None)
+    call = failing(with_retry_after(429, '5'))
+    RetryPolicy(limiter).call(call)
+    assert sleeps[0] == 5.0
+    assert 4.9 < sleeps[1] <= 5  # The retry's own acquire waits out the pause
+    assert limiter.resume_at > telemetry.time.monotonic() + 4
+
+
+def test_retried_writes_that_already_landed_count_as_done(sleeps):
+    policy = RetryPolicy()
+    body = {'id': 'abc'}
+    call = failing(http_error(503), http_error(409))
+    assert policy.call(call, endpoint='events.insert', body=body) is body
+    call = failing(http_error(503), http_error(410))
+    assert policy.call(call, endpoint='events.delete') == ''
+
+    # A first-attempt conflict is a real one
+    with pytest.raises(HttpError):
+        policy.call(failing(http_error(409)), endpoint='events.insert', body=body)
+
+
+def test_inserts_without_an_id_are_only_retried_when_rejected(sleeps):
+    policy = RetryPolicy()
+    call = failing(http_error(503))
+    with pytest.raises(HttpError):
+        policy.call(call, endpoint='events.insert', body={'summary': 'x'})
+    assert len(call.calls) == 1
+
+    call = failing(http_error(429))
+    assert policy.call(call, endpoint='events.insert', body={'summary': 'x'}) == 'ok'
+
+
+def test_token_bucket_allows_a_burst_then_paces(sleeps):
+    limiter = RateLimiter(rate=10, burst=5)
+    limiter.acquire(5)
+    assert sleeps == []
+    limiter.acquire(1)
+    assert sleeps and 0.05 < sleeps[-1] <= 0.1
+    limiter.acquire(10)  # Larger than the burst: waits longer rather than failing
+    assert 1.0 < sleeps[-1] <= 1.2
+
+
+def test_disabled_limiter_only_waits_out_pauses(sleeps):
+    limiter = RateLimiter(rate=None)
+    for _ in range(100):
+        limiter.acquire()
+    assert sleeps == []
+    limiter.pause(2)
+    limiter.acquire()
+    assert 1.9 < sleeps[-1] <= 2
+
+
+def insert_many(agent, calendar, prefix, count, batch_size=50):
+    for number in range(count):
+        agent.google_service.events().insert(
+            calendarId=calendar, body={'id': f"{prefix}{number}", 'summary': prefix,
+                                       'start': {'dateTime': '2026-11-02T10:00:00Z'},
+                                       'end': {'dateTime': '2026-11-02T11:00:00Z'}}).execute()
+    buffer = WriteBuffer(agent.google_service, batch_size=batch_size)
+    handles = [buffer.insert(calendar, {'id': f"{prefix}batch{number}", 'summary': prefix,
+                                        'start': {'dateTime': '2026-11-02T10:00:00Z'},
+                                        'end': {'dateTime': '2026-11-02T11:00:00Z'}})
+               for number in range(count)]
+    return buffer.flush(), handles
+
+
+def test_quota_rejections_are_retried_through_the_agent(agent, google):
+    google.quota, google.burst, google.allowance = 200, 5, 5
+    agent.google_retry.base_delay = 0.02
+    calendar = google.add_calendar('testcal')
+
+    failed, handles = insert_many(agent, calendar, 'unpaced', 20)
+    assert failed == [] and all(handle.error is None for handle in handles)
+    assert google.rejected > 0
+    assert len(google.store[calendar]) == 40
+
+
+def test_pacing_to_the_quota_avoids_rejections(agent, google):
+    google.quota, google.burst, google.allowance = 200, 5, 5
+    agent.google_limiter.rate, agent.google_limiter.burst = 150, 5
+    agent.google_limiter.tokens = 5
+    calendar = google.add_calendar('testcal')
+
+    failed, handles = insert_many(agent, calendar, 'paced', 20, batch_size=5)
+    assert failed == []
+    assert google.rejected == 0
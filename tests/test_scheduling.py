@@ -0,0 +1,242 @@
+"""
+Behaviour checks for the scheduling core: min-cost flow, both engines, free
+time and category rules
+
+Run from the repository root:
+    python -m pytest tests
+"""
+import itertools
+import random
+from datetime import datetime, timedelta
+
+import pytest
+
+from audra_calendar_agent import AuDRACalendarAgent
+from categories import CategoryRules
+from events import Event, set_event_category
+from scheduling import FreeTimeEngine, MinCostFlow, SchedulePlanner, merge_intervals
+
+START = datetime(2026, 11, 2)  # A Monday
+
+
+# --- MinCostFlow ---
+
+def brute_force_flow(node_count, arcs, source, sink):
+    """(max flow, min cost at that flow) by trying every integer flow on every arc"""
+    best = (0, 0)
+    for flows in itertools.product(*(range(capacity + 1) for _, _, capacity, _ in arcs)):
+        balance = [0] * node_count
+        for (tail, head, _, _), flow in zip(arcs, flows):
+            balance[tail] -= flow
+            balance[head] += flow
+        if any(balance[node] for node in range(node_count) if node not in (source, sink)):
+            continue
+        value = balance[sink]
+        cost = sum(flow * arc[3] for arc, flow in zip(arcs, flows))
+        if value > best[0] or (value == best[0] and cost < best[1]):
+            best = (value, cost)
+    return best
+
+
+def solve(node_count, arcs, source, sink):
+    network = MinCostFlow(node_count)
+    handles = [network.add_edge(*arc) for arc in arcs]
+    result = network.solve(source, sink)
+    return result, [network.flow(handle) for handle in handles]
+
+
+def test_min_cost_flow_prefers_cheaper_paths_up_to_capacity():
+    # Two routes from 0 to 3: via 1 costs 2 per unit but carries 2, via 2 costs 5
+    arcs = [(0, 1, 2, 1), (1, 3, 2, 1), (0, 2, 3, 2), (2, 3, 3, 3)]
+    (flow, cost), flows = solve(4, arcs, 0, 3)
+    assert (flow, cost) == (5, 2 * 2 + 3 * 5)
+    assert flows == [2, 2, 3, 3]
+
+
+def test_min_cost_flow_reroutes_through_residual_arcs():
+    # The greedy first path 0-1-2-3 blocks a second unit unless 1-2 is undone
+    arcs = [(0, 1, 1, 0), (0, 2, 1, 4), (1, 2, 1, 0), (1, 3, 1, 4), (2, 3, 1, 0)]
+    (flow, cost), flows = solve(4, arcs, 0, 3)
+    assert (flow, cost) == (2, 8)
+    assert flows[2] == 0
+
+
+@pytest.mark.parametrize('seed', range(25))
+def test_min_cost_flow_matches_brute_force(seed):
+    rng = random.Random(seed)
+    node_count = rng.randint(3, 5)
+    sink = node_count - 1
+    arcs = [(0, rng.randint(1, sink), 2, rng.randint(0, 5)),
+            (rng.randint(0, sink - 1), sink, 2, rng.randint(0, 5))]
+    for _ in range(rng.randint(3, 6)):
+        tail, head = rng.sample(range(node_count), 2)
+        arcs.append((tail, head, rng.randint(0, 2), rng.randint(0, 5)))
+    (flow, cost), flows = solve(node_count, arcs, 0, sink)
+
+    assert (flow, cost) == brute_force_flow(node_count, arcs, 0, sink)
+    assert all(0 <= sent <= arc[2] for sent, arc in zip(flows, arcs))
+    for node in range(1, sink):
+        assert sum(sent for sent, arc in zip(flows, arcs) if arc[1] == node) == \
+            sum(sent for sent, arc in zip(flows, arcs) if arc[0] == node)
+
+
+# --- Scheduling engines ---
+
+def fixed_event(number, start, hours, category='Health'):
+    event = {
+        'id': f"fixed-{number}",
+        'summary': 'Appointment',
+        'start': {'dateTime': start.isoformat()},
+        'end': {'dateTime': (start + timedelta(hours=hours)).isoformat()},
+    }
+    return Event.from_google(set_event_category(event, category))
+
+
+def planned(engine):
+    agent = AuDRACalendarAgent()
+    rules = agent.get_category_rules()
+    end = START + timedelta(days=14)
+    records = [fixed_event(number, START + timedelta(days=number, hours=9 + number % 6), 2)
+               for number in range(14)]
+    planner = SchedulePlanner(START, end, records, rules, agent.CATEGORIES)
+    return rules, records, end, planner.plan(engine=engine).adds
+
+
+def in_window(rules, category, start, end):
+    """Whether every minute of [start, end) is in the category's window and days"""
+    rule = rules.ids[category]
+    window = rules.window(rule)
+    moment = start
+    while moment < end:
+        if rules.weekday_only[rule] and moment.weekday() >= 5:
+            return False
+        if window is not None and window[0] != window[1]:
+            minute = moment.hour * 60 + moment.minute
+            first, last = window
+            inside = first <= minute < last if first < last else (minute >= first or
+                                                                  minute < last)
+            if not inside:
+                return False
+        moment += timedelta(minutes=1)
+    return True
+
+
+@pytest.mark.parametrize('engine', ['greedy', 'flow'])
+def test_engines_never_double_book(engine):
+    rules, records, end, adds = planned(engine)
+    assert adds
+    blocks = sorted([(add.start, add.end) for add in adds] +
+                    [(record.start_time, record.end_time) for record in records])
+    for (_, previous_end), (start, _) in zip(blocks, blocks[1:]):
+        assert start >= previous_end
+    assert all(START <= add.start < add.end <= end for add in adds)
+
+
+@pytest.mark.parametrize('engine', ['greedy', 'flow'])
+def test_engines_keep_blocks_in_preferred_windows(engine):
+    rules, records, end, adds = planned(engine)
+    for add in adds:
+        if engine == 'greedy' and add.category in ('Workout', 'SSS'):
+            continue  # Greedy places these straight after each Sleep block instead
+        assert in_window(rules, add.category, add.start, add.end), add
+
+
+@pytest.mark.parametrize('strategy', [1, 2, 3])
+def test_greedy_sleeps_at_most_the_daily_cap_each_night(strategy):
+    agent = AuDRACalendarAgent()
+    end = START + timedelta(days=14)
+    planner = SchedulePlanner(START, end, [], agent.get_category_rules(), agent.CATEGORIES)
+    nights = {}
+    for add in planner.plan({'Sleep': strategy}, engine='greedy').adds:
+        if add.category == 'Sleep':
+            night = (add.start - timedelta(hours=12)).date()  # 22:00-08:30 is one night
+            nights[night] = nights.get(night, 0) + (add.end - add.start) / timedelta(hours=1)
+    assert max(nights.values()) <= 8
+    assert len(nights) >= 14  # Hours aren't used up before the last nights
+
+
+# --- merge_intervals and FreeTimeEngine ---
+
+def hour(day, hours=0):
+    return START + timedelta(days=day, hours=hours)
+
+
+def test_merge_intervals_edge_cases():
+    assert merge_intervals([]) == []
+    assert merge_intervals([(3, 4), (1, 2)]) == [(1, 2), (3, 4)]
+    assert merge_intervals([(1, 2), (2, 3)]) == [(1, 3)]  # Touching
+    assert merge_intervals([(1, 10), (2, 3)]) == [(1, 10)]  # Contained
+    assert merge_intervals([(5, 5), (1, 2)]) == [(1, 2)]  # Empty intervals dropped
+    assert merge_intervals([(1, 4), (1, 2)]) == [(1, 4)]  # Same start
+
+
+def test_free_time_ignores_busy_outside_the_window_and_splits_at_midnight():
+    engine = FreeTimeEngine(hour(0, 12), hour(1, 12),
+                            [(hour(-1), hour(0, 13)), (hour(2), hour(3))])
+    assert engine.slots() == [(hour(0, 13), hour(1)), (hour(1), hour(1, 12))]
+
+
+def test_free_time_drops_gaps_not_longer_than_min_duration():
+    engine = FreeTimeEngine(hour(0, 8), hour(0, 12),
+                            [(hour(0, 8) + timedelta(minutes=30), hour(0, 10))],
+                            min_duration=timedelta(minutes=30))
+    assert engine.slots() == [(hour(0, 10), hour(0, 12))]
+
+
+def test_free_time_fully_busy_window_has_no_slots():
+    assert FreeTimeEngine(hour(0, 9), hour(0, 17), [(hour(0, 8), hour(0, 18))]).slots() == []
+
+
+def test_free_time_booking_splits_and_spans_gaps():
+    engine = FreeTimeEngine(hour(0), hour(2))
+    engine.book(hour(0, 10), hour(0, 11))
+    assert engine.slots() == [(hour(0), hour(0, 10)), (hour(0, 11), hour(1)),
+                              (hour(1), hour(2))]
+    assert engine.is_free(hour(0, 11), hour(0, 12))
+    assert not engine.is_free(hour(0, 9), hour(0, 11))
+    assert not engine.is_free(hour(0, 23), hour(1, 1))  # Gaps end at midnight
+
+    engine.book(hour(0, 20), hour(1, 2))
+    assert engine.slots() == [(hour(0), hour(0, 10)), (hour(0, 11), hour(0, 20)),
+                              (hour(1, 2), hour(2))]
+    assert engine.gap_at(hour(1, 1)) is None
+
+
+# --- CategoryRules ---
+
+def test_default_rules_compile():
+    agent = AuDRACalendarAgent()
+    rules = agent.get_category_rules()
+    assert rules.window(rules.ids['Sleep']) == (22 * 60, 8 * 60 + 30)
+    assert rules.weekday_only[rules.ids['Work']]
+    assert agent.get_category_rules() is rules  # Compiled once
+    with pytest.raises(ValueError):
+        rules.minimums[0, 0] = 1
+
+
+@pytest.mark.parametrize('minimums, constraints, message', [
+    ({'category': 'A'}, {}, 'must be a list'),
+    ([{'daily': 1}], {}, 'no category name'),
+    ([{'category': 'A'}, {'category': 'A'}], {}, 'more than one'),
+    ([{'category': 'A', 'dayly': 1}], {}, 'Unknown minimums keys'),
+    ([{'category': 'A', 'daily': -1}], {}, 'at least 0'),
+    ([{'category': 'A', 'weekly': '7'}], {}, 'number of hours'),
+    ([{'category': 'A'}], {'B': {}}, 'no minimums entry'),
+    ([{'category': 'A'}], {'A': {'preferred_start_time': '22:00'}}, 'both'),
+    ([{'category': 'A'}], {'A': {'preferred_start_time': '25:00',
+                                 'preferred_end_time': '08:00'}}, 'HH:MM'),
+    ([{'category': 'A'}], {'A': {'preferred_start_time': '22:61',
+                                 'preferred_end_time': '08:00'}}, 'HH:MM'),
+    ([{'category': 'A'}], {'A': {'weekday_only': 'yes'}}, 'true or false'),
+    ([{'category': 'A'}], {'A': {'prefered_start_time': '22:00'}}, 'Unknown constraint'),
+])
+def test_rules_reject_bad_tables(minimums, constraints, message):
+    with pytest.raises(Exception, match=message):
+        CategoryRules(minimums, constraints)
+
+
+def test_rules_accept_minutes_as_yaml_reads_them():
+    rules = CategoryRules([{'category': 'Sleep', 'daily': 7}],
+                          {'Sleep': {'preferred_start_time': 1320,
+                                     'preferred_end_time': '07:30'}})
+    assert rules.window(0) == (1320, 450)
@@ -0,0 +1,50 @@
+"""
+Category strategies asked for in one JSON request, with per-category fallbacks
+"""
+import pytest
+
+from benchmarks.fakes import FakeOllama
+
+CATEGORIES = ['Sleep', 'Work', 'Writing']
+
+
+@pytest.mark.parametrize('response, expected', [
+    ('{"Sleep": 1, "Work": 3}', {'Sleep': 1, 'Work': 3}),
+    ('Sure!\n```json\n{"Sleep": "2"}\n```', {'Sleep': 2}),  # Prose and code fences
+    ('{"Sleep": 5, "Work": 0, "Writing": true}', {}),  # Out of range, or a bool
+    ('{"Sleep": "blocks", "Work": 4}', {'Work': 4}),
+    ('{"Nap": 1, "Sleep": 2}', {'Sleep': 2}),  # Unknown categories are dropped
+    ('[1, 2]', {}),
+    ('{"Sleep": 1', {}),
+    ('', {}),
+    (None, {}),
+])
+def test_parse_strategies(agent, response, expected):
+    assert agent.parse_strategies(response, CATEGORIES) == expected
+
+
+def test_every_strategy_comes_from_one_request(agent):
+    with FakeOllama(strategy=4) as ollama:
+        agent.ollama_url = ollama.url
+        strategies = agent.get_category_strategies({'Sleep': 10, 'Work': 7}, 12)
+        assert strategies == {'Sleep': 4, 'Work': 4}
+        assert ollama.log.snapshot()['ollama.generate'] == 1
+
+
+def test_missing_answers_fall_back_to_one_request_each(agent, monkeypatch):
+    prompts = []
+
+    def query(prompt, response_format=None):
+        prompts.append(response_format)
+        return '{"Sleep": 2}' if response_format == 'json' else ' 3\n'
+    monkeypatch.setattr(agent, 'query_ollama', query)
+
+    strategies = agent.get_category_strategies({'Sleep': 10, 'Work': 7, 'Writing': 2}, 12)
+    assert strategies == {'Sleep': 2, 'Work': 3, 'Writing': 3}
+    assert prompts == ['json', None, None]
+
+
+def test_unreadable_single_answer_defaults_to_larger_blocks(agent, monkeypatch):
+    monkeypatch.setattr(agent, 'query_ollama', lambda prompt, response_format=None: None)
+    assert agent.get_category_strategies({'Sleep': 10}, 12) == {'Sleep': 1}
+    assert agent.get_category_strategies({}, 12) == {}
@@ -0,0 +1,64 @@
+"""
+Buffered event writes sent as batch requests, with per-item outcomes
+"""
+from datetime import datetime
+
+import pytest
+
+from google_calendar import WriteBuffer
+
+
+def body(event_id):
+    return {'id': event_id, 'summary': event_id,
+            'start': {'dateTime': '2026-11-02T10:00:00Z'},
+            'end': {'dateTime': '2026-11-02T11:00:00Z'}}
+
+
+def test_flush_reports_only_the_failed_items(google):
+    calendar = google.add_calendar('testcal')
+    google.load_events(calendar, [body('taken')])
+    buffer = WriteBuffer(google, batch_size=2)
+    handles = [buffer.insert(calendar, body(event_id)) for event_id in ('a', 'taken', 'b')]
+    missing = buffer.delete(calendar, 'missing')
+
+    failed = buffer.flush()
+
+    assert failed == [handles[1], missing]
+    assert google.log.snapshot()['batch'] == 2
+    assert [handles[0].result()['id'], handles[2].result()['id']] == ['a', 'b']
+    with pytest.raises(Exception):
+        handles[1].result()
+    assert buffer.failed == failed
+    assert set(google.store[calendar]) == {'taken', 'a', 'b'}
+
+
+def test_conflicts_can_count_as_written(google):
+    calendar = google.add_calendar('testcal')
+    google.load_events(calendar, [body('taken')])
+    buffer = WriteBuffer(google, ignore_conflicts=True)
+    handle = buffer.insert(calendar, body('taken'))
+    assert buffer.flush() == []
+    assert handle.error is not None
+
+
+def test_result_flushes_a_pending_write(google):
+    calendar = google.add_calendar('testcal')
+    buffer = WriteBuffer(google)
+    handle = buffer.insert(calendar, body('a'))
+    assert not handle.done() and len(buffer) == 1
+    assert handle.result()['id'] == 'a'
+    assert handle.done() and len(buffer) == 0
+
+
+def test_agent_batches_writes_until_the_outermost_block_ends(agent, google):
+    calendar = google.add_calendar('testcal')
+    with agent.buffered_writes():
+        with agent.buffered_writes():
+            first = agent.create_new_event('One', datetime(2026, 11, 2, 9),
+                                           datetime(2026, 11, 2, 10), category='Work')
+        second = agent.create_new_event('Two', datetime(2026, 11, 2, 11),
+                                        datetime(2026, 11, 2, 12), category='Work')
+        assert not first.done() and not google.store[calendar]
+    assert first.done() and second.done()
+    assert google.log.snapshot()['batch'] == 1
+    assert len(google.store[calendar]) == 2